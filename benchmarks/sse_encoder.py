@@ -0,0 +1,78 @@
+"""
+Micro-benchmark for SSE frame encoding in the /stream endpoint.
+
+Compares the original per-event path (langchain_to_chat_message -> model_dump ->
+json.dumps -> f-string) with the byte encoder in service.sse.
+
+Run from the repo root:
+
+    USE_FAKE_MODEL=true PYTHONPATH=src python benchmarks/sse_encoder.py
+"""
+
+import argparse
+import json
+import timeit
+from collections.abc import Callable
+
+from langchain_core.messages import AIMessage, ToolCall
+
+from service import sse
+from service.utils import langchain_to_chat_dict, langchain_to_chat_message
+
+RUN_ID = "847c6285-8fc9-4560-a83f-4e6285809254"
+TOKEN = " weather"
+MESSAGE = AIMessage(
+    content="The weather in Tokyo is sunny with a high of 24 degrees.",
+    tool_calls=[ToolCall(name="Weather", args={"city": "Tokyo"}, id="call_Jja7J89XsjrOLA5r")],
+    response_metadata={
+        "finish_reason": "stop",
+        "model_name": "gpt-4o-mini-2024-07-18",
+        "token_usage": {"completion_tokens": 14, "prompt_tokens": 85, "total_tokens": 99},
+    },
+)
+
+
+def legacy_token() -> str:
+    return f"data: {json.dumps({'type': 'token', 'content': TOKEN})}\n\n"
+
+
+def legacy_message() -> str:
+    chat_message = langchain_to_chat_message(MESSAGE)
+    chat_message.run_id = RUN_ID
+    return f"data: {json.dumps({'type': 'message', 'content': chat_message.model_dump()})}\n\n"
+
+
+def fast_token() -> bytes:
+    return sse.encode_token(TOKEN)
+
+
+def fast_message() -> bytes:
+    chat_message = langchain_to_chat_dict(MESSAGE)
+    chat_message["run_id"] = RUN_ID
+    return sse.encode_message(chat_message)
+
+
+def events_per_second(fn: Callable[[], object], number: int, repeat: int) -> float:
+    best = min(timeit.repeat(fn, number=number, repeat=repeat))
+    return number / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--number", type=int, default=100_000, help="events per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs, best is reported")
+    args = parser.parse_args()
+
+    print(f"JSON backend: {sse.JSON_BACKEND}")
+    print(f"{'frame':<10}{'before (ev/s)':>16}{'after (ev/s)':>16}{'speedup':>10}")
+    for name, before, after in [
+        ("token", legacy_token, fast_token),
+        ("message", legacy_message, fast_message),
+    ]:
+        before_eps = events_per_second(before, args.number, args.repeat)
+        after_eps = events_per_second(after, args.number, args.repeat)
+        print(f"{name:<10}{before_eps:>16,.0f}{after_eps:>16,.0f}{after_eps / before_eps:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
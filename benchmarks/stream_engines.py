@@ -0,0 +1,81 @@
+"""
+Benchmark for the /stream engines.
+
+Runs the same request through the `events` engine (astream_events) and the `updates`
+engine (graph update/custom/message streams) against an agent using the fake model,
+and reports how many raw events the graph produced per response and the CPU time
+spent per response.
+
+Run from the repo root:
+
+    USE_FAKE_MODEL=true PYTHONPATH=src python benchmarks/stream_engines.py
+
+With `--model fake-streaming` the model streams many tokens with realistic delays; set
+FAKE_MODEL_TTFT=0 and FAKE_MODEL_TOKEN_DELAY=0 to measure only the CPU cost per token.
+"""
+
+import argparse
+import asyncio
+import time
+
+from agents import get_agent
+from schema import StreamInput
+from schema.models import FakeModelName
+from service.service import STREAM_ENGINES, _parse_input, message_generator
+
+
+async def raw_events(engine: str, agent_id: str, user_input: StreamInput) -> int:
+    """Number of events the graph produces for one response with `engine`."""
+    agent = get_agent(agent_id)
+    kwargs, _ = _parse_input(user_input, agent_id=agent_id)
+    if engine == "events":
+        stream = agent.astream_events(**kwargs, version="v2")
+    else:
+        stream_mode = ["updates", "custom"]
+        if user_input.stream_tokens:
+            stream_mode.append("messages")
+        stream = agent.astream(**kwargs, stream_mode=stream_mode)
+    return sum([1 async for _ in stream])
+
+
+async def cpu_per_response(agent_id: str, user_input: StreamInput, number: int) -> float:
+    start = time.process_time()
+    for _ in range(number):
+        async for _ in message_generator(user_input, agent_id):
+            pass
+    return (time.process_time() - start) / number
+
+
+async def run(agent_id: str, number: int, stream_tokens: bool, model: FakeModelName) -> None:
+    print(f"{'engine':<10}{'raw events':>12}{'frames':>10}{'CPU/response (ms)':>20}")
+    for engine in STREAM_ENGINES:
+        user_input = StreamInput(
+            message="What is the weather in Tokyo?",
+            model=model,
+            stream_tokens=stream_tokens,
+            stream_engine=engine,
+        )
+        events = await raw_events(engine, agent_id, user_input)
+        frames = sum([1 async for _ in message_generator(user_input, agent_id)])
+        cpu = await cpu_per_response(agent_id, user_input, number)
+        print(f"{engine:<10}{events:>12}{frames:>10}{cpu * 1000:>20.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--agent", default="chatbot", help="agent to stream from")
+    parser.add_argument("--number", type=int, default=200, help="responses per engine")
+    parser.add_argument("--no-tokens", action="store_true", help="disable token streaming")
+    parser.add_argument(
+        "--model",
+        type=FakeModelName,
+        choices=list(FakeModelName),
+        default=FakeModelName.FAKE,
+        help="fake model to use; fake-streaming is configured with the FAKE_MODEL_* settings",
+    )
+    args = parser.parse_args()
+    asyncio.run(run(args.agent, args.number, not args.no_tokens, args.model))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,10 @@
-from agents.agents import DEFAULT_AGENT, get_agent, get_all_agent_info
+from agents.agents import DEFAULT_AGENT, get_agent, get_agent_stream_engine, get_all_agent_info
 from agents.nonarcisai import nonarcis_ai
 
-__all__ = ["get_agent", "get_all_agent_info", "DEFAULT_AGENT", "nonarcis_ai"]
+__all__ = [
+    "get_agent",
+    "get_agent_stream_engine",
+    "get_all_agent_info",
+    "DEFAULT_AGENT",
+    "nonarcis_ai",
+]
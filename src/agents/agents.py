@@ -5,7 +5,7 @@ from langgraph.graph.state import CompiledStateGraph
 from agents.bg_task_agent.bg_task_agent import bg_task_agent
 from agents.chatbot import chatbot
 from agents.research_assistant import research_assistant
-from schema import AgentInfo
+from schema import AgentInfo, StreamEngine
 from agents.nonarcisai import nonarcis_ai
 
 from agents.counselor_agent import counselor_agent
@@ -22,6 +22,8 @@ DEFAULT_AGENT = "research-assistant"
 class Agent:
     description: str
     graph: CompiledStateGraph
+    # Overrides the service's STREAM_ENGINE setting for this agent.
+    stream_engine: StreamEngine | None = None
 
 
 agents: dict[str, Agent] = {
@@ -56,6 +58,11 @@ def get_agent(agent_id: str) -> CompiledStateGraph:
     return agents[agent_id].graph
 
 
+def get_agent_stream_engine(agent_id: str) -> StreamEngine | None:
+    agent = agents.get(agent_id)
+    return agent.stream_engine if agent else None
+
+
 def get_all_agent_info() -> list[AgentInfo]:
     return [
         AgentInfo(key=agent_id, description=agent.description) for agent_id, agent in agents.items()
@@ -7,7 +7,7 @@ from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, MessagesState, StateGraph
 
 from agents.bg_task_agent.task import Task
-from core import get_model, settings
+from core import context_budget, get_model, settings, trim_to_budget
 
 
 class AgentState(MessagesState, total=False):
@@ -18,8 +18,9 @@ class AgentState(MessagesState, total=False):
 
 
 def wrap_model(model: BaseChatModel) -> RunnableSerializable[AgentState, AIMessage]:
+    budget = context_budget(model)
     preprocessor = RunnableLambda(
-        lambda state: state["messages"],
+        lambda state: trim_to_budget(state["messages"], budget),
         name="StateModifier",
     )
     return preprocessor | model
@@ -1,11 +1,18 @@
 from datetime import datetime
 from typing import List
-from langchain_core.messages import AIMessage, SystemMessage
+from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig, RunnableLambda, RunnableSerializable
 from langchain_core.language_models import BaseChatModel
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, MessagesState, StateGraph
-from core import get_model, settings
+from core import (
+    SystemPrompt,
+    context_budget,
+    get_model,
+    report_prompt_cache_usage,
+    settings,
+    trim_to_budget,
+)
 
 class ToxicityAnalysis:
     def __init__(self):
@@ -81,12 +88,16 @@ You must provide your response in JSON format with the following structure:
 Today's date is {current_date}.
 """
 
+cached_system_prompt = SystemPrompt(system_prompt)
+
 def wrap_model(model: BaseChatModel) -> RunnableSerializable[AgentState, AIMessage]:
+    system_message = cached_system_prompt.for_model(model)
+    budget = context_budget(model)
     preprocessor = RunnableLambda(
-        lambda state: [SystemMessage(content=system_prompt)] + state["messages"],
+        lambda state: trim_to_budget([system_message] + state["messages"], budget),
         name="StateModifier",
     )
-    return preprocessor | model
+    return preprocessor | model | RunnableLambda(report_prompt_cache_usage)
 
 async def acall_model(state: AgentState, config: RunnableConfig) -> AgentState:
     try:
@@ -2,9 +2,11 @@ from enum import Enum
 
 from langchain_core.messages import AIMessage, AnyMessage, HumanMessage
 from langchain_core.prompts import PromptTemplate
+from langgraph.constants import TAG_NOSTREAM
 from pydantic import BaseModel, Field
 
 from core import get_model, settings
+from core.metrics import LLAMA_GUARD_LATENCY
 from schema.models import GroqModelName
 
 
@@ -81,7 +83,10 @@ class LlamaGuard:
             print("GROQ_API_KEY not set, skipping LlamaGuard")
             self.model = None
             return
-        self.model = get_model(GroqModelName.LLAMA_GUARD_3_8B).with_config(tags=["llama_guard"])
+        # TAG_NOSTREAM keeps the guard's output out of graph "messages" streams
+        self.model = get_model(GroqModelName.LLAMA_GUARD_3_8B).with_config(
+            tags=["llama_guard", TAG_NOSTREAM]
+        )
         self.prompt = PromptTemplate.from_template(llama_guard_instructions)
 
     def _compile_prompt(self, role: str, messages: list[AnyMessage]) -> str:
@@ -96,14 +101,16 @@ class LlamaGuard:
         if self.model is None:
             return LlamaGuardOutput(safety_assessment=SafetyAssessment.SAFE)
         compiled_prompt = self._compile_prompt(role, messages)
-        result = self.model.invoke([HumanMessage(content=compiled_prompt)])
+        with LLAMA_GUARD_LATENCY.labels(role).time():
+            result = self.model.invoke([HumanMessage(content=compiled_prompt)])
         return parse_llama_guard_output(result.content)
 
     async def ainvoke(self, role: str, messages: list[AnyMessage]) -> LlamaGuardOutput:
         if self.model is None:
             return LlamaGuardOutput(safety_assessment=SafetyAssessment.SAFE)
         compiled_prompt = self._compile_prompt(role, messages)
-        result = await self.model.ainvoke([HumanMessage(content=compiled_prompt)])
+        with LLAMA_GUARD_LATENCY.labels(role).time():
+            result = await self.model.ainvoke([HumanMessage(content=compiled_prompt)])
         return parse_llama_guard_output(result.content)
 
 
@@ -1,11 +1,19 @@
 from datetime import datetime
 from typing import List
-from langchain_core.messages import AIMessage, SystemMessage, HumanMessage
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.runnables import RunnableConfig, RunnableLambda, RunnableSerializable
 from langchain_core.language_models import BaseChatModel
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, MessagesState, StateGraph
-from core import get_model, settings
+from agents.summarization import ConversationSummary, RollingSummary
+from core import (
+    SystemPrompt,
+    context_budget,
+    get_model,
+    report_prompt_cache_usage,
+    settings,
+    trim_to_budget,
+)
 
 # Simplified ToxicityAnalysis type
 class ToxicityAnalysis:
@@ -18,6 +26,7 @@ class ToxicityAnalysis:
 # Remove RemainingSteps since it's not defined
 class AgentState(MessagesState, total=False):
     memory: List[dict]
+    summary: ConversationSummary
     analysis: ToxicityAnalysis
 
 current_date = datetime.now().strftime("%B %d, %Y")
@@ -129,23 +138,46 @@ Today's date is {current_date}.
 
 Remember: While you're knowledgeable about narcissistic patterns and toxic relationships, your primary role is being that insightful friend who helps others see their situations more clearly while supporting their journey to healthier relationships."""
 
+cached_system_prompt = SystemPrompt(system_prompt)
+
+# Long threads: past SUMMARY_MAX_TOKENS, older turns are folded into state["summary"].
+memory_policy = RollingSummary(
+    max_tokens=settings.SUMMARY_MAX_TOKENS, keep_last=settings.SUMMARY_KEEP_LAST
+)
+
 def wrap_model(model: BaseChatModel) -> RunnableSerializable[AgentState, AIMessage]:
+    system_message = cached_system_prompt.for_model(model)
+    budget = context_budget(model)
     preprocessor = RunnableLambda(
-        lambda state: [SystemMessage(content=system_prompt)] + state["messages"],
+        lambda state: trim_to_budget(
+            memory_policy.context(system_message, state["messages"], state.get("summary")),
+            budget,
+        ),
         name="StateModifier",
     )
-    return preprocessor | model
+    return preprocessor | model | RunnableLambda(report_prompt_cache_usage)
 
 async def acall_model(state: AgentState, config: RunnableConfig) -> AgentState:
+    summary = None
     try:
         m = get_model(config["configurable"].get("model", settings.DEFAULT_MODEL))
+        summary = await memory_policy.aupdate(
+            state["messages"], state.get("summary"), m, config
+        )
+        if summary is not None:
+            state = {**state, "summary": summary}
         model_runnable = wrap_model(m)
         response = await model_runnable.ainvoke(state, config)
-        
+        if summary is not None:
+            return {"messages": [response], "summary": summary}
         return {"messages": [response]}
     except Exception as e:
         print(f"Error in acall_model: {e}")
-        return {"messages": [AIMessage(content="I apologize, but I encountered an error processing your request. Please try again.")]}
+        apology = AIMessage(content="I apologize, but I encountered an error processing your request. Please try again.")
+        # Keep a new summary even if the model call failed, so it is not made again.
+        if summary is not None:
+            return {"messages": [apology], "summary": summary}
+        return {"messages": [apology]}
 
 # Define the graph
 agent = StateGraph(AgentState)
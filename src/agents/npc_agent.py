@@ -1,12 +1,19 @@
 from datetime import datetime
 from typing import Literal
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.messages import AIMessage, SystemMessage
+from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig, RunnableLambda, RunnableSerializable
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, MessagesState, StateGraph
 
-from core import get_model, settings
+from core import (
+    SystemPrompt,
+    context_budget,
+    get_model,
+    report_prompt_cache_usage,
+    settings,
+    trim_to_budget,
+)
 
 class AgentState(MessagesState, total=False):
     """State for the NPC agent."""
@@ -74,13 +81,18 @@ Begin your response with the two draft tweets as described. If no corrections ar
 DO NOT OVER USE THE EMOJIS OR THE HASTHTAG BE AS REAL AS POSSIBLE DO
 """
 
+cached_instructions = SystemPrompt(instructions)
+
 def wrap_model(model: BaseChatModel) -> RunnableSerializable[AgentState, AIMessage]:
+    system_message = cached_instructions.for_model(model)
+    budget = context_budget(model)
+
     def add_instructions(state: AgentState):
         # Prepend the updated instructions as the system message.
-        return [SystemMessage(content=instructions)] + state["messages"]
+        return trim_to_budget([system_message] + state["messages"], budget)
     
     preprocessor = RunnableLambda(add_instructions, name="StateModifier")
-    return preprocessor | model
+    return preprocessor | model | RunnableLambda(report_prompt_cache_usage)
 
 async def acall_model(state: AgentState, config: RunnableConfig) -> AgentState:
     m = get_model(config["configurable"].get("model", settings.DEFAULT_MODEL))
@@ -4,7 +4,7 @@ from typing import Literal
 from langchain_community.tools import DuckDuckGoSearchResults, OpenWeatherMapQueryRun
 from langchain_community.utilities import OpenWeatherMapAPIWrapper
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.messages import AIMessage, SystemMessage
+from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig, RunnableLambda, RunnableSerializable
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, MessagesState, StateGraph
@@ -13,7 +13,14 @@ from langgraph.prebuilt import ToolNode
 
 from agents.llama_guard import LlamaGuard, LlamaGuardOutput, SafetyAssessment
 from agents.tools import calculator
-from core import get_model, settings
+from core import (
+    SystemPrompt,
+    context_budget,
+    get_model,
+    report_prompt_cache_usage,
+    settings,
+    trim_to_budget,
+)
 
 
 class AgentState(MessagesState, total=False):
@@ -52,13 +59,18 @@ instructions = f"""
     """
 
 
+cached_instructions = SystemPrompt(instructions)
+
+
 def wrap_model(model: BaseChatModel) -> RunnableSerializable[AgentState, AIMessage]:
+    system_message = cached_instructions.for_model(model)
+    budget = context_budget(model)
     model = model.bind_tools(tools)
     preprocessor = RunnableLambda(
-        lambda state: [SystemMessage(content=instructions)] + state["messages"],
+        lambda state: trim_to_budget([system_message] + state["messages"], budget),
         name="StateModifier",
     )
-    return preprocessor | model
+    return preprocessor | model | RunnableLambda(report_prompt_cache_usage)
 
 
 def format_safety_message(safety: LlamaGuardOutput) -> AIMessage:
@@ -0,0 +1,139 @@
+"""
+Rolling conversation summarization, to bound the context sent to the model.
+
+Agents opt in with a RollingSummary memory policy. Once the messages not yet
+summarized exceed `max_tokens`, all but the last `keep_last` of them are folded into a
+running summary kept in the agent state. From then on the model gets the summary and
+the messages after it, not the whole thread. The summary is appended to the agent's
+system message rather than sent as a message of its own, since some providers (Gemini,
+Anthropic on Bedrock) only accept a single, leading system message. Each update only summarizes the newly
+folded messages on top of the previous summary. The state still holds every message,
+so /history is unaffected.
+"""
+
+from collections.abc import Callable, Sequence
+from typing import TypedDict
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AnyMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+    get_buffer_string,
+)
+from langchain_core.runnables import RunnableConfig
+from langgraph.constants import TAG_NOSTREAM
+
+from core.tokens import count_tokens
+
+TokenCounter = Callable[[Sequence[BaseMessage]], int]
+
+SUMMARY_PROMPT = """\
+You maintain a running summary of a conversation between a user and an AI assistant.
+Extend the summary so far with the new messages. Keep the facts, names, feelings,
+decisions and open questions the assistant needs to continue the conversation, and
+drop small talk. Reply with the updated summary only."""
+
+
+class ConversationSummary(TypedDict):
+    content: str
+    # ID of the last message folded into the summary.
+    last_message_id: str
+
+
+class RollingSummary:
+    def __init__(
+        self,
+        max_tokens: int | None,
+        keep_last: int,
+        token_counter: TokenCounter = count_tokens,
+        prompt: str = SUMMARY_PROMPT,
+    ) -> None:
+        # Summarization is disabled while max_tokens is None.
+        self.max_tokens = max_tokens
+        self.keep_last = keep_last
+        self.token_counter = token_counter
+        self.prompt = prompt
+
+    def unsummarized(
+        self, messages: list[AnyMessage], summary: ConversationSummary | None
+    ) -> list[AnyMessage]:
+        """The messages after the last one folded into `summary`."""
+        if summary is None:
+            return messages
+        for i in range(len(messages) - 1, -1, -1):
+            if messages[i].id == summary["last_message_id"]:
+                return messages[i + 1 :]
+        return messages
+
+    def context(
+        self,
+        system_message: SystemMessage,
+        messages: list[AnyMessage],
+        summary: ConversationSummary | None,
+    ) -> list[AnyMessage]:
+        """
+        The messages to send to the model: the system message with the summary appended,
+        then the unsummarized messages.
+        """
+        if summary is None:
+            return [system_message, *messages]
+        text = f"Summary of the earlier conversation:\n{summary['content']}"
+        if isinstance(system_message.content, str):
+            content: str | list = f"{system_message.content}\n\n{text}"
+        else:
+            # A separate block, so a cacheable prompt prefix stays cacheable.
+            content = [*system_message.content, {"type": "text", "text": text}]
+        return [
+            SystemMessage(
+                content=content,
+                id=f"{system_message.id}-summary-{summary['last_message_id']}",
+            ),
+            *self.unsummarized(messages, summary),
+        ]
+
+    def _split(self, messages: list[AnyMessage]) -> int:
+        """Index of the first message to keep, never separating tool results from their call."""
+        split = max(len(messages) - self.keep_last, 0)
+        while 0 < split < len(messages) and isinstance(messages[split], ToolMessage):
+            split -= 1
+        return split
+
+    async def aupdate(
+        self,
+        messages: list[AnyMessage],
+        summary: ConversationSummary | None,
+        model: BaseChatModel,
+        config: RunnableConfig | None = None,
+    ) -> ConversationSummary | None:
+        """
+        Fold older messages into the summary if the unsummarized messages exceed
+        max_tokens. Returns the new summary, or None if it is unchanged.
+        """
+        if self.max_tokens is None:
+            return None
+        pending = self.unsummarized(messages, summary)
+        if self.token_counter(pending) <= self.max_tokens:
+            return None
+        fold = pending[: self._split(pending)]
+        if not fold:
+            return None
+        previous = summary["content"] if summary is not None else "(none yet)"
+        request = [
+            SystemMessage(content=self.prompt),
+            HumanMessage(
+                content=f"Summary so far:\n{previous}\n\nNew messages:\n{get_buffer_string(fold)}"
+            ),
+        ]
+        # TAG_NOSTREAM keeps the summary out of the tokens streamed to the user.
+        response = await model.with_config(tags=["summarization", TAG_NOSTREAM]).ainvoke(
+            request, config
+        )
+        content = response.content
+        if not isinstance(content, str):
+            content = "".join(
+                part if isinstance(part, str) else part.get("text", "") for part in content
+            )
+        return ConversationSummary(content=content, last_message_id=fold[-1].id)
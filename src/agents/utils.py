@@ -3,7 +3,8 @@ from typing import Any
 from langchain_core.callbacks import adispatch_custom_event
 from langchain_core.messages import ChatMessage
 from langchain_core.runnables import RunnableConfig
-from langchain_core.runnables.config import merge_configs
+from langchain_core.runnables.config import ensure_config, merge_configs
+from langgraph.constants import CONFIG_KEY_STREAM_WRITER
 from pydantic import BaseModel, Field
 
 
@@ -28,3 +29,7 @@ class CustomData(BaseModel):
             data=self.to_langchain(),
             config=merge_configs(config, dispatch_config),
         )
+        # Also write to the graph's custom stream, when streaming with stream_mode="custom"
+        writer = ensure_config(config)["configurable"].get(CONFIG_KEY_STREAM_WRITER)
+        if writer is not None:
+            writer(self.to_langchain())
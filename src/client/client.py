@@ -1,17 +1,30 @@
+import asyncio
 import json
 import os
 from collections.abc import AsyncGenerator, Generator
+from contextlib import asynccontextmanager
 from typing import Any
+from uuid import uuid4
 
 import httpx
 
+try:
+    from opentelemetry import propagate
+except ImportError:  # Not in the `client` dependency group; traces are then not continued.
+    propagate = None
+
 from schema import (
+    BatchInput,
+    BatchItemResult,
+    BatchResult,
     ChatHistory,
     ChatHistoryInput,
     ChatMessage,
     Feedback,
+    FeedbackBatch,
     ServiceMetadata,
     StreamInput,
+    TimingEvent,
     UserInput,
 )
 
@@ -20,6 +33,24 @@ class AgentClientError(Exception):
     pass
 
 
+def _parse_event(parsed: dict[str, Any]) -> ChatMessage | TimingEvent | str | None:
+    match parsed["type"]:
+        case "message":
+            # Convert the JSON formatted message to an AnyMessage
+            try:
+                return ChatMessage.model_validate(parsed["content"])
+            except Exception as e:
+                raise Exception(f"Server returned invalid message: {e}")
+        case "token":
+            # Yield the str token directly
+            return parsed["content"]
+        case "timing":
+            return TimingEvent.model_validate(parsed["content"])
+        case "error":
+            raise Exception(parsed["content"])
+    return None
+
+
 class AgentClient:
     """Client for interacting with the agent service."""
 
@@ -29,6 +60,7 @@ class AgentClient:
         agent: str = None,
         timeout: float | None = None,
         get_info: bool = True,
+        max_stream_reconnects: int = 3,
     ) -> None:
         """
         Initialize the client.
@@ -39,10 +71,13 @@ class AgentClient:
             timeout (float, optional): The timeout for requests.
             get_info (bool, optional): Whether to fetch agent information on init.
                 Default: True
+            max_stream_reconnects (int, optional): How many times astream() reconnects
+                and resumes a dropped stream before giving up. Default: 3
         """
         self.base_url = base_url
         self.auth_secret = os.getenv("AUTH_SECRET")
         self.timeout = timeout
+        self.max_stream_reconnects = max_stream_reconnects
         self.info: ServiceMetadata | None = None
         self.agent: str | None = None
         if get_info:
@@ -55,6 +90,9 @@ class AgentClient:
         headers = {}
         if self.auth_secret:
             headers["Authorization"] = f"Bearer {self.auth_secret}"
+        # Continue the caller's trace, if any, in the service.
+        if propagate is not None:
+            propagate.inject(headers)
         return headers
 
     def retrieve_info(self) -> None:
@@ -148,7 +186,86 @@ class AgentClient:
 
         return ChatMessage.model_validate(response.json())
 
-    def _parse_stream_line(self, line: str) -> ChatMessage | str | None:
+    def _batch_request(
+        self, messages: list[str | UserInput], model: str | None, max_concurrency: int | None
+    ) -> BatchInput:
+        if not self.agent:
+            raise AgentClientError("No agent selected. Use update_agent() to select an agent.")
+        inputs = [
+            m if isinstance(m, UserInput) else UserInput(message=m, model=model) for m in messages
+        ]
+        return BatchInput(inputs=inputs, max_concurrency=max_concurrency)
+
+    async def abatch_invoke(
+        self,
+        messages: list[str | UserInput],
+        model: str | None = None,
+        max_concurrency: int | None = None,
+    ) -> list[BatchItemResult]:
+        """
+        Invoke the agent on many inputs in one request, asynchronously.
+
+        Args:
+            messages (list[str | UserInput]): Messages to send to the agent. Pass a
+                UserInput to also set a thread_id or a per-input model.
+            model (str, optional): LLM model to use for plain string messages
+            max_concurrency (int, optional): Maximum number of inputs the service runs
+                at once. Capped by the service.
+
+        Returns:
+            list[BatchItemResult]: One result per message, in order. Failed inputs have
+                `error` set instead of `output`.
+        """
+        request = self._batch_request(messages, model, max_concurrency)
+        async with httpx.AsyncClient() as client:
+            try:
+                response = await client.post(
+                    f"{self.base_url}/{self.agent}/invoke/batch",
+                    json=request.model_dump(),
+                    headers=self._headers,
+                    timeout=self.timeout,
+                )
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                raise AgentClientError(f"Error: {e}")
+
+        return BatchResult.model_validate(response.json()).results
+
+    def batch_invoke(
+        self,
+        messages: list[str | UserInput],
+        model: str | None = None,
+        max_concurrency: int | None = None,
+    ) -> list[BatchItemResult]:
+        """
+        Invoke the agent on many inputs in one request, synchronously.
+
+        Args:
+            messages (list[str | UserInput]): Messages to send to the agent. Pass a
+                UserInput to also set a thread_id or a per-input model.
+            model (str, optional): LLM model to use for plain string messages
+            max_concurrency (int, optional): Maximum number of inputs the service runs
+                at once. Capped by the service.
+
+        Returns:
+            list[BatchItemResult]: One result per message, in order. Failed inputs have
+                `error` set instead of `output`.
+        """
+        request = self._batch_request(messages, model, max_concurrency)
+        try:
+            response = httpx.post(
+                f"{self.base_url}/{self.agent}/invoke/batch",
+                json=request.model_dump(),
+                headers=self._headers,
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise AgentClientError(f"Error: {e}")
+
+        return BatchResult.model_validate(response.json()).results
+
+    def _parse_stream_line(self, line: str) -> ChatMessage | TimingEvent | str | None:
         line = line.strip()
         if line.startswith("data: "):
             data = line[6:]
@@ -158,18 +275,7 @@ class AgentClient:
                 parsed = json.loads(data)
             except Exception as e:
                 raise Exception(f"Error JSON parsing message from server: {e}")
-            match parsed["type"]:
-                case "message":
-                    # Convert the JSON formatted message to an AnyMessage
-                    try:
-                        return ChatMessage.model_validate(parsed["content"])
-                    except Exception as e:
-                        raise Exception(f"Server returned invalid message: {e}")
-                case "token":
-                    # Yield the str token directly
-                    return parsed["content"]
-                case "error":
-                    raise Exception(parsed["content"])
+            return _parse_event(parsed)
         return None
 
     def stream(
@@ -178,7 +284,8 @@ class AgentClient:
         model: str | None = None,
         thread_id: str | None = None,
         stream_tokens: bool = True,
-    ) -> Generator[ChatMessage | str, None, None]:
+        debug_timings: bool = False,
+    ) -> Generator[ChatMessage | TimingEvent | str, None, None]:
         """
         Stream the agent's response synchronously.
 
@@ -192,13 +299,17 @@ class AgentClient:
             thread_id (str, optional): Thread ID for continuing a conversation
             stream_tokens (bool, optional): Stream tokens as they are generated
                 Default: True
+            debug_timings (bool, optional): Also yield a TimingEvent for each step
+                of the run. Default: False
 
         Returns:
-            Generator[ChatMessage | str, None, None]: The response from the agent
+            Generator[ChatMessage | TimingEvent | str, None, None]: The response from the agent
         """
         if not self.agent:
             raise AgentClientError("No agent selected. Use update_agent() to select an agent.")
-        request = StreamInput(message=message, stream_tokens=stream_tokens)
+        request = StreamInput(
+            message=message, stream_tokens=stream_tokens, debug_timings=debug_timings
+        )
         if thread_id:
             request.thread_id = thread_id
         if model:
@@ -213,7 +324,7 @@ class AgentClient:
             ) as response:
                 response.raise_for_status()
                 for line in response.iter_lines():
-                    if line.strip():
+                    if line.strip() and not line.startswith("id: "):
                         parsed = self._parse_stream_line(line)
                         if parsed is None:
                             break
@@ -227,7 +338,8 @@ class AgentClient:
         model: str | None = None,
         thread_id: str | None = None,
         stream_tokens: bool = True,
-    ) -> AsyncGenerator[ChatMessage | str, None]:
+        debug_timings: bool = False,
+    ) -> AsyncGenerator[ChatMessage | TimingEvent | str, None]:
         """
         Stream the agent's response asynchronously.
 
@@ -235,41 +347,110 @@ class AgentClient:
         If stream_tokens is True (the default value), the response will also yield
         content tokens from streaming modelsas they are generated.
 
+        If the connection drops mid-stream, the client reconnects with the last
+        received event ID and resumes the same run, up to max_stream_reconnects times.
+
         Args:
             message (str): The message to send to the agent
             model (str, optional): LLM model to use for the agent
             thread_id (str, optional): Thread ID for continuing a conversation
             stream_tokens (bool, optional): Stream tokens as they are generated
                 Default: True
+            debug_timings (bool, optional): Also yield a TimingEvent for each step
+                of the run. Default: False
 
         Returns:
-            AsyncGenerator[ChatMessage | str, None]: The response from the agent
+            AsyncGenerator[ChatMessage | TimingEvent | str, None]: The response from the agent
         """
         if not self.agent:
             raise AgentClientError("No agent selected. Use update_agent() to select an agent.")
-        request = StreamInput(message=message, stream_tokens=stream_tokens)
+        request = StreamInput(
+            message=message, stream_tokens=stream_tokens, debug_timings=debug_timings
+        )
         if thread_id:
             request.thread_id = thread_id
         if model:
             request.model = model
+        last_event_id: str | None = None
+        reconnects = 0
         async with httpx.AsyncClient() as client:
-            try:
-                async with client.stream(
-                    "POST",
-                    f"{self.base_url}/{self.agent}/stream",
-                    json=request.model_dump(),
-                    headers=self._headers,
-                    timeout=self.timeout,
-                ) as response:
-                    response.raise_for_status()
-                    async for line in response.aiter_lines():
-                        if line.strip():
+            while True:
+                try:
+                    async with self._astream_request(client, request, last_event_id) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.strip():
+                                continue
+                            if line.startswith("id: "):
+                                last_event_id = line[4:].strip()
+                                reconnects = 0
+                                continue
                             parsed = self._parse_stream_line(line)
                             if parsed is None:
-                                break
+                                return
                             yield parsed
-            except httpx.HTTPError as e:
-                raise AgentClientError(f"Error: {e}")
+                    # The server closed the stream before [DONE]; resume if we can.
+                    if last_event_id is None:
+                        return
+                    raise httpx.RemoteProtocolError("Stream ended before [DONE]")
+                except httpx.TransportError as e:
+                    if last_event_id is None or reconnects >= self.max_stream_reconnects:
+                        raise AgentClientError(f"Error: {e}")
+                    await asyncio.sleep(min(0.5 * 2**reconnects, 5.0))
+                    reconnects += 1
+                except httpx.HTTPError as e:
+                    raise AgentClientError(f"Error: {e}")
+
+    def _astream_request(
+        self, client: httpx.AsyncClient, request: StreamInput, last_event_id: str | None
+    ):
+        if last_event_id is None:
+            return client.stream(
+                "POST",
+                f"{self.base_url}/{self.agent}/stream",
+                json=request.model_dump(),
+                headers=self._headers,
+                timeout=self.timeout,
+            )
+        run_id = last_event_id.rpartition(":")[0]
+        return client.stream(
+            "GET",
+            f"{self.base_url}/runs/{run_id}/stream",
+            headers={**self._headers, "Last-Event-ID": last_event_id},
+            timeout=self.timeout,
+        )
+
+    @asynccontextmanager
+    async def aconnect(self) -> AsyncGenerator["AgentSession", None]:
+        """
+        Open a WebSocket session that multiplexes many agent runs on one connection.
+
+        Requires the `websockets` package.
+
+        Example:
+            async with client.aconnect() as session:
+                run_a = await session.start("Tell me a joke", agent="chatbot")
+                run_b = await session.start("What's the weather in Tokyo?")
+                async for event in session.events(run_a):
+                    ...
+        """
+        try:
+            from websockets.asyncio.client import connect
+        except ImportError:
+            raise AgentClientError("The websockets package is required for aconnect()")
+
+        ws_url = "ws" + self.base_url.removeprefix("http") + "/ws"
+        try:
+            websocket = await connect(
+                ws_url, additional_headers=self._headers, open_timeout=self.timeout
+            )
+        except (OSError, TimeoutError) as e:
+            raise AgentClientError(f"Error: {e}")
+        session = AgentSession(websocket, default_agent=self.agent)
+        try:
+            yield session
+        finally:
+            await session.aclose()
 
     async def acreate_feedback(
         self, run_id: str, key: str, score: float, kwargs: dict[str, Any] = {}
@@ -295,21 +476,55 @@ class AgentClient:
             except httpx.HTTPError as e:
                 raise AgentClientError(f"Error: {e}")
 
+    async def acreate_feedback_batch(self, feedback: list[Feedback]) -> None:
+        """
+        Create feedback records for many runs in one request.
+
+        Args:
+            feedback (list[Feedback]): Feedback records, as for acreate_feedback
+        """
+        request = FeedbackBatch(feedback=feedback)
+        async with httpx.AsyncClient() as client:
+            try:
+                response = await client.post(
+                    f"{self.base_url}/feedback/batch",
+                    json=request.model_dump(),
+                    headers=self._headers,
+                    timeout=self.timeout,
+                )
+                response.raise_for_status()
+                response.json()
+            except httpx.HTTPError as e:
+                raise AgentClientError(f"Error: {e}")
+
     def get_history(
         self,
         thread_id: str,
+        *,
+        limit: int | None = None,
+        before: str | None = None,
+        after: str | None = None,
+        since: str | None = None,
     ) -> ChatHistory:
         """
         Get chat history.
 
         Args:
             thread_id (str, optional): Thread ID for identifying a conversation
+            limit (int, optional): Maximum number of messages, the most recent ones
+                unless a cursor is given. All messages by default.
+            before (str, optional): Message ID to return the messages before
+            after (str, optional): Message ID to return the messages after
+            since (str, optional): Message ID to return every newer message after
         """
-        request = ChatHistoryInput(thread_id=thread_id)
+        request = ChatHistoryInput(
+            thread_id=thread_id, limit=limit, before=before, after=after, since=since
+        )
+        url = f"{self.base_url}/{self.agent}/history" if self.agent else f"{self.base_url}/history"
         try:
             response = httpx.post(
-                f"{self.base_url}/history",
-                json=request.model_dump(),
+                url,
+                json=request.model_dump(exclude_none=True),
                 headers=self._headers,
                 timeout=self.timeout,
             )
@@ -318,3 +533,132 @@ class AgentClient:
             raise AgentClientError(f"Error: {e}")
 
         return ChatHistory.model_validate(response.json())
+
+    def iter_history(
+        self, thread_id: str, page_size: int = 100
+    ) -> Generator[ChatMessage, None, None]:
+        """
+        Iterate over the chat history from the most recent message backwards, fetching
+        `page_size` messages at a time as they are consumed.
+
+        Args:
+            thread_id (str): Thread ID for identifying a conversation
+            page_size (int, optional): Number of messages fetched per request
+        """
+        before = None
+        while True:
+            page = self.get_history(thread_id, limit=page_size, before=before)
+            yield from reversed(page.messages)
+            if not page.has_more or not page.messages or page.messages[0].id is None:
+                return
+            before = page.messages[0].id
+
+
+class AgentSession:
+    """
+    Multiplexed agent runs over a single WebSocket connection to the /ws endpoint.
+
+    Create one with AgentClient.aconnect(). Runs are started with start(), and the events
+    of each run are read with events(), which yields the same ChatMessage | TimingEvent | str
+    items as AgentClient.astream(). Events for different runs are routed by run_id, so any
+    number of runs can be consumed concurrently.
+    """
+
+    def __init__(self, websocket: Any, default_agent: str | None = None) -> None:
+        self._websocket = websocket
+        self._default_agent = default_agent
+        self._queues: dict[str, asyncio.Queue[dict[str, Any]]] = {}
+        self._reader = asyncio.create_task(self._read_loop())
+
+    async def _read_loop(self) -> None:
+        from websockets.exceptions import WebSocketException
+
+        try:
+            async for raw in self._websocket:
+                event = json.loads(raw)
+                queue = self._queues.get(event.get("run_id"))
+                if queue is not None:
+                    queue.put_nowait(event)
+        except (WebSocketException, OSError, ValueError) as e:
+            error = {"type": "error", "content": f"Connection error: {e}"}
+        else:
+            error = {"type": "error", "content": "Connection closed"}
+        for queue in self._queues.values():
+            queue.put_nowait(error)
+
+    async def start(
+        self,
+        message: str,
+        agent: str | None = None,
+        model: str | None = None,
+        thread_id: str | None = None,
+        stream_tokens: bool = True,
+        debug_timings: bool = False,
+    ) -> str:
+        """
+        Start an agent run and return its run ID.
+
+        Args:
+            message (str): The message to send to the agent
+            agent (str, optional): Agent to run. Defaults to the client's agent.
+            model (str, optional): LLM model to use for the agent
+            thread_id (str, optional): Thread ID for continuing a conversation
+            stream_tokens (bool, optional): Stream tokens as they are generated
+                Default: True
+            debug_timings (bool, optional): Also send a TimingEvent for each step
+                of the run. Default: False
+
+        Returns:
+            str: The run ID, used with events() and cancel()
+        """
+        if self._reader.done():
+            raise AgentClientError("Session is closed")
+        request = StreamInput(
+            message=message, stream_tokens=stream_tokens, debug_timings=debug_timings
+        )
+        if thread_id:
+            request.thread_id = thread_id
+        if model:
+            request.model = model
+        run_id = str(uuid4())
+        self._queues[run_id] = asyncio.Queue()
+        await self._websocket.send(
+            json.dumps(
+                {
+                    "type": "start",
+                    "run_id": run_id,
+                    "agent_id": agent or self._default_agent,
+                    "input": request.model_dump(mode="json"),
+                }
+            )
+        )
+        return run_id
+
+    async def cancel(self, run_id: str) -> None:
+        """Cancel a run. Its events() iterator ends after the server confirms."""
+        await self._websocket.send(json.dumps({"type": "cancel", "run_id": run_id}))
+
+    async def events(self, run_id: str) -> AsyncGenerator[ChatMessage | TimingEvent | str, None]:
+        """Yield the messages, tokens and timings of a run until it finishes."""
+        queue = self._queues.get(run_id)
+        if queue is None:
+            raise AgentClientError(f"Unknown run: {run_id}")
+        try:
+            while True:
+                event = await queue.get()
+                match event["type"]:
+                    case "started":
+                        continue
+                    case "done" | "cancelled":
+                        return
+                    case "error":
+                        raise AgentClientError(event["content"])
+                parsed = _parse_event(event)
+                if parsed is not None:
+                    yield parsed
+        finally:
+            self._queues.pop(run_id, None)
+
+    async def aclose(self) -> None:
+        await self._websocket.close()
+        await self._reader
@@ -1,4 +1,13 @@
-from core.llm import get_model
+from core.llm import SystemPrompt, context_budget, get_model, report_prompt_cache_usage
 from core.settings import settings
+from core.tokens import count_tokens, trim_to_budget
 
-__all__ = ["settings", "get_model"]
+__all__ = [
+    "settings",
+    "get_model",
+    "SystemPrompt",
+    "report_prompt_cache_usage",
+    "context_budget",
+    "count_tokens",
+    "trim_to_budget",
+]
@@ -0,0 +1,162 @@
+"""
+A fake chat model that streams like a real provider, for load tests with no network.
+
+Responses are streamed one word per token after a time to first token, with a delay
+between tokens, and their length is drawn from a normal distribution. Tool calls can be
+scripted: after each user message, the model makes the scripted calls to the tools it
+is bound to, in order, one per model call, and then answers. The random draws are
+seeded with the conversation, so the same conversation always gets the same response,
+whatever the concurrency.
+"""
+
+import asyncio
+import json
+import random
+import time
+from collections.abc import AsyncIterator, Callable, Iterator, Sequence
+from typing import Any
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.language_models.chat_models import (
+    BaseChatModel,
+    agenerate_from_stream,
+    generate_from_stream,
+)
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field
+
+from core.settings import FakeToolCall
+
+WORDS = [
+    "the", "service", "streams", "a", "response", "word", "by", "word", "so", "that",
+    "clients", "and", "load", "tests", "see", "realistic", "token", "timing", "without",
+    "calling", "any", "provider", "over", "the", "network",
+]  # fmt: skip
+
+
+class StreamingFakeChatModel(BaseChatModel):
+    model_name: str = "fake-streaming"
+    # Seconds before the first token, and between the following ones.
+    ttft: float = Field(default=0.2, ge=0)
+    token_delay: float = Field(default=0.02, ge=0)
+    # Mean and standard deviation of the number of tokens in a response.
+    output_tokens: int = Field(default=100, ge=1)
+    output_tokens_stddev: float = Field(default=0.0, ge=0)
+    tool_calls: list[FakeToolCall] = Field(default_factory=list)
+    seed: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"model_name": self.model_name}
+
+    def bind_tools(
+        self,
+        tools: Sequence[dict[str, Any] | type | Callable | BaseTool],
+        **kwargs: Any,
+    ) -> Runnable[LanguageModelInput, BaseMessage]:
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _next_tool_call(
+        self, messages: list[BaseMessage], tools: list[dict[str, Any]]
+    ) -> FakeToolCall | None:
+        bound = {t["function"]["name"] for t in tools}
+        script = [c for c in self.tool_calls if c.name in bound]
+        turn = next(
+            (i for i in range(len(messages) - 1, -1, -1) if messages[i].type == "human"), -1
+        )
+        made = sum(1 for m in messages[turn + 1 :] if isinstance(m, AIMessage) and m.tool_calls)
+        return script[made] if made < len(script) else None
+
+    def _chunks(
+        self, messages: list[BaseMessage], tools: list[dict[str, Any]]
+    ) -> Iterator[AIMessageChunk]:
+        """The chunks of the response to `messages`, without delays."""
+        last = messages[-1].content if messages else ""
+        rng = random.Random(f"{self.seed}:{len(messages)}:{last}")
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        if call := self._next_tool_call(messages, tools):
+            yield AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    tool_call_chunk(
+                        name=call.name,
+                        args=json.dumps(call.args),
+                        id=f"call_{rng.getrandbits(64):016x}",
+                        index=0,
+                    )
+                ],
+                usage_metadata={
+                    "input_tokens": input_tokens,
+                    "output_tokens": 1,
+                    "total_tokens": input_tokens + 1,
+                },
+            )
+            return
+
+        count = max(1, round(rng.gauss(self.output_tokens, self.output_tokens_stddev)))
+        for i in range(count):
+            word = rng.choice(WORDS)
+            usage = None
+            if i == count - 1:
+                usage = {
+                    "input_tokens": input_tokens,
+                    "output_tokens": count,
+                    "total_tokens": input_tokens + count,
+                }
+            yield AIMessageChunk(content=word if i == 0 else f" {word}", usage_metadata=usage)
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        for i, chunk in enumerate(self._chunks(messages, kwargs.get("tools", []))):
+            time.sleep(self.ttft if i == 0 else self.token_delay)
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager and isinstance(chunk.content, str) and chunk.content:
+                run_manager.on_llm_new_token(chunk.content, chunk=generation)
+            yield generation
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        for i, chunk in enumerate(self._chunks(messages, kwargs.get("tools", []))):
+            await asyncio.sleep(self.ttft if i == 0 else self.token_delay)
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager and isinstance(chunk.content, str) and chunk.content:
+                await run_manager.on_llm_new_token(chunk.content, chunk=generation)
+            yield generation
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return generate_from_stream(self._stream(messages, stop, None, **kwargs))
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop, None, **kwargs))
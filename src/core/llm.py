@@ -1,13 +1,18 @@
+import hashlib
 from functools import cache
-from typing import TypeAlias
+from typing import Any, TypeAlias
 
 from langchain_anthropic import ChatAnthropic
 from langchain_aws import ChatBedrock
 from langchain_community.chat_models import FakeListChatModel
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, SystemMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_groq import ChatGroq
 from langchain_openai import ChatOpenAI
 
+from core.fake_model import StreamingFakeChatModel
+from core.settings import settings
 from schema.models import (
     AllModelEnum,
     AnthropicModelName,
@@ -30,8 +35,26 @@ _MODEL_TABLE = {
     GroqModelName.LLAMA_GUARD_3_8B: "llama-guard-3-8b",
     AWSModelName.BEDROCK_HAIKU: "anthropic.claude-3-5-haiku-20241022-v1:0",
     FakeModelName.FAKE: "fake",
+    FakeModelName.FAKE_STREAMING: "fake-streaming",
 }
 
+# Context window of each model in _MODEL_TABLE, in tokens. None means unlimited.
+_CONTEXT_WINDOWS: dict[AllModelEnum, int | None] = {
+    OpenAIModelName.GPT_4O_MINI: 128_000,
+    OpenAIModelName.GPT_4O: 128_000,
+    AnthropicModelName.HAIKU_3: 200_000,
+    AnthropicModelName.HAIKU_35: 200_000,
+    AnthropicModelName.SONNET_35: 200_000,
+    GoogleModelName.GEMINI_15_FLASH: 1_048_576,
+    GroqModelName.LLAMA_31_8B: 131_072,
+    GroqModelName.LLAMA_31_70B: 131_072,
+    GroqModelName.LLAMA_GUARD_3_8B: 8_192,
+    AWSModelName.BEDROCK_HAIKU: 200_000,
+    FakeModelName.FAKE: None,
+    FakeModelName.FAKE_STREAMING: None,
+}
+_API_MODEL_NAMES = {api_name: model_name for model_name, api_name in _MODEL_TABLE.items()}
+
 ModelT: TypeAlias = ChatOpenAI | ChatAnthropic | ChatGoogleGenerativeAI | ChatGroq | ChatBedrock
 
 
@@ -46,7 +69,11 @@ def get_model(model_name: AllModelEnum, /) -> ModelT:
     if model_name in OpenAIModelName:
         return ChatOpenAI(model=api_model_name, temperature=0.5, streaming=True)
     if model_name in AnthropicModelName:
-        return ChatAnthropic(model=api_model_name, temperature=0.5, streaming=True)
+        # Prompt caching was a beta feature on older API versions; the header is a no-op once GA.
+        headers = {"anthropic-beta": "prompt-caching-2024-07-31"} if settings.PROMPT_CACHING else {}
+        return ChatAnthropic(
+            model=api_model_name, temperature=0.5, streaming=True, default_headers=headers
+        )
     if model_name in GoogleModelName:
         return ChatGoogleGenerativeAI(model=api_model_name, temperature=0.5, streaming=True)
     if model_name in GroqModelName:
@@ -55,5 +82,108 @@ def get_model(model_name: AllModelEnum, /) -> ModelT:
         return ChatGroq(model=api_model_name, temperature=0.5)
     if model_name in AWSModelName:
         return ChatBedrock(model_id=api_model_name, temperature=0.5)
+    if model_name == FakeModelName.FAKE_STREAMING:
+        return StreamingFakeChatModel(
+            ttft=settings.FAKE_MODEL_TTFT,
+            token_delay=settings.FAKE_MODEL_TOKEN_DELAY,
+            output_tokens=settings.FAKE_MODEL_OUTPUT_TOKENS,
+            output_tokens_stddev=settings.FAKE_MODEL_OUTPUT_TOKENS_STDDEV,
+            tool_calls=settings.FAKE_MODEL_TOOL_CALLS,
+            seed=settings.FAKE_MODEL_SEED,
+        )
     if model_name in FakeModelName:
         return FakeListChatModel(responses=["This is a test response from the fake model."])
+
+
+def context_budget(model: BaseChatModel) -> int | None:
+    """
+    Tokens of conversation to send to `model`: its context window less
+    CONTEXT_RESERVED_TOKENS for the response, and at most CONTEXT_MAX_TOKENS.
+    """
+    api_name = next(
+        (
+            name
+            for attr in ("model_name", "model", "model_id")
+            if isinstance(name := getattr(model, attr, None), str)
+        ),
+        "",
+    )
+    model_name = _API_MODEL_NAMES.get(api_name.removeprefix("models/"))
+    window = _CONTEXT_WINDOWS.get(model_name) if model_name is not None else None
+    budgets = [
+        budget
+        for budget in (
+            window - settings.CONTEXT_RESERVED_TOKENS if window is not None else None,
+            settings.CONTEXT_MAX_TOKENS,
+        )
+        if budget is not None
+    ]
+    return min(budgets) if budgets else None
+
+
+def supports_prompt_caching(model: BaseChatModel) -> bool:
+    """Whether prompt prefixes must be explicitly marked as cacheable for this model."""
+    return isinstance(model, ChatAnthropic)
+
+
+class SystemPrompt:
+    """
+    A static system prompt, created once at import time by the agent that uses it. Its
+    SystemMessage is built once, and when PROMPT_CACHING is enabled it is marked as a
+    cacheable prompt prefix for models that support it.
+    Providers such as OpenAI cache long prompt prefixes without being asked to.
+    The messages have IDs derived from the text, so their token counts are memoized.
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        message_id = f"system-{hashlib.sha256(text.encode()).hexdigest()[:16]}"
+        self.message = SystemMessage(content=text, id=message_id)
+        self.cacheable_message = SystemMessage(
+            content=[{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}],
+            id=f"{message_id}-cacheable",
+        )
+
+    def for_model(self, model: BaseChatModel) -> SystemMessage:
+        if settings.PROMPT_CACHING and supports_prompt_caching(model):
+            return self.cacheable_message
+        return self.message
+
+
+def _prompt_cache_tokens(message: AIMessage) -> tuple[int, int, int] | None:
+    """Total, cache read and cache write input tokens reported for a model response."""
+    if message.usage_metadata:
+        details: Any = message.usage_metadata.get("input_token_details") or {}
+        return (
+            message.usage_metadata["input_tokens"],
+            details.get("cache_read") or 0,
+            details.get("cache_creation") or 0,
+        )
+    # Fall back to the provider's raw usage, for integrations without usage_metadata.
+    usage = message.response_metadata.get("usage") or {}
+    if "cache_read_input_tokens" in usage or "cache_creation_input_tokens" in usage:
+        # Anthropic reports input_tokens excluding cache reads and writes.
+        read = usage.get("cache_read_input_tokens") or 0
+        creation = usage.get("cache_creation_input_tokens") or 0
+        return (usage.get("input_tokens") or 0) + read + creation, read, creation
+    token_usage = message.response_metadata.get("token_usage") or {}
+    if "prompt_tokens" in token_usage:
+        cached = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        return token_usage["prompt_tokens"], cached, 0
+    return None
+
+
+def report_prompt_cache_usage(message: AIMessage) -> AIMessage:
+    """
+    Add cached and uncached input token counts to the response metadata of a model
+    response, under `prompt_cache`, when the provider reports token usage.
+    """
+    if (tokens := _prompt_cache_tokens(message)) is None:
+        return message
+    total, cache_read, cache_creation = tokens
+    message.response_metadata["prompt_cache"] = {
+        "cached_input_tokens": cache_read,
+        "cache_creation_input_tokens": cache_creation,
+        "uncached_input_tokens": total - cache_read,
+    }
+    return message
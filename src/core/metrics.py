@@ -0,0 +1,149 @@
+"""
+Prometheus metrics for the service, exposed at /metrics.
+
+The collectors live in prometheus_client's default registry. Label values are bound
+once per run with `.labels()`, so recording a streamed token is only integer
+arithmetic on local variables.
+"""
+
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from functools import wraps
+from typing import Any
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from prometheus_client import Counter, Gauge, Histogram
+
+REQUEST_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+STORAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+REQUESTS = Counter(
+    "agent_requests",
+    "Agent runs by agent, model, endpoint and outcome (ok or error).",
+    ["agent_id", "model", "endpoint", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "agent_request_duration_seconds",
+    "Time to run an agent to completion.",
+    ["agent_id", "model", "endpoint"],
+    buckets=REQUEST_BUCKETS,
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "agent_stream_time_to_first_token_seconds",
+    "Time from the start of a streamed run to its first LLM token.",
+    ["agent_id", "model"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 30),
+)
+TOKENS_PER_SECOND = Histogram(
+    "agent_stream_tokens_per_second",
+    "Rate of streamed LLM tokens, from the first token to the end of the run.",
+    ["agent_id", "model"],
+    buckets=(1, 5, 10, 20, 40, 60, 100, 200, 500),
+)
+ACTIVE_STREAMS = Gauge("agent_active_streams", "Streamed runs in progress.")
+CHECKPOINTER_LATENCY = Histogram(
+    "checkpointer_operation_duration_seconds",
+    "Time spent in checkpointer reads and writes, by operation.",
+    ["operation"],
+    buckets=STORAGE_BUCKETS,
+)
+CHECKPOINTS_DELETED = Counter(
+    "checkpoints_deleted",
+    "Checkpoints deleted by the checkpoint retention policy.",
+)
+CHECKPOINT_RECLAIMED_BYTES = Counter(
+    "checkpoint_reclaimed_bytes",
+    "Bytes of the checkpoint database returned to the filesystem by incremental vacuum.",
+)
+LLAMA_GUARD_LATENCY = Histogram(
+    "llama_guard_duration_seconds",
+    "Time to classify a conversation with LlamaGuard, by the role checked.",
+    ["role"],
+    buckets=REQUEST_BUCKETS,
+)
+
+
+def record_run(agent_id: str, model: str, endpoint: str, status: str, duration: float) -> None:
+    REQUESTS.labels(agent_id, model, endpoint, status).inc()
+    REQUEST_LATENCY.labels(agent_id, model, endpoint).observe(duration)
+
+
+class StreamRecorder:
+    """
+    Metrics of one streamed run. Call token() for each streamed token and finish()
+    once when the run ends. The run counts as an active stream in between.
+    """
+
+    __slots__ = ("agent_id", "endpoint", "first_token", "model", "start", "tokens")
+
+    def __init__(self, agent_id: str, model: str, endpoint: str = "stream") -> None:
+        self.agent_id = agent_id
+        self.model = model
+        self.endpoint = endpoint
+        self.start = time.perf_counter()
+        self.first_token: float | None = None
+        self.tokens = 0
+        ACTIVE_STREAMS.inc()
+
+    def token(self) -> None:
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+        self.tokens += 1
+
+    def finish(self, status: str) -> None:
+        end = time.perf_counter()
+        ACTIVE_STREAMS.dec()
+        record_run(self.agent_id, self.model, self.endpoint, status, end - self.start)
+        if self.first_token is None:
+            return
+        TIME_TO_FIRST_TOKEN.labels(self.agent_id, self.model).observe(self.first_token - self.start)
+        if end > self.first_token:
+            TOKENS_PER_SECOND.labels(self.agent_id, self.model).observe(
+                self.tokens / (end - self.first_token)
+            )
+
+
+def _timed(method: Callable[..., Awaitable[Any]], histogram: Histogram) -> Callable[..., Any]:
+    @wraps(method)
+    async def timed(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+
+    return timed
+
+
+def _timed_iterator(
+    method: Callable[..., AsyncIterator[Any]], histogram: Histogram
+) -> Callable[..., AsyncIterator[Any]]:
+    """Time spent producing the items of an async iterator, not consuming them."""
+
+    @wraps(method)
+    async def timed(*args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        iterator = aiter(method(*args, **kwargs))
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = await anext(iterator)
+                except StopAsyncIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield item
+        finally:
+            histogram.observe(elapsed)
+
+    return timed
+
+
+def instrument_checkpointer(saver: BaseCheckpointSaver) -> BaseCheckpointSaver:
+    """Record the latency of the async methods of `saver`, which is changed in place."""
+    for operation in ("aget_tuple", "aput", "aput_writes"):
+        histogram = CHECKPOINTER_LATENCY.labels(operation)
+        setattr(saver, operation, _timed(getattr(saver, operation), histogram))
+    saver.alist = _timed_iterator(saver.alist, CHECKPOINTER_LATENCY.labels("alist"))  # type: ignore[method-assign]
+    return saver
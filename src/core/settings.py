@@ -1,9 +1,18 @@
-from typing import Annotated, Any
+from typing import Annotated, Any, Literal
 
 from dotenv import find_dotenv
-from pydantic import BeforeValidator, HttpUrl, SecretStr, TypeAdapter, computed_field
+from pydantic import (
+    BaseModel,
+    BeforeValidator,
+    Field,
+    HttpUrl,
+    SecretStr,
+    TypeAdapter,
+    computed_field,
+)
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from schema import StreamEngine
 from schema.models import (
     AllModelEnum,
     AnthropicModelName,
@@ -21,6 +30,26 @@ def check_str_is_http(x: str) -> str:
     return str(http_url_adapter.validate_python(x))
 
 
+class ApiKeyConfig(BaseModel):
+    """An API key accepted by the service, given as the key itself or its SHA-256 hex digest."""
+
+    name: str
+    key: SecretStr | None = None
+    key_sha256: str | None = None
+    # Sustained requests per second and bucket size; unset means unlimited.
+    requests_per_second: float | None = Field(default=None, gt=0)
+    burst: int | None = Field(default=None, ge=1)
+    # LLM tokens per minute, counted from model usage metadata; unset means unlimited.
+    tokens_per_minute: int | None = Field(default=None, ge=1)
+
+
+class FakeToolCall(BaseModel):
+    """A tool call scripted for the streaming fake model."""
+
+    name: str
+    args: dict[str, Any] = {}
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=find_dotenv(),
@@ -35,6 +64,10 @@ class Settings(BaseSettings):
     PORT: int = 80
 
     AUTH_SECRET: SecretStr | None = None
+    # Additional API keys with their own rate limits, as a JSON list of ApiKeyConfig, and/or
+    # a SQLite database with an api_keys table (see service.rate_limit.ApiKeyRegistry).
+    API_KEYS: list[ApiKeyConfig] = []
+    API_KEYS_DB: str | None = None
 
     OPENAI_API_KEY: SecretStr | None = None
     ANTHROPIC_API_KEY: SecretStr | None = None
@@ -42,6 +75,16 @@ class Settings(BaseSettings):
     GROQ_API_KEY: SecretStr | None = None
     USE_AWS_BEDROCK: bool = False
     USE_FAKE_MODEL: bool = False
+    # The "fake-streaming" model waits FAKE_MODEL_TTFT seconds for the first token and
+    # FAKE_MODEL_TOKEN_DELAY between tokens, and its responses have a normally distributed
+    # number of tokens. After each user message it makes the FAKE_MODEL_TOOL_CALLS to the
+    # tools it is bound to, in order, before answering.
+    FAKE_MODEL_TTFT: float = Field(default=0.2, ge=0)
+    FAKE_MODEL_TOKEN_DELAY: float = Field(default=0.02, ge=0)
+    FAKE_MODEL_OUTPUT_TOKENS: int = Field(default=100, ge=1)
+    FAKE_MODEL_OUTPUT_TOKENS_STDDEV: float = Field(default=0.0, ge=0)
+    FAKE_MODEL_TOOL_CALLS: list[FakeToolCall] = []
+    FAKE_MODEL_SEED: int = 0
 
     # If DEFAULT_MODEL is None, it will be set in model_post_init
     DEFAULT_MODEL: AllModelEnum | None = None  # type: ignore[assignment]
@@ -49,6 +92,131 @@ class Settings(BaseSettings):
 
     OPENWEATHERMAP_API_KEY: SecretStr | None = None
 
+    # Mark the agents' static system prompts as cacheable prompt prefixes for providers
+    # that need it (Anthropic). Cached and uncached input token counts are reported in the
+    # response metadata under "prompt_cache" either way.
+    PROMPT_CACHING: bool = False
+
+    # Conversations sent to a model are trimmed, oldest messages first, to its context
+    # window less CONTEXT_RESERVED_TOKENS for the response, and to CONTEXT_MAX_TOKENS.
+    CONTEXT_RESERVED_TOKENS: int = Field(default=4096, ge=0)
+    CONTEXT_MAX_TOKENS: int | None = Field(default=None, ge=1)
+
+    # Rolling summarization for agents with a RollingSummary memory policy: once a
+    # thread's unsummarized messages exceed SUMMARY_MAX_TOKENS, all but the last
+    # SUMMARY_KEEP_LAST are folded into a running summary sent in their place.
+    SUMMARY_MAX_TOKENS: int | None = Field(default=None, ge=1)
+    SUMMARY_KEEP_LAST: int = Field(default=10, ge=0)
+
+    # Where agent conversations are checkpointed: "memory" (lost on restart), a "sqlite"
+    # database file, or "postgres", through a pool of POSTGRES_POOL_MIN_SIZE to
+    # POSTGRES_POOL_MAX_SIZE connections to POSTGRES_URL.
+    CHECKPOINTER: Literal["memory", "sqlite", "postgres"] = "sqlite"
+    SQLITE_DB_PATH: str = "checkpoints.db"
+    # Use memory.sqlite.TunedAsyncSqliteSaver: synchronous=NORMAL, a separate read
+    # connection, and group commit of checkpoint writes arriving within
+    # SQLITE_COMMIT_WINDOW seconds.
+    SQLITE_TUNED: bool = False
+    SQLITE_COMMIT_WINDOW: float = Field(default=0.005, ge=0)
+    POSTGRES_URL: SecretStr | None = None
+    POSTGRES_POOL_MIN_SIZE: int = Field(default=1, ge=0)
+    POSTGRES_POOL_MAX_SIZE: int = Field(default=10, ge=1)
+    # Retention for the sqlite checkpointer, applied every CHECKPOINT_COMPACTION_INTERVAL
+    # seconds: keep the last CHECKPOINT_KEEP_LAST checkpoints of each thread and delete
+    # threads idle for more than CHECKPOINT_TTL seconds. Disabled while both are unset.
+    # Freed space is returned to the filesystem only if the database uses incremental
+    # vacuum. CHECKPOINT_VACUUM_REBUILD switches an existing database to it with a
+    # one-time full VACUUM, which blocks agent runs until it finishes.
+    CHECKPOINT_KEEP_LAST: int | None = Field(default=None, ge=1)
+    CHECKPOINT_TTL: float | None = Field(default=None, gt=0)
+    CHECKPOINT_COMPACTION_INTERVAL: float = Field(default=3600.0, gt=0)
+    CHECKPOINT_COMPACTION_BATCH_SIZE: int = Field(default=500, ge=1)
+    CHECKPOINT_VACUUM_PAGES: int = Field(default=1000, ge=1)
+    CHECKPOINT_VACUUM_REBUILD: bool = False
+
+    # Number of recent SSE events kept per run for Last-Event-ID replay, and how long
+    # (in seconds) a finished run stays replayable.
+    STREAM_BUFFER_SIZE: int = Field(default=1000, ge=1)
+    STREAM_BUFFER_TTL: float = 300.0
+    # Seconds a streaming run keeps going after its last client disconnected, so the client
+    # can resume with Last-Event-ID, before it is cancelled. 0 cancels right away.
+    STREAM_DISCONNECT_GRACE: float = Field(default=2.0, ge=0)
+    # Default streaming engine for agents that don't set one: "events" (astream_events) or
+    # "updates" (graph update/message/custom streams).
+    STREAM_ENGINE: StreamEngine = "events"
+
+    # Maximum number of concurrent runs on one /ws connection.
+    WS_MAX_RUNS_PER_CONNECTION: int = 16
+
+    # Upper bound on concurrently running inputs, and on inputs, per /invoke/batch request.
+    BATCH_MAX_CONCURRENCY: int = Field(default=8, ge=1)
+    BATCH_MAX_ITEMS: int = Field(default=1000, ge=1)
+
+    # Admission control for /invoke, /invoke/batch, /stream and /ws runs. Concurrency limits
+    # are service-wide and per agent (None is unlimited), with per-agent overrides given as
+    # JSON, e.g. {"research-assistant": 4}. Requests wait up to ADMISSION_QUEUE_TIMEOUT
+    # seconds for a slot in a queue of ADMISSION_MAX_QUEUE requests. If the event loop lags
+    # by more than ADMISSION_MAX_LOOP_LAG seconds, new requests are rejected.
+    ADMISSION_MAX_CONCURRENCY: int | None = None
+    ADMISSION_AGENT_MAX_CONCURRENCY: int | None = None
+    ADMISSION_AGENT_LIMITS: dict[str, int] = {}
+    ADMISSION_MAX_QUEUE: int = Field(default=100, ge=0)
+    ADMISSION_QUEUE_TIMEOUT: float = 30.0
+    ADMISSION_MAX_LOOP_LAG: float | None = None
+    ADMISSION_RETRY_AFTER: int = 1
+
+    # Queue backing the asynchronous /runs API, its database file when using "sqlite",
+    # and the number of runs executed concurrently. New runs are rejected with 429 while
+    # RUN_MAX_QUEUE_DEPTH runs are waiting for a worker.
+    RUN_QUEUE: Literal["memory", "sqlite"] = "memory"
+    RUN_QUEUE_DB: str = "runs.db"
+    RUN_WORKERS: int = Field(default=4, ge=1)
+    RUN_MAX_QUEUE_DEPTH: int = Field(default=1000, ge=0)
+
+    # Feedback is sent to LangSmith in the background, in batches of FEEDBACK_BATCH_SIZE
+    # or every FEEDBACK_FLUSH_INTERVAL seconds, retrying failed batches up to
+    # FEEDBACK_MAX_RETRIES times. At most FEEDBACK_MAX_PENDING records are held in
+    # memory; feedback that cannot be held or sent is appended to FEEDBACK_SPILL_PATH,
+    # if set, and resent later.
+    FEEDBACK_BATCH_SIZE: int = Field(default=100, ge=1)
+    FEEDBACK_FLUSH_INTERVAL: float = Field(default=1.0, gt=0)
+    FEEDBACK_MAX_PENDING: int = Field(default=10000, ge=1)
+    FEEDBACK_MAX_RETRIES: int = Field(default=3, ge=0)
+    FEEDBACK_SPILL_PATH: str | None = None
+
+    # Exact-match cache of /invoke responses for requests without a thread_id. Entries
+    # expire after RESPONSE_CACHE_TTL seconds, and least recently used entries are evicted
+    # beyond RESPONSE_CACHE_MAX_BYTES in memory. Set RESPONSE_CACHE_DB to also keep up to
+    # RESPONSE_CACHE_DB_MAX_BYTES of responses in a SQLite database.
+    RESPONSE_CACHE: bool = False
+    RESPONSE_CACHE_TTL: float = Field(default=3600.0, gt=0)
+    RESPONSE_CACHE_MAX_BYTES: int = Field(default=64 * 1024 * 1024, ge=0)
+    RESPONSE_CACHE_DB: str | None = None
+    RESPONSE_CACHE_DB_MAX_BYTES: int = Field(default=1024 * 1024 * 1024, ge=0)
+
+    # Semantic cache of /invoke responses for requests without a thread_id, using chromadb.
+    # An earlier answer is reused when its message's cosine similarity is at least
+    # SEMANTIC_CACHE_THRESHOLD. Set SEMANTIC_CACHE_PATH to persist the cache to a directory.
+    SEMANTIC_CACHE: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = Field(default=0.95, ge=0, le=1)
+    SEMANTIC_CACHE_TTL: float = Field(default=3600.0, gt=0)
+    SEMANTIC_CACHE_MAX_ENTRIES: int = Field(default=10000, ge=1)
+    SEMANTIC_CACHE_PATH: str | None = None
+
+    # OpenTelemetry tracing of requests, graph runs, nodes, and tool and model calls.
+    # OTEL_EXPORTER is "otlp" (to OTEL_EXPORTER_OTLP_ENDPOINT), "console", "file" (JSON
+    # lines appended to OTEL_TRACE_FILE) or None to disable tracing. A trace is kept if
+    # it has an error or takes at least TRACE_KEEP_SLOWER_THAN seconds, and otherwise
+    # with probability TRACE_SAMPLE_RATIO. At most TRACE_MAX_PENDING_SPANS spans of
+    # unfinished traces are held while waiting for that decision.
+    OTEL_EXPORTER: Literal["otlp", "console", "file"] | None = None
+    OTEL_EXPORTER_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    OTEL_TRACE_FILE: str = "traces.jsonl"
+    OTEL_SERVICE_NAME: str = "agent-service"
+    TRACE_SAMPLE_RATIO: float = Field(default=1.0, ge=0, le=1)
+    TRACE_KEEP_SLOWER_THAN: float | None = Field(default=None, ge=0)
+    TRACE_MAX_PENDING_SPANS: int = Field(default=10000, ge=1)
+
     LANGCHAIN_TRACING_V2: bool = False
     LANGCHAIN_PROJECT: str = "default"
     LANGCHAIN_ENDPOINT: Annotated[str, BeforeValidator(check_str_is_http)] = (
@@ -0,0 +1,116 @@
+"""
+Token counting and trimming of the messages sent to a model.
+
+Counts use tiktoken's cl100k_base encoding for every provider. That is exact for older
+OpenAI models and close enough for the others, since budgets leave room for the
+response. Each message is tokenized once: counts are memoized by message ID, or by a
+hash of the content for messages without one, such as system prompts built for each
+call, so a turn only tokenizes the messages that are new since the last one. If the
+encoding cannot be loaded (it is downloaded on first use), counts fall back to four
+characters per token.
+"""
+
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+logger = logging.getLogger(__name__)
+
+ENCODING = "cl100k_base"
+# Tokens of role and formatting overhead added per message.
+MESSAGE_OVERHEAD = 4
+
+
+def _content_text(content: str | list[str | dict]) -> str:
+    if isinstance(content, str):
+        return content
+    return "".join(part if isinstance(part, str) else part.get("text", "") for part in content)
+
+
+def _message_text(message: BaseMessage) -> str:
+    text = _content_text(message.content)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        text += json.dumps(message.tool_calls, default=str)
+    return text
+
+
+class TokenCounter:
+    def __init__(self, max_entries: int = 100_000) -> None:
+        self.max_entries = max_entries
+        self._counts: OrderedDict[str, int] = OrderedDict()
+        self._encoding: Any = None
+        self._encoding_failed = False
+
+    def _encode_length(self, text: str) -> int:
+        if self._encoding is None and not self._encoding_failed:
+            try:
+                import tiktoken
+
+                self._encoding = tiktoken.get_encoding(ENCODING)
+            except (ImportError, OSError, ValueError) as e:
+                logger.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+                self._encoding_failed = True
+        if self._encoding is None:
+            return len(text) // 4
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def _tokenize(self, message: BaseMessage) -> int:
+        return self._encode_length(_message_text(message)) + MESSAGE_OVERHEAD
+
+    def count_message(self, message: BaseMessage) -> int:
+        """
+        Tokens in `message`, memoized by ID, or by content if it has none. A message must
+        not change once it has an ID.
+        """
+        if message.id is not None:
+            key = message.id
+        else:
+            text = f"{message.type}\0{_message_text(message)}"
+            key = f"sha256:{hashlib.sha256(text.encode()).hexdigest()}"
+        count = self._counts.get(key)
+        if count is not None:
+            self._counts.move_to_end(key)
+            return count
+        count = self._counts[key] = self._tokenize(message)
+        if len(self._counts) > self.max_entries:
+            self._counts.popitem(last=False)
+        return count
+
+    def __call__(self, messages: Sequence[BaseMessage]) -> int:
+        return sum(self.count_message(m) for m in messages)
+
+
+count_tokens = TokenCounter()
+
+
+def trim_to_budget(
+    messages: list[BaseMessage], max_tokens: int | None, counter: TokenCounter = count_tokens
+) -> list[BaseMessage]:
+    """
+    The leading system messages and the most recent messages of `messages` that fit in
+    `max_tokens`. The kept conversation starts on a user message, so tool results are
+    never separated from their calls. The latest user turn is always kept, even if it
+    alone does not fit.
+    """
+    if max_tokens is None:
+        return messages
+    first = 0
+    while first < len(messages) and messages[first].type == "system":
+        first += 1
+    remaining = max_tokens - counter(messages[:first])
+    start = len(messages)
+    while start > first and (cost := counter.count_message(messages[start - 1])) <= remaining:
+        remaining -= cost
+        start -= 1
+    if start == first:
+        return messages
+
+    human = [i for i in range(first, len(messages)) if messages[i].type == "human"]
+    # Move forward to the next user message, or back to the last one if there is none.
+    start = next((i for i in human if i >= start), human[-1] if human else start)
+    return messages[:first] + messages[start:]
@@ -0,0 +1,312 @@
+"""
+OpenTelemetry tracing of agent runs.
+
+Spans form one trace per request: the HTTP request, the graph run, each graph node,
+and the tool and model calls made by a node. The request span continues the trace of
+an incoming `traceparent` header. Spans are exported over OTLP, or printed or written
+to a file as JSON lines for offline debugging.
+
+Sampling is tail-based: spans are held in memory until the local root span of their
+trace ends, then the whole trace is kept if it contains an error or took at least
+`keep_slower_than` seconds, and otherwise with probability `sample_ratio`.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+)
+from opentelemetry.trace import Span, SpanKind, Status, StatusCode
+
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("agent-service")
+_tracer_provider: TracerProvider | None = None
+
+
+class TailSampler(SpanProcessor):
+    """Decides which traces to export once their local root span has ended."""
+
+    def __init__(
+        self,
+        processor: SpanProcessor,
+        sample_ratio: float = 1.0,
+        keep_slower_than: float | None = None,
+        max_spans: int = 10000,
+    ) -> None:
+        self.processor = processor
+        self.sample_ratio = sample_ratio
+        self.keep_slower_than = keep_slower_than
+        self.max_spans = max_spans
+        self.kept = 0
+        self.dropped = 0
+        self._traces: OrderedDict[int, list[ReadableSpan]] = OrderedDict()
+        self._spans = 0
+        # Spans end on worker threads too, e.g. for sync tools.
+        self._lock = threading.Lock()
+
+    def on_end(self, span: ReadableSpan) -> None:
+        trace_id = span.context.trace_id
+        with self._lock:
+            self._traces.setdefault(trace_id, []).append(span)
+            self._spans += 1
+            finished = None
+            if span.parent is None or span.parent.is_remote:
+                finished = self._traces.pop(trace_id)
+                self._spans -= len(finished)
+            # Drop the oldest unfinished traces to bound memory.
+            while self._spans > self.max_spans and self._traces:
+                _, spans = self._traces.popitem(last=False)
+                self._spans -= len(spans)
+                self.dropped += 1
+        if finished is None:
+            return
+        if self._keep(span, finished):
+            self.kept += 1
+            for s in finished:
+                self.processor.on_end(s)
+        else:
+            self.dropped += 1
+
+    def _keep(self, root: ReadableSpan, spans: list[ReadableSpan]) -> bool:
+        if any(s.status.status_code is StatusCode.ERROR for s in spans):
+            return True
+        duration = ((root.end_time or 0) - (root.start_time or 0)) / 1e9
+        if self.keep_slower_than is not None and duration >= self.keep_slower_than:
+            return True
+        # Same decision for the trace on every service, as with TraceIdRatioBased.
+        return (root.context.trace_id & 0xFFFFFFFFFFFFFFFF) < self.sample_ratio * 2**64
+
+    def shutdown(self) -> None:
+        self.processor.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.processor.force_flush(timeout_millis)
+
+
+def create_tracer_provider(
+    exporter: SpanExporter,
+    sample_ratio: float = 1.0,
+    keep_slower_than: float | None = None,
+    max_spans: int = 10000,
+    service_name: str = "agent-service",
+) -> TracerProvider:
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    processor: SpanProcessor = BatchSpanProcessor(exporter)
+    if sample_ratio < 1 or keep_slower_than is not None:
+        processor = TailSampler(processor, sample_ratio, keep_slower_than, max_spans)
+    provider.add_span_processor(processor)
+    return provider
+
+
+def _create_exporter() -> SpanExporter:
+    match settings.OTEL_EXPORTER:
+        case "otlp":
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+            return OTLPSpanExporter(endpoint=settings.OTEL_EXPORTER_OTLP_ENDPOINT)
+        case "console":
+            return ConsoleSpanExporter()
+        case "file":
+            return ConsoleSpanExporter(
+                out=open(settings.OTEL_TRACE_FILE, "a", encoding="utf-8"),
+                formatter=lambda span: span.to_json(indent=None) + "\n",
+            )
+        case _:
+            raise ValueError(f"Unsupported trace exporter: {settings.OTEL_EXPORTER}")
+
+
+def configure_tracing() -> TracerProvider | None:
+    """Install the tracer provider configured in settings, once. None if tracing is off."""
+    global _tracer_provider
+    if settings.OTEL_EXPORTER is None or _tracer_provider is not None:
+        return _tracer_provider
+    _tracer_provider = create_tracer_provider(
+        _create_exporter(),
+        sample_ratio=settings.TRACE_SAMPLE_RATIO,
+        keep_slower_than=settings.TRACE_KEEP_SLOWER_THAN,
+        max_spans=settings.TRACE_MAX_PENDING_SPANS,
+        service_name=settings.OTEL_SERVICE_NAME,
+    )
+    trace.set_tracer_provider(_tracer_provider)
+    logger.info(f"Exporting traces to {settings.OTEL_EXPORTER}")
+    return _tracer_provider
+
+
+def tracing_enabled() -> bool:
+    return _tracer_provider is not None
+
+
+class GraphTracingHandler(BaseCallbackHandler):
+    """
+    Records spans for a graph run, its nodes, and their tool and model calls. The
+    graph run is a child of the span that was current when the handler was created.
+    """
+
+    run_inline = True
+
+    def __init__(self, span_tracer: trace.Tracer | None = None) -> None:
+        self.tracer = span_tracer or tracer
+        self.context = otel_context.get_current()
+        # Spans of traced runs, and the context that children of any run start in.
+        self._spans: dict[UUID, Span] = {}
+        self._contexts: dict[UUID, otel_context.Context] = {}
+
+    def _start(
+        self,
+        name: str,
+        run_id: UUID,
+        parent_run_id: UUID | None,
+        attributes: dict[str, Any],
+        kind: SpanKind = SpanKind.INTERNAL,
+    ) -> None:
+        parent = self._contexts.get(parent_run_id, self.context) if parent_run_id else self.context
+        span = self.tracer.start_span(
+            name, parent, kind, {k: v for k, v in attributes.items() if v}
+        )
+        self._spans[run_id] = span
+        self._contexts[run_id] = trace.set_span_in_context(span, parent)
+
+    def _inherit(self, run_id: UUID, parent_run_id: UUID | None) -> None:
+        if parent_run_id in self._contexts:
+            self._contexts[run_id] = self._contexts[parent_run_id]
+
+    def _end(self, run_id: UUID, error: BaseException | None = None) -> None:
+        self._contexts.pop(run_id, None)
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        if error is not None:
+            span.record_exception(error)
+            span.set_status(Status(StatusCode.ERROR, type(error).__name__))
+        span.end()
+
+    def on_chain_start(
+        self,
+        serialized: dict[str, Any],
+        inputs: dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        metadata = metadata or {}
+        name = kwargs.get("name") or (serialized or {}).get("name", "chain")
+        if parent_run_id is None:
+            self._start(
+                f"graph {name}",
+                run_id,
+                None,
+                {
+                    "agent.id": metadata.get("agent_id"),
+                    "langgraph.thread_id": metadata.get("thread_id"),
+                    "langgraph.run_id": str(run_id),
+                },
+            )
+        elif name == metadata.get("langgraph_node") and not name.startswith("__"):
+            self._start(
+                f"node {name}",
+                run_id,
+                parent_run_id,
+                {"langgraph.node": name, "langgraph.step": metadata.get("langgraph_step")},
+            )
+        else:
+            self._inherit(run_id, parent_run_id)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def on_tool_start(
+        self,
+        serialized: dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name", "tool")
+        self._start(f"tool {name}", run_id, parent_run_id, {"tool.name": name})
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def _start_model(
+        self, run_id: UUID, parent_run_id: UUID | None, metadata: dict[str, Any] | None
+    ) -> None:
+        metadata = metadata or {}
+        model = metadata.get("ls_model_name")
+        self._start(
+            f"chat {model}" if model else "chat",
+            run_id,
+            parent_run_id,
+            {"gen_ai.system": metadata.get("ls_provider"), "gen_ai.request.model": model},
+            SpanKind.CLIENT,
+        )
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list[list[BaseMessage]],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start_model(run_id, parent_run_id, metadata)
+
+    def on_llm_start(
+        self,
+        serialized: dict[str, Any],
+        prompts: list[str],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start_model(run_id, parent_run_id, metadata)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.get(run_id)
+        if span is not None:
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                    if usage:
+                        span.set_attribute("gen_ai.usage.input_tokens", usage["input_tokens"])
+                        span.set_attribute("gen_ai.usage.output_tokens", usage["output_tokens"])
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+
+def tracing_callbacks() -> list[BaseCallbackHandler]:
+    """Callbacks that trace a graph run, if tracing is enabled."""
+    if not tracing_enabled():
+        return []
+    return [GraphTracingHandler()]
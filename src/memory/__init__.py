@@ -0,0 +1,18 @@
+from memory.checkpointer import (
+    create_checkpointer,
+    memory_checkpointer,
+    postgres_checkpointer,
+    sqlite_checkpointer,
+)
+from memory.retention import CheckpointRetention
+from memory.sqlite import TunedAsyncSqliteSaver, tuned_sqlite_checkpointer
+
+__all__ = [
+    "CheckpointRetention",
+    "TunedAsyncSqliteSaver",
+    "create_checkpointer",
+    "memory_checkpointer",
+    "postgres_checkpointer",
+    "sqlite_checkpointer",
+    "tuned_sqlite_checkpointer",
+]
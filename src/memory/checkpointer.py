@@ -0,0 +1,73 @@
+"""
+Checkpointer backends for the agent graphs, selected by settings.CHECKPOINTER.
+
+Each backend is an async context manager that yields a ready-to-use checkpointer and
+releases its connections on exit. The Postgres backend shares a connection pool
+between all agents, so several service replicas can use the same database.
+langgraph-checkpoint-postgres and psycopg are only imported when it is selected.
+"""
+
+from collections.abc import AsyncGenerator
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from core import settings
+from memory.sqlite import tuned_sqlite_checkpointer
+
+
+@asynccontextmanager
+async def memory_checkpointer() -> AsyncGenerator[BaseCheckpointSaver, None]:
+    """Process-local checkpointer. Conversations are lost on restart."""
+    yield MemorySaver()
+
+
+@asynccontextmanager
+async def sqlite_checkpointer(path: str) -> AsyncGenerator[BaseCheckpointSaver, None]:
+    async with AsyncSqliteSaver.from_conn_string(path) as saver:
+        yield saver
+
+
+@asynccontextmanager
+async def postgres_checkpointer(
+    url: str, min_size: int = 1, max_size: int = 10
+) -> AsyncGenerator[BaseCheckpointSaver, None]:
+    """Postgres checkpointer on a pool of `min_size` to `max_size` connections."""
+    from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+    from psycopg.rows import dict_row
+    from psycopg_pool import AsyncConnectionPool
+
+    async with AsyncConnectionPool(
+        url,
+        min_size=min_size,
+        max_size=max_size,
+        # Settings required by AsyncPostgresSaver.
+        kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+        open=False,
+    ) as pool:
+        saver = AsyncPostgresSaver(pool)
+        await saver.setup()
+        yield saver
+
+
+def create_checkpointer() -> AbstractAsyncContextManager[BaseCheckpointSaver]:
+    """The checkpointer backend configured in settings."""
+    match settings.CHECKPOINTER:
+        case "memory":
+            return memory_checkpointer()
+        case "sqlite" if settings.SQLITE_TUNED:
+            return tuned_sqlite_checkpointer(
+                settings.SQLITE_DB_PATH, commit_window=settings.SQLITE_COMMIT_WINDOW
+            )
+        case "sqlite":
+            return sqlite_checkpointer(settings.SQLITE_DB_PATH)
+        case "postgres":
+            if settings.POSTGRES_URL is None:
+                raise ValueError("POSTGRES_URL must be set to use the postgres checkpointer")
+            return postgres_checkpointer(
+                settings.POSTGRES_URL.get_secret_value(),
+                min_size=settings.POSTGRES_POOL_MIN_SIZE,
+                max_size=settings.POSTGRES_POOL_MAX_SIZE,
+            )
@@ -0,0 +1,256 @@
+"""
+Retention policy for the SQLite checkpointer.
+
+LangGraph keeps every checkpoint of every thread. CheckpointRetention periodically
+keeps only the last `keep_last` checkpoints of each thread (per checkpoint namespace),
+deletes threads whose latest checkpoint is older than `ttl` seconds, and drops the
+pending writes of deleted checkpoints. Threads are compacted `batch_size` at a time,
+each batch in its own short transaction, so checkpoint reads and writes are never
+blocked for long.
+
+Freed pages are returned to the filesystem with incremental vacuum, `vacuum_pages`
+pages per step. This requires auto_vacuum=INCREMENTAL. An empty database is switched
+to it when retention starts. Switching a database that holds checkpoints takes a full
+VACUUM, which rewrites the whole file and blocks checkpoint reads and writes while it
+runs, so it is only done with `rebuild=True`. Otherwise deleted pages are reused for
+new checkpoints but the file does not shrink.
+
+Deleted checkpoints and reclaimed bytes are also counted in Prometheus metrics.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import suppress
+from typing import Any
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.base.id import UUID
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from core.metrics import CHECKPOINT_RECLAIMED_BYTES, CHECKPOINTS_DELETED
+
+logger = logging.getLogger(__name__)
+
+# 100-ns intervals between the UUID epoch (1582-10-15) and the Unix epoch.
+_UUID_EPOCH_OFFSET = 0x01B21DD213814000
+_AUTO_VACUUM_INCREMENTAL = 2
+
+
+def checkpoint_id_at(timestamp: float) -> str:
+    """
+    The smallest checkpoint ID created at `timestamp` (Unix seconds). Checkpoint IDs
+    are UUIDv6, which sort by creation time, so IDs below this one are older.
+    """
+    uuid_time = int(timestamp * 10_000_000) + _UUID_EPOCH_OFFSET
+    uuid_int = ((uuid_time >> 12) & 0xFFFFFFFFFFFF) << 80 | (uuid_time & 0x0FFF) << 64
+    return str(UUID(int=uuid_int, version=6))
+
+
+def _placeholders(values: list[str]) -> str:
+    return ", ".join("?" * len(values))
+
+
+class CheckpointRetention:
+    def __init__(
+        self,
+        keep_last: int | None = None,
+        ttl: float | None = None,
+        interval: float = 3600.0,
+        batch_size: int = 500,
+        vacuum_pages: int = 1000,
+        rebuild: bool = False,
+    ) -> None:
+        self.keep_last = keep_last
+        self.ttl = ttl
+        self.interval = interval
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.rebuild = rebuild
+        self.incremental_vacuum = False
+        self.saver: AsyncSqliteSaver | None = None
+        self.runs = 0
+        self.expired_threads = 0
+        self.deleted_checkpoints = 0
+        self.deleted_writes = 0
+        self.reclaimed_bytes = 0
+        self.last_run: float | None = None
+        self.last_duration: float | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self, saver: BaseCheckpointSaver) -> None:
+        """Run compaction every `interval` seconds in the background, starting now."""
+        if not isinstance(saver, AsyncSqliteSaver):
+            logger.warning(
+                f"Checkpoint retention is only supported with SQLite, not {type(saver).__name__}"
+            )
+            return
+        self.saver = saver
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        try:
+            await self._enable_incremental_vacuum()
+        except Exception:
+            logger.exception("Enabling incremental vacuum failed")
+        while True:
+            try:
+                await self.compact()
+            except Exception:
+                logger.exception("Checkpoint compaction failed")
+            await asyncio.sleep(self.interval)
+
+    async def _enable_incremental_vacuum(self) -> None:
+        saver = self._sqlite_saver()
+        await saver.setup()
+        async with saver.lock:
+            async with saver.conn.execute("PRAGMA auto_vacuum") as cursor:
+                (auto_vacuum,) = await cursor.fetchone()
+            if auto_vacuum == _AUTO_VACUUM_INCREMENTAL:
+                self.incremental_vacuum = True
+                return
+            async with saver.conn.execute("SELECT 1 FROM checkpoints LIMIT 1") as cursor:
+                empty = await cursor.fetchone() is None
+            if not empty and not self.rebuild:
+                logger.warning(
+                    "The checkpoint database does not use incremental vacuum: space freed "
+                    "by retention is reused, but not returned to the filesystem until the "
+                    "database is rebuilt once with VACUUM. Set CHECKPOINT_VACUUM_REBUILD to "
+                    "rebuild it on start, which blocks agent runs while it runs, or run "
+                    "'PRAGMA auto_vacuum = INCREMENTAL; VACUUM;' while the service is down."
+                )
+                return
+            if not empty:
+                logger.warning("Rebuilding the checkpoint database to enable incremental vacuum")
+            await saver.conn.commit()
+            await saver.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await saver.conn.execute("VACUUM")
+            self.incremental_vacuum = True
+
+    def _sqlite_saver(self) -> AsyncSqliteSaver:
+        if self.saver is None:
+            raise RuntimeError("CheckpointRetention.start() has not been called")
+        return self.saver
+
+    async def compact(self) -> None:
+        """Apply the retention policy to every thread, then vacuum the freed pages."""
+        saver = self._sqlite_saver()
+        start = time.monotonic()
+        cutoff = checkpoint_id_at(time.time() - self.ttl) if self.ttl is not None else None
+        last = ""
+        while True:
+            async with saver.lock:
+                async with saver.conn.execute(
+                    "SELECT DISTINCT thread_id FROM checkpoints WHERE thread_id > ? "
+                    "ORDER BY thread_id LIMIT ?",
+                    (last, self.batch_size),
+                ) as cursor:
+                    thread_ids = [row[0] for row in await cursor.fetchall()]
+                if thread_ids:
+                    await self._compact_threads(thread_ids, cutoff)
+                    await saver.conn.commit()
+            if len(thread_ids) < self.batch_size:
+                break
+            last = thread_ids[-1]
+            # Let queued checkpoint reads and writes through between batches.
+            await asyncio.sleep(0)
+        await self._vacuum()
+        self.runs += 1
+        self.last_run = time.time()
+        self.last_duration = time.monotonic() - start
+
+    async def _compact_threads(self, thread_ids: list[str], cutoff: str | None) -> None:
+        conn = self._sqlite_saver().conn
+        if cutoff is not None:
+            async with conn.execute(
+                "SELECT thread_id FROM checkpoints "
+                f"WHERE thread_id IN ({_placeholders(thread_ids)}) "
+                "GROUP BY thread_id HAVING MAX(checkpoint_id) < ?",
+                (*thread_ids, cutoff),
+            ) as cursor:
+                expired = [row[0] for row in await cursor.fetchall()]
+            if expired:
+                in_expired = _placeholders(expired)
+                cursor = await conn.execute(
+                    f"DELETE FROM checkpoints WHERE thread_id IN ({in_expired})", expired
+                )
+                self._deleted_checkpoints(cursor.rowcount)
+                cursor = await conn.execute(
+                    f"DELETE FROM writes WHERE thread_id IN ({in_expired})", expired
+                )
+                self.deleted_writes += cursor.rowcount
+                self.expired_threads += len(expired)
+                expired_ids = set(expired)
+                thread_ids = [t for t in thread_ids if t not in expired_ids]
+        if self.keep_last is None or not thread_ids:
+            return
+        cursor = await conn.execute(
+            "DELETE FROM checkpoints WHERE rowid IN ("
+            "SELECT rowid FROM (SELECT rowid, ROW_NUMBER() OVER ("
+            "PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS position "
+            f"FROM checkpoints WHERE thread_id IN ({_placeholders(thread_ids)})) "
+            "WHERE position > ?)",
+            (*thread_ids, self.keep_last),
+        )
+        self._deleted_checkpoints(cursor.rowcount)
+        cursor = await conn.execute(
+            f"DELETE FROM writes WHERE thread_id IN ({_placeholders(thread_ids)}) "
+            "AND NOT EXISTS (SELECT 1 FROM checkpoints c WHERE c.thread_id = writes.thread_id "
+            "AND c.checkpoint_ns = writes.checkpoint_ns "
+            "AND c.checkpoint_id = writes.checkpoint_id)",
+            thread_ids,
+        )
+        self.deleted_writes += cursor.rowcount
+
+    def _deleted_checkpoints(self, count: int) -> None:
+        self.deleted_checkpoints += count
+        CHECKPOINTS_DELETED.inc(count)
+
+    async def _pragma(self, name: str) -> int:
+        async with self._sqlite_saver().conn.execute(f"PRAGMA {name}") as cursor:
+            (value,) = await cursor.fetchone()
+        return value
+
+    async def _vacuum(self) -> None:
+        """Release free pages to the filesystem, `vacuum_pages` at a time."""
+        if not self.incremental_vacuum:
+            return
+        saver = self._sqlite_saver()
+        while True:
+            async with saver.lock:
+                if await self._pragma("freelist_count") == 0:
+                    return
+                page_size = await self._pragma("page_size")
+                before = await self._pragma("page_count")
+                async with saver.conn.execute(
+                    f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})"
+                ) as cursor:
+                    await cursor.fetchall()
+                await saver.conn.commit()
+                after = await self._pragma("page_count")
+            if after >= before:
+                return
+            self.reclaimed_bytes += (before - after) * page_size
+            CHECKPOINT_RECLAIMED_BYTES.inc((before - after) * page_size)
+            await asyncio.sleep(0)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "keep_last": self.keep_last,
+            "ttl": self.ttl,
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "last_duration": self.last_duration,
+            "expired_threads": self.expired_threads,
+            "deleted_checkpoints": self.deleted_checkpoints,
+            "deleted_writes": self.deleted_writes,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "incremental_vacuum": self.incremental_vacuum,
+        }
@@ -0,0 +1,228 @@
+"""
+High-throughput SQLite checkpointer for single-node deployments.
+
+TunedAsyncSqliteSaver differs from AsyncSqliteSaver in four ways:
+
+- The database uses WAL journaling with synchronous=NORMAL. Commits no longer wait
+  for an fsync. A power loss can lose the last commits, but the database is never
+  corrupted.
+- Reads go through their own connection. They see the last committed state and do
+  not wait behind writes.
+- Each connection keeps a large cache of prepared statements. The queries are
+  constant strings, so they are compiled once per connection.
+- Checkpoint writes are group committed. Writes that arrive within `commit_window`
+  seconds share one transaction. Each write returns once its transaction commits.
+"""
+
+import asyncio
+import itertools
+import logging
+from collections.abc import AsyncGenerator, AsyncIterator, Sequence
+from contextlib import asynccontextmanager, suppress
+from typing import Any, NamedTuple
+
+import aiosqlite
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+logger = logging.getLogger(__name__)
+
+_PUT_CHECKPOINT = (
+    "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, "
+    "parent_checkpoint_id, type, checkpoint, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+_COLUMNS = "(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value)"
+_REPLACE_WRITES = f"INSERT OR REPLACE INTO writes {_COLUMNS} VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+_INSERT_WRITES = f"INSERT OR IGNORE INTO writes {_COLUMNS} VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+
+# Prepared statements cached per connection.
+CACHED_STATEMENTS = 512
+
+
+class _PendingWrite(NamedTuple):
+    query: str
+    rows: list[tuple[Any, ...]]
+    done: asyncio.Future[None]
+
+
+class TunedAsyncSqliteSaver(AsyncSqliteSaver):
+    def __init__(
+        self,
+        conn: aiosqlite.Connection,
+        read_conn: aiosqlite.Connection,
+        commit_window: float = 0.005,
+    ) -> None:
+        super().__init__(conn)
+        self.commit_window = commit_window
+        self.reader = AsyncSqliteSaver(read_conn, serde=self.serde)
+        self.commits = 0
+        self.committed_writes = 0
+        self._pending: list[_PendingWrite] = []
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._committer: asyncio.Task | None = None
+
+    async def setup(self) -> None:
+        if self.is_setup and self._committer is not None:
+            return
+        await super().setup()
+        # The tables exist now, so the reader does not need to create them.
+        self.reader.is_setup = True
+        if self._committer is None:
+            self._committer = asyncio.create_task(self._commit_loop())
+
+    async def aclose(self) -> None:
+        """Commit the pending writes and stop the committer."""
+        self._closing = True
+        self._wakeup.set()
+        if self._committer is not None:
+            await self._committer
+            self._committer = None
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        await self.setup()
+        return await self.reader.aget_tuple(config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        await self.setup()
+        async for checkpoint in self.reader.alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield checkpoint
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        row = (
+            str(thread_id),
+            checkpoint_ns,
+            checkpoint["id"],
+            config["configurable"].get("checkpoint_id"),
+            type_,
+            serialized_checkpoint,
+            self.jsonplus_serde.dumps(metadata),
+        )
+        await self._write(_PUT_CHECKPOINT, [row])
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        query = _REPLACE_WRITES if all(w[0] in WRITES_IDX_MAP for w in writes) else _INSERT_WRITES
+        rows = [
+            (
+                str(config["configurable"]["thread_id"]),
+                str(config["configurable"]["checkpoint_ns"]),
+                str(config["configurable"]["checkpoint_id"]),
+                task_id,
+                WRITES_IDX_MAP.get(channel, idx),
+                channel,
+                *self.serde.dumps_typed(value),
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        await self._write(query, rows)
+
+    async def _write(self, query: str, rows: list[tuple[Any, ...]]) -> None:
+        """Queue rows for the next group commit and wait until it is committed."""
+        await self.setup()
+        if self._closing:
+            raise RuntimeError("TunedAsyncSqliteSaver is closed")
+        done = self.loop.create_future()
+        self._pending.append(_PendingWrite(query, rows, done))
+        self._wakeup.set()
+        await done
+
+    async def _commit_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            if self.commit_window and not self._closing:
+                # Let concurrent writers join this transaction.
+                await asyncio.sleep(self.commit_window)
+            self._wakeup.clear()
+            batch, self._pending = self._pending, []
+            if batch:
+                await self._commit(batch)
+            if self._closing and not self._pending:
+                return
+
+    async def _commit(self, batch: list[_PendingWrite]) -> None:
+        try:
+            async with self.lock:
+                # Consecutive writes with the same statement are executed together.
+                for query, group in itertools.groupby(batch, key=lambda w: w.query):
+                    await self.conn.executemany(query, [row for w in group for row in w.rows])
+                await self.conn.commit()
+        except Exception as e:
+            logger.exception(f"Group commit of {len(batch)} checkpoint writes failed")
+            with suppress(Exception):
+                await self.conn.rollback()
+            for write in batch:
+                if not write.done.done():
+                    write.done.set_exception(e)
+            return
+        self.commits += 1
+        self.committed_writes += len(batch)
+        for write in batch:
+            if not write.done.done():
+                write.done.set_result(None)
+
+
+async def _connect(path: str, read_only: bool = False) -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(path, cached_statements=CACHED_STATEMENTS)
+    await conn.executescript(
+        "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA busy_timeout=5000;"
+        + (" PRAGMA query_only=ON;" if read_only else "")
+    )
+    return conn
+
+
+@asynccontextmanager
+async def tuned_sqlite_checkpointer(
+    path: str, commit_window: float = 0.005
+) -> AsyncGenerator[TunedAsyncSqliteSaver, None]:
+    """TunedAsyncSqliteSaver on `path`, with its connections closed on exit."""
+    conn = await _connect(path)
+    try:
+        read_conn = await _connect(path, read_only=True)
+        try:
+            saver = TunedAsyncSqliteSaver(conn, read_conn, commit_window=commit_window)
+            await saver.setup()
+            try:
+                yield saver
+            finally:
+                await saver.aclose()
+        finally:
+            await read_conn.close()
+    finally:
+        await conn.close()
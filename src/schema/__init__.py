@@ -1,14 +1,28 @@
 from schema.models import AllModelEnum
 from schema.schema import (
     AgentInfo,
+    BatchInput,
+    BatchItemResult,
+    BatchResult,
     ChatHistory,
     ChatHistoryInput,
     ChatMessage,
+    ExportedThread,
+    ExportInput,
     Feedback,
+    FeedbackBatch,
     FeedbackResponse,
+    RunInfo,
+    RunStatus,
     ServiceMetadata,
+    StreamEngine,
     StreamInput,
+    TimingEvent,
+    TimingKind,
     UserInput,
+    WebSocketCancel,
+    WebSocketRequest,
+    WebSocketStart,
 )
 
 __all__ = [
@@ -18,8 +32,22 @@ __all__ = [
     "ChatMessage",
     "ServiceMetadata",
     "StreamInput",
+    "StreamEngine",
+    "TimingEvent",
+    "TimingKind",
     "Feedback",
+    "FeedbackBatch",
     "FeedbackResponse",
     "ChatHistoryInput",
     "ChatHistory",
+    "ExportInput",
+    "ExportedThread",
+    "BatchInput",
+    "BatchItemResult",
+    "BatchResult",
+    "RunInfo",
+    "RunStatus",
+    "WebSocketStart",
+    "WebSocketCancel",
+    "WebSocketRequest",
 ]
@@ -48,9 +48,10 @@ class AWSModelName(StrEnum):
 
 
 class FakeModelName(StrEnum):
-    """Fake model for testing."""
+    """Fake models for testing and load testing."""
 
     FAKE = "fake"
+    FAKE_STREAMING = "fake-streaming"
 
 
 AllModelEnum: TypeAlias = (
@@ -1,6 +1,7 @@
-from typing import Any, Literal, NotRequired
+from datetime import datetime
+from typing import Annotated, Any, Literal, NotRequired
 
-from pydantic import BaseModel, Field, SerializeAsAny
+from pydantic import BaseModel, Field, SerializeAsAny, model_validator
 from typing_extensions import TypedDict
 
 from schema.models import AllModelEnum, AnthropicModelName, OpenAIModelName
@@ -57,6 +58,9 @@ class UserInput(BaseModel):
     )
 
 
+StreamEngine = Literal["events", "updates"]
+
+
 class StreamInput(UserInput):
     """User input for streaming the agent's response."""
 
@@ -64,6 +68,100 @@ class StreamInput(UserInput):
         description="Whether to stream LLM tokens to the client.",
         default=True,
     )
+    token_flush_ms: int | None = Field(
+        description=(
+            "Coalesce streamed tokens and send them as one token event at most once per this "
+            "many milliseconds. Tokens are sent one by one when neither flush option is set."
+        ),
+        default=None,
+        ge=0,
+        examples=[50],
+    )
+    token_flush_bytes: int | None = Field(
+        description=(
+            "Coalesce streamed tokens and send them as one token event once this many bytes "
+            "of UTF-8 text are buffered. Can be combined with token_flush_ms."
+        ),
+        default=None,
+        ge=1,
+        examples=[256],
+    )
+    stream_engine: StreamEngine | None = Field(
+        description=(
+            "How events are collected from the agent graph. `events` uses astream_events, "
+            "`updates` uses the graph's update/message/custom streams, which is much cheaper. "
+            "Both produce the same events. Defaults to the agent's or the service's setting."
+        ),
+        default=None,
+        examples=["updates"],
+    )
+    debug_timings: bool = Field(
+        description=(
+            "Also stream `timing` events with the duration of the admission queue wait, each "
+            "graph node, tool and model call, the time to first token and the whole run."
+        ),
+        default=False,
+    )
+
+
+TimingKind = Literal["queue", "node", "tool", "model", "ttft", "run"]
+
+
+class TimingEvent(BaseModel):
+    """Timing of one step of a streamed run, sent when `debug_timings` is set."""
+
+    kind: TimingKind = Field(
+        description="What was timed.",
+        examples=["node"],
+    )
+    name: str | None = Field(
+        description="Name of the node, tool or model, if any.",
+        default=None,
+        examples=["guard_input"],
+    )
+    start_ms: float = Field(
+        description="Start of the step, in milliseconds since the request was received.",
+        examples=[12.5],
+    )
+    duration_ms: float = Field(
+        description="Duration of the step in milliseconds.",
+        examples=[340.2],
+    )
+
+
+class WebSocketStart(BaseModel):
+    """Start an agent run on a multiplexed WebSocket connection."""
+
+    type: Literal["start"] = "start"
+    agent_id: str | None = Field(
+        description="Agent to run. The default agent is used if not set.",
+        default=None,
+        examples=["research-assistant"],
+    )
+    run_id: str | None = Field(
+        description=(
+            "UUID to use as the run ID, so the client can match events to runs before the "
+            "server replies. Generated by the server if not set."
+        ),
+        default=None,
+        examples=["847c6285-8fc9-4560-a83f-4e6285809254"],
+    )
+    input: StreamInput = Field(
+        description="Input for the run, the same as the /stream request body.",
+    )
+
+
+class WebSocketCancel(BaseModel):
+    """Cancel a run started on the same WebSocket connection."""
+
+    type: Literal["cancel"] = "cancel"
+    run_id: str = Field(
+        description="Run ID to cancel.",
+        examples=["847c6285-8fc9-4560-a83f-4e6285809254"],
+    )
+
+
+WebSocketRequest = Annotated[WebSocketStart | WebSocketCancel, Field(discriminator="type")]
 
 
 class ToolCall(TypedDict):
@@ -111,6 +209,11 @@ class ChatMessage(BaseModel):
         description="Custom message data.",
         default={},
     )
+    id: str | None = Field(
+        description="ID of the message in the conversation thread.",
+        default=None,
+        examples=["2bd5f0e4-6b1e-4b8f-9a57-4f3bd7c1e2a0"],
+    )
 
     def pretty_repr(self) -> str:
         """Get a pretty representation of the message."""
@@ -148,10 +251,103 @@ class Feedback(BaseModel):
     )
 
 
+class FeedbackBatch(BaseModel):
+    """Feedback for many runs, to record to LangSmith."""
+
+    feedback: list[Feedback] = Field(
+        description="Feedback records to queue.",
+        min_length=1,
+    )
+
+
 class FeedbackResponse(BaseModel):
     status: Literal["success"] = "success"
 
 
+class BatchInput(BaseModel):
+    """Input for invoking an agent on many user inputs at once."""
+
+    inputs: list[UserInput] = Field(
+        description="User inputs to run. Each is processed like an /invoke request.",
+        min_length=1,
+    )
+    max_concurrency: int | None = Field(
+        description=(
+            "Maximum number of inputs to run at the same time. "
+            "Capped by the service's BATCH_MAX_CONCURRENCY setting."
+        ),
+        default=None,
+        ge=1,
+        examples=[4],
+    )
+    stream: bool = Field(
+        description=(
+            "Stream each result as a line of NDJSON as soon as it finishes, instead of "
+            "returning all results in input order at the end."
+        ),
+        default=False,
+    )
+
+
+class BatchItemResult(BaseModel):
+    """Result of one input in a batch. Exactly one of output and error is set."""
+
+    index: int = Field(
+        description="Position of the input in the batch request.",
+        examples=[0],
+    )
+    output: ChatMessage | None = Field(
+        description="Final message from the agent, if the input succeeded.",
+        default=None,
+    )
+    error: str | None = Field(
+        description="Error message, if the input failed.",
+        default=None,
+        examples=["Unexpected error"],
+    )
+
+
+class BatchResult(BaseModel):
+    results: list[BatchItemResult]
+
+
+RunStatus = Literal["queued", "running", "succeeded", "failed"]
+
+
+class RunInfo(BaseModel):
+    """Status of an asynchronous run started with the /runs endpoint."""
+
+    run_id: str = Field(
+        description="Run ID. Also used for the run's events and for recording feedback.",
+        examples=["847c6285-8fc9-4560-a83f-4e6285809254"],
+    )
+    agent_id: str = Field(
+        description="Agent the run is executed by.",
+        examples=["research-assistant"],
+    )
+    status: RunStatus = Field(
+        description="Current status of the run.",
+        examples=["running"],
+    )
+    created_at: datetime = Field(description="When the run was submitted.")
+    started_at: datetime | None = Field(
+        description="When a worker picked up the run.",
+        default=None,
+    )
+    finished_at: datetime | None = Field(
+        description="When the run succeeded or failed.",
+        default=None,
+    )
+    output: ChatMessage | None = Field(
+        description="Final message from the agent, once the run succeeded.",
+        default=None,
+    )
+    error: str | None = Field(
+        description="Error message, if the run failed.",
+        default=None,
+    )
+
+
 class ChatHistoryInput(BaseModel):
     """Input for retrieving chat history."""
 
@@ -159,7 +355,79 @@ class ChatHistoryInput(BaseModel):
         description="Thread ID to persist and continue a multi-turn conversation.",
         examples=["847c6285-8fc9-4560-a83f-4e6285809254"],
     )
+    limit: int | None = Field(
+        description=(
+            "Maximum number of messages to return. Without a cursor, the most recent "
+            "messages are returned. All messages are returned by default."
+        ),
+        default=None,
+        ge=1,
+        examples=[50],
+    )
+    before: str | None = Field(
+        description="Return the messages just before this message ID, to page backwards.",
+        default=None,
+    )
+    after: str | None = Field(
+        description="Return the messages just after this message ID, to page forwards.",
+        default=None,
+    )
+    since: str | None = Field(
+        description=(
+            "Delta mode: return every message after this message ID, ignoring `limit`. "
+            "Use the ID of the last message already received."
+        ),
+        default=None,
+    )
+
+    @model_validator(mode="after")
+    def _one_cursor(self) -> "ChatHistoryInput":
+        if sum(cursor is not None for cursor in (self.before, self.after, self.since)) > 1:
+            raise ValueError("Only one of before, after and since can be set")
+        return self
 
 
 class ChatHistory(BaseModel):
     messages: list[ChatMessage]
+    has_more: bool = Field(
+        description=(
+            "Whether the thread has more messages beyond this page: older messages when "
+            "paging backwards or without a cursor, newer messages when paging forwards."
+        ),
+        default=False,
+    )
+
+
+class ExportInput(BaseModel):
+    """Filters for exporting conversation threads. All given filters must match."""
+
+    agent_id: str | None = Field(
+        description="Only export threads of this agent.",
+        default=None,
+        examples=["research-assistant"],
+    )
+    thread_ids: list[str] | None = Field(
+        description="Only export these threads.",
+        default=None,
+        examples=[["847c6285-8fc9-4560-a83f-4e6285809254"]],
+    )
+    updated_after: datetime | None = Field(
+        description="Only export threads last updated at or after this time.",
+        default=None,
+    )
+    updated_before: datetime | None = Field(
+        description="Only export threads last updated before this time.",
+        default=None,
+    )
+
+
+class ExportedThread(BaseModel):
+    """A conversation thread, as one line of an NDJSON export."""
+
+    thread_id: str
+    agent_id: str | None = Field(
+        description="Agent of the thread, if it was recorded when the thread was updated.",
+        default=None,
+    )
+    updated_at: datetime
+    messages: list[ChatMessage]
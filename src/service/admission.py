@@ -0,0 +1,186 @@
+"""
+Admission control for agent runs.
+
+Every run must hold a slot for its agent and a global slot while it executes. When no
+slot is free, requests wait in a bounded queue; requests that would overflow the queue
+are rejected with 429, and requests that wait too long, or arrive while the event loop
+is lagging, are rejected with 503. Both carry a Retry-After header.
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager, suppress
+from typing import Any
+
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(HTTPException):
+    def __init__(self, status_code: int, detail: str, retry_after: int) -> None:
+        super().__init__(status_code, detail, headers={"Retry-After": str(retry_after)})
+
+
+class ConcurrencyLimit:
+    """Counts active holders. acquire() waits while `limit` are active; None is unlimited."""
+
+    def __init__(self, limit: int | None) -> None:
+        self.limit = limit
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit) if limit else None
+
+    def full(self) -> bool:
+        return self._semaphore is not None and self._semaphore.locked()
+
+    async def acquire(self) -> None:
+        if self._semaphore is not None:
+            self.waiting += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self.waiting -= 1
+        self.active += 1
+
+    def release(self) -> None:
+        self.active -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+
+class Admission:
+    """Slots held by one admitted run. release() is idempotent."""
+
+    def __init__(self, *limits: ConcurrencyLimit) -> None:
+        self._limits = limits
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        for limit in self._limits:
+            limit.release()
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrency: int | None = None,
+        agent_max_concurrency: int | None = None,
+        agent_limits: dict[str, int] | None = None,
+        max_queue: int = 100,
+        queue_timeout: float = 30.0,
+        max_loop_lag: float | None = None,
+        retry_after: int = 1,
+        lag_interval: float = 0.1,
+    ) -> None:
+        self.global_limit = ConcurrencyLimit(max_concurrency)
+        self.agent_max_concurrency = agent_max_concurrency
+        self.agent_limits = agent_limits or {}
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_loop_lag = max_loop_lag
+        self.retry_after = retry_after
+        self.lag_interval = lag_interval
+        self.loop_lag = 0.0
+        self.waiting = 0
+        self.rejected: defaultdict[int, int] = defaultdict(int)
+        self._agents: dict[str, ConcurrencyLimit] = {}
+        self._lag_monitor: asyncio.Task | None = None
+
+    def _agent_limit(self, agent_id: str) -> ConcurrencyLimit:
+        if agent_id not in self._agents:
+            limit = self.agent_limits.get(agent_id, self.agent_max_concurrency)
+            self._agents[agent_id] = ConcurrencyLimit(limit)
+        return self._agents[agent_id]
+
+    def _reject(self, status_code: int, detail: str) -> AdmissionRejected:
+        self.rejected[status_code] += 1
+        return AdmissionRejected(status_code, detail, self.retry_after)
+
+    async def acquire(self, agent_id: str) -> Admission:
+        """Wait for a slot for `agent_id`. Raises AdmissionRejected when shedding load."""
+        if self.max_loop_lag is not None and self.loop_lag > self.max_loop_lag:
+            raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "Service overloaded")
+
+        agent_limit = self._agent_limit(agent_id)
+        if (agent_limit.full() or self.global_limit.full()) and self.waiting >= self.max_queue:
+            raise self._reject(status.HTTP_429_TOO_MANY_REQUESTS, "Too many queued requests")
+
+        self.waiting += 1
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                # Take the agent slot first, so a busy agent does not tie up global slots.
+                await agent_limit.acquire()
+                try:
+                    await self.global_limit.acquire()
+                except BaseException:
+                    agent_limit.release()
+                    raise
+        except TimeoutError:
+            raise self._reject(
+                status.HTTP_503_SERVICE_UNAVAILABLE, "Timed out waiting for capacity"
+            )
+        finally:
+            self.waiting -= 1
+        return Admission(agent_limit, self.global_limit)
+
+    @asynccontextmanager
+    async def admit(self, agent_id: str) -> AsyncGenerator[None, None]:
+        admission = await self.acquire(agent_id)
+        try:
+            yield
+        finally:
+            admission.release()
+
+    def start(self) -> None:
+        """Start measuring event loop lag, if load shedding on lag is enabled."""
+        if self.max_loop_lag is not None:
+            self._lag_monitor = asyncio.create_task(self._monitor_loop_lag())
+
+    async def stop(self) -> None:
+        if self._lag_monitor is not None:
+            self._lag_monitor.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._lag_monitor
+            self._lag_monitor = None
+
+    async def _monitor_loop_lag(self) -> None:
+        shedding = False
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.lag_interval)
+            self.loop_lag = max(0.0, time.monotonic() - start - self.lag_interval)
+            lagging = self.loop_lag > self.max_loop_lag
+            if lagging and not shedding:
+                logger.warning(f"Event loop lag {self.loop_lag:.3f}s, shedding load")
+            shedding = lagging
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "active": self.global_limit.active,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "loop_lag": self.loop_lag,
+            "rejected": dict(self.rejected),
+            "agents": {
+                agent_id: {"active": limit.active, "queue_depth": limit.waiting}
+                for agent_id, limit in self._agents.items()
+            },
+        }
+
+
+async def release_after(
+    frames: AsyncGenerator[bytes, None], admission: Admission
+) -> AsyncGenerator[bytes, None]:
+    """Pass `frames` through and release `admission` once the stream ends."""
+    try:
+        async for frame in frames:
+            yield frame
+    finally:
+        admission.release()
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from collections.abc import AsyncGenerator, Awaitable, Callable
+
+from fastapi import HTTPException
+
+from schema import BatchItemResult, ChatMessage, UserInput
+from service import sse
+
+logger = logging.getLogger(__name__)
+
+InvokeOne = Callable[[UserInput], Awaitable[ChatMessage]]
+
+
+async def _run_item(
+    invoke: InvokeOne, index: int, user_input: UserInput, semaphore: asyncio.Semaphore
+) -> BatchItemResult:
+    async with semaphore:
+        try:
+            return BatchItemResult(index=index, output=await invoke(user_input))
+        except HTTPException as e:
+            return BatchItemResult(index=index, error=e.detail)
+        except Exception:
+            logger.exception(f"Batch item {index} failed")
+            return BatchItemResult(index=index, error="Unexpected error")
+
+
+def _start(
+    invoke: InvokeOne, inputs: list[UserInput], max_concurrency: int
+) -> list[asyncio.Task[BatchItemResult]]:
+    semaphore = asyncio.Semaphore(max_concurrency)
+    return [
+        asyncio.create_task(_run_item(invoke, index, user_input, semaphore))
+        for index, user_input in enumerate(inputs)
+    ]
+
+
+async def _cancel(tasks: list[asyncio.Task[BatchItemResult]]) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_batch(
+    invoke: InvokeOne, inputs: list[UserInput], max_concurrency: int
+) -> list[BatchItemResult]:
+    """
+    Run `invoke` on every input with at most `max_concurrency` in flight.
+
+    Results are returned in input order. A failing input is reported as an error
+    result and does not affect the others.
+    """
+    tasks = _start(invoke, inputs, max_concurrency)
+    try:
+        return list(await asyncio.gather(*tasks))
+    finally:
+        await _cancel(tasks)
+
+
+async def stream_batch(
+    invoke: InvokeOne, inputs: list[UserInput], max_concurrency: int
+) -> AsyncGenerator[bytes, None]:
+    """
+    Like run_batch, but yield each result as a line of NDJSON as soon as it finishes.
+
+    Remaining inputs are cancelled if the consumer stops early, e.g. when the client
+    disconnects.
+    """
+    tasks = _start(invoke, inputs, max_concurrency)
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            result = await next_result
+            yield sse.dumps(result.model_dump()) + b"\n"
+    finally:
+        await _cancel(tasks)
@@ -0,0 +1,144 @@
+"""
+Bulk export of conversation threads from the checkpointer as NDJSON.
+
+Thread IDs are read from the checkpoint store in chunks, with keyset queries on SQLite
+and Postgres, and only the latest checkpoint of one thread is loaded at a time, so
+memory use does not grow with the number of threads exported.
+"""
+
+import logging
+from collections.abc import AsyncGenerator
+from datetime import UTC, datetime
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from schema import ChatMessage, ExportedThread, ExportInput
+from service.utils import langchain_to_chat_message
+
+logger = logging.getLogger(__name__)
+
+
+async def _sqlite_thread_ids(
+    saver: AsyncSqliteSaver, agent_id: str | None, chunk_size: int
+) -> AsyncGenerator[str, None]:
+    """Page through the distinct thread IDs in a SQLite checkpoint store."""
+    query = "SELECT DISTINCT thread_id FROM checkpoints WHERE checkpoint_ns = '' AND thread_id > ?"
+    if agent_id is not None:
+        query += " AND json_extract(CAST(metadata AS TEXT), '$.agent_id') = ?"
+    query += " ORDER BY thread_id LIMIT ?"
+    last = ""
+    while True:
+        params = (last, agent_id, chunk_size) if agent_id is not None else (last, chunk_size)
+        # Hold the saver's lock only while reading a chunk, not while it is exported.
+        async with saver.lock, saver.conn.execute(query, params) as cursor:
+            thread_ids = [row[0] for row in await cursor.fetchall()]
+        for thread_id in thread_ids:
+            yield thread_id
+        if len(thread_ids) < chunk_size:
+            return
+        last = thread_ids[-1]
+
+
+async def _postgres_thread_ids(
+    saver: BaseCheckpointSaver, agent_id: str | None, chunk_size: int
+) -> AsyncGenerator[str, None]:
+    """Page through the distinct thread IDs in a Postgres checkpoint store."""
+    query = "SELECT DISTINCT thread_id FROM checkpoints WHERE checkpoint_ns = '' AND thread_id > %s"
+    if agent_id is not None:
+        query += " AND metadata->>'agent_id' = %s"
+    query += " ORDER BY thread_id LIMIT %s"
+    last = ""
+    while True:
+        params = (last, agent_id, chunk_size) if agent_id is not None else (last, chunk_size)
+        # A pooled connection, or the saver's lock on a single one, is held per chunk.
+        async with saver._cursor() as cursor:  # type: ignore[attr-defined]
+            await cursor.execute(query, params)
+            thread_ids = [row["thread_id"] for row in await cursor.fetchall()]
+        for thread_id in thread_ids:
+            yield thread_id
+        if len(thread_ids) < chunk_size:
+            return
+        last = thread_ids[-1]
+
+
+def _is_postgres(saver: BaseCheckpointSaver) -> bool:
+    try:
+        from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+    except ImportError:
+        return False
+    return isinstance(saver, AsyncPostgresSaver)
+
+
+async def _listed_thread_ids(
+    saver: BaseCheckpointSaver, agent_id: str | None
+) -> AsyncGenerator[str, None]:
+    """
+    Thread IDs from any checkpointer's alist(). This visits every checkpoint and keeps
+    the IDs seen so far, so it is only a fallback for stores without a faster query.
+    """
+    seen: set[str] = set()
+    metadata_filter = {"agent_id": agent_id} if agent_id is not None else None
+    async for checkpoint in saver.alist(None, filter=metadata_filter):
+        thread_id = checkpoint.config["configurable"]["thread_id"]
+        if thread_id not in seen:
+            seen.add(thread_id)
+            yield thread_id
+
+
+def _thread_ids(
+    saver: BaseCheckpointSaver, filters: ExportInput, chunk_size: int
+) -> AsyncGenerator[str, None]:
+    if isinstance(saver, AsyncSqliteSaver):
+        return _sqlite_thread_ids(saver, filters.agent_id, chunk_size)
+    if _is_postgres(saver):
+        return _postgres_thread_ids(saver, filters.agent_id, chunk_size)
+    return _listed_thread_ids(saver, filters.agent_id)
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value
+
+
+async def export_threads(
+    saver: BaseCheckpointSaver, filters: ExportInput, chunk_size: int = 500
+) -> AsyncGenerator[bytes, None]:
+    """Yield each thread matching `filters` as a line of NDJSON (see schema.ExportedThread)."""
+    updated_after = _as_utc(filters.updated_after)
+    updated_before = _as_utc(filters.updated_before)
+
+    async def thread_ids() -> AsyncGenerator[str, None]:
+        if filters.thread_ids is not None:
+            for thread_id in filters.thread_ids:
+                yield thread_id
+        else:
+            async for thread_id in _thread_ids(saver, filters, chunk_size):
+                yield thread_id
+
+    async for thread_id in thread_ids():
+        checkpoint = await saver.aget_tuple(
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+        )
+        if checkpoint is None:
+            continue
+        agent_id = checkpoint.metadata.get("agent_id")
+        if filters.agent_id is not None and agent_id != filters.agent_id:
+            continue
+        updated_at = datetime.fromisoformat(checkpoint.checkpoint["ts"])
+        if updated_after is not None and updated_at < updated_after:
+            continue
+        if updated_before is not None and updated_at >= updated_before:
+            continue
+
+        messages: list[ChatMessage] = []
+        for message in checkpoint.checkpoint["channel_values"].get("messages", []):
+            try:
+                messages.append(langchain_to_chat_message(message))
+            except ValueError as e:
+                logger.error(f"Skipping message in thread {thread_id}: {e}")
+        thread = ExportedThread(
+            thread_id=thread_id, agent_id=agent_id, updated_at=updated_at, messages=messages
+        )
+        yield thread.model_dump_json().encode() + b"\n"
@@ -0,0 +1,243 @@
+"""
+In-process queue that records run feedback to LangSmith in the background.
+
+Feedback is accepted without waiting for LangSmith. A background task sends it with
+one long-lived client, in batches of up to `batch_size`, as soon as a batch is full
+or every `flush_interval` seconds. The blocking LangSmith calls run in a worker
+thread, so the event loop never waits on the network.
+
+A batch that fails is retried up to `max_retries` times with exponential backoff.
+Each feedback record gets its ID when it is queued, so a retry never creates it
+twice. At most `max_pending` records are held in memory. If `spill_path` is set,
+feedback that cannot be sent or held is appended to that NDJSON file instead, and
+read back once LangSmith accepts feedback again. Otherwise it is dropped, and a full
+queue rejects new feedback.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from collections.abc import Callable
+from contextlib import suppress
+from typing import Any, NamedTuple
+from uuid import uuid4
+
+from fastapi import HTTPException, status
+
+from schema import Feedback
+
+logger = logging.getLogger(__name__)
+
+
+class FeedbackQueueFull(HTTPException):
+    def __init__(self) -> None:
+        super().__init__(status.HTTP_503_SERVICE_UNAVAILABLE, "Feedback queue is full")
+
+
+class _PendingFeedback(NamedTuple):
+    feedback_id: str
+    feedback: Feedback
+
+    def to_json(self) -> str:
+        return json.dumps({"feedback_id": self.feedback_id, **self.feedback.model_dump()})
+
+    @classmethod
+    def from_json(cls, line: str) -> "_PendingFeedback":
+        data = json.loads(line)
+        return cls(data.pop("feedback_id"), Feedback.model_validate(data))
+
+
+class FeedbackQueue:
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+        spill_path: str | None = None,
+    ) -> None:
+        self.client_factory = client_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.spill_path = spill_path
+        self.submitted = 0
+        self.sent = 0
+        self.retries = 0
+        self.spilled = 0
+        self.dropped = 0
+        self._pending: deque[_PendingFeedback] = deque()
+        # Created on the first send and kept for the life of the service.
+        self._client: Any = None
+        self._started = False
+        self._batch_ready = asyncio.Event()
+        self._spill_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def start(self) -> None:
+        # Created here, on the loop the queue runs on.
+        self._batch_ready = asyncio.Event()
+        self._spill_lock = asyncio.Lock()
+        self._started = True
+        await self._reload()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Send what is queued, once, and spill what could not be sent."""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._started:
+            await self.flush(final=True)
+        if self._pending:
+            await self._give_up(list(self._pending))
+            self._pending.clear()
+        self._client = None
+        self._started = False
+
+    async def submit(self, feedback: list[Feedback]) -> None:
+        """Queue feedback to be sent. Raises FeedbackQueueFull if it cannot be held."""
+        items = [_PendingFeedback(str(uuid4()), f) for f in feedback]
+        if len(self._pending) + len(items) > self.max_pending:
+            if self.spill_path is None:
+                raise FeedbackQueueFull()
+            await self._spill(items)
+        else:
+            self._pending.extend(items)
+        self.submitted += len(items)
+        if len(self._pending) >= self.batch_size:
+            self._batch_ready.set()
+
+    async def _run(self) -> None:
+        while True:
+            with suppress(TimeoutError):
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            self._batch_ready.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Feedback flush failed")
+
+    async def flush(self, final: bool = False) -> None:
+        """
+        Send queued feedback in batches, then read back spilled feedback if all was sent.
+        The final flush on shutdown makes a single attempt and reads nothing back.
+        """
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self)))]
+            failed = await self._send_with_retries(batch, 0 if final else self.max_retries)
+            if failed:
+                # LangSmith is failing: keep the rest queued for the next flush.
+                await self._give_up(failed)
+                return
+            if not self._pending and not final:
+                await self._reload()
+
+    async def _send_with_retries(
+        self, batch: list[_PendingFeedback], retries: int
+    ) -> list[_PendingFeedback]:
+        for attempt in range(retries + 1):
+            if attempt:
+                self.retries += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            batch = await asyncio.to_thread(self._send, batch)
+            if not batch:
+                break
+        return batch
+
+    def _send(self, batch: list[_PendingFeedback]) -> list[_PendingFeedback]:
+        """Send a batch from a worker thread. Returns the feedback that failed."""
+        if self._client is None:
+            try:
+                self._client = self.client_factory()
+            except Exception as e:
+                logger.warning(f"Creating the LangSmith client failed: {e}", exc_info=True)
+                return batch
+        failed = []
+        for item in batch:
+            try:
+                self._client.create_feedback(
+                    run_id=item.feedback.run_id,
+                    key=item.feedback.key,
+                    score=item.feedback.score,
+                    feedback_id=item.feedback_id,
+                    # Retries are handled by the queue, with backoff between batches.
+                    stop_after_attempt=1,
+                    **item.feedback.kwargs,
+                )
+                self.sent += 1
+            except Exception as e:
+                logger.warning(f"Sending feedback {item.feedback_id} failed: {e}", exc_info=True)
+                failed.append(item)
+        return failed
+
+    async def _give_up(self, items: list[_PendingFeedback]) -> None:
+        if self.spill_path is not None:
+            await self._spill(items)
+        else:
+            logger.error(f"Dropping {len(items)} feedback records that could not be sent")
+            self.dropped += len(items)
+
+    async def _spill(self, items: list[_PendingFeedback]) -> None:
+        assert self.spill_path is not None
+        lines = "".join(item.to_json() + "\n" for item in items)
+        async with self._spill_lock:
+            await asyncio.to_thread(self._append, self.spill_path, lines)
+        self.spilled += len(items)
+
+    @staticmethod
+    def _append(path: str, lines: str) -> None:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    async def _reload(self) -> None:
+        """Move spilled feedback back into the queue, as much as it has room for."""
+        room = self.max_pending - len(self._pending)
+        if self.spill_path is None or room <= 0:
+            return
+        async with self._spill_lock:
+            lines = await asyncio.to_thread(self._take_lines, self.spill_path, room)
+        for line in lines:
+            try:
+                self._pending.append(_PendingFeedback.from_json(line))
+            except (ValueError, KeyError) as e:
+                logger.error(f"Skipping unreadable spilled feedback: {e}")
+        if lines:
+            logger.info(f"Resending {len(lines)} spilled feedback records")
+
+    @staticmethod
+    def _take_lines(path: str, count: int) -> list[str]:
+        """Remove and return the first `count` lines of the file at `path`."""
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as f:
+            lines = [line for line in f if line.strip()]
+        taken, rest = lines[:count], lines[count:]
+        if rest:
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                f.writelines(rest)
+            os.replace(f"{path}.tmp", path)
+        else:
+            os.remove(path)
+        return taken
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "retries": self.retries,
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+        }
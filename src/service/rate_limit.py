@@ -0,0 +1,260 @@
+"""
+Per-API-key rate limiting.
+
+Each API key gets an in-memory token bucket for requests per second and, optionally,
+one for LLM tokens per minute. The request bucket is charged when a request is
+authenticated. The LLM token bucket is charged after each model call with the usage
+reported in the response metadata, and new requests are rejected while it is empty.
+"""
+
+import hashlib
+import logging
+import math
+import sqlite3
+import time
+from contextvars import ContextVar
+from typing import Any
+
+from fastapi import HTTPException, status
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.settings import ApiKeyConfig
+
+logger = logging.getLogger(__name__)
+
+# The API key of the request being handled, set by the auth dependency.
+current_api_key: ContextVar["ApiKey | None"] = ContextVar("current_api_key", default=None)
+
+
+def hash_key(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    @property
+    def tokens(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return self._tokens
+
+    def try_consume(self, amount: float = 1) -> bool:
+        if self.tokens < amount:
+            return False
+        self._tokens -= amount
+        return True
+
+    def consume(self, amount: float) -> None:
+        """Take `amount` tokens unconditionally. The bucket may go negative."""
+        self._tokens = self.tokens - amount
+
+    def seconds_until(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available."""
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+
+class RateLimitExceeded(HTTPException):
+    def __init__(self, detail: str, retry_after: float, headers: dict[str, str]) -> None:
+        headers = {**headers, "Retry-After": str(math.ceil(retry_after))}
+        super().__init__(status.HTTP_429_TOO_MANY_REQUESTS, detail, headers=headers)
+
+
+class ApiKey:
+    """An authenticated API key and its rate limit state."""
+
+    def __init__(self, config: ApiKeyConfig) -> None:
+        self.name = config.name
+        self.requests: TokenBucket | None = None
+        self.llm_tokens: TokenBucket | None = None
+        if config.requests_per_second:
+            burst = config.burst or max(1, math.ceil(config.requests_per_second))
+            self.requests = TokenBucket(config.requests_per_second, burst)
+        if config.tokens_per_minute:
+            self.llm_tokens = TokenBucket(config.tokens_per_minute / 60, config.tokens_per_minute)
+
+    def headers(self) -> dict[str, str]:
+        headers = {}
+        if self.requests:
+            headers["RateLimit-Limit"] = str(int(self.requests.capacity))
+            headers["RateLimit-Remaining"] = str(max(0, math.floor(self.requests.tokens)))
+            headers["RateLimit-Reset"] = str(
+                math.ceil(self.requests.seconds_until(self.requests.capacity))
+            )
+        if self.llm_tokens:
+            headers["X-RateLimit-Limit-Tokens"] = str(int(self.llm_tokens.capacity))
+            headers["X-RateLimit-Remaining-Tokens"] = str(
+                max(0, math.floor(self.llm_tokens.tokens))
+            )
+            headers["X-RateLimit-Reset-Tokens"] = str(
+                math.ceil(self.llm_tokens.seconds_until(self.llm_tokens.capacity))
+            )
+        return headers
+
+    @property
+    def burst(self) -> int | None:
+        """Most requests that can be admitted at once, or None without a request limit."""
+        return int(self.requests.capacity) if self.requests else None
+
+    def admit(self, requests: int = 1) -> dict[str, str]:
+        """
+        Charge `requests` requests. Returns the rate limit headers for the response, or
+        raises RateLimitExceeded if the request rate or LLM token budget is exhausted.
+        """
+        if self.llm_tokens and self.llm_tokens.tokens < 1:
+            raise RateLimitExceeded(
+                "LLM token budget exhausted", self.llm_tokens.seconds_until(1), self.headers()
+            )
+        if self.requests and not self.requests.try_consume(requests):
+            raise RateLimitExceeded(
+                "Request rate limit exceeded",
+                self.requests.seconds_until(requests),
+                self.headers(),
+            )
+        return self.headers()
+
+    def record_usage(self, tokens: int) -> None:
+        if self.llm_tokens and tokens:
+            self.llm_tokens.consume(tokens)
+
+
+class ApiKeyRegistry:
+    """API keys by the SHA-256 digest of the key, so plaintext keys need not be stored."""
+
+    def __init__(self, configs: list[ApiKeyConfig] | None = None) -> None:
+        self._keys: dict[str, ApiKey] = {}
+        self._names: dict[str, ApiKey] = {}
+        for config in configs or []:
+            self.add(config)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, config: ApiKeyConfig) -> None:
+        if config.key is not None:
+            digest = hash_key(config.key.get_secret_value())
+        elif config.key_sha256 is not None:
+            digest = config.key_sha256.lower()
+        else:
+            raise ValueError(f"API key {config.name} needs either key or key_sha256")
+        self._keys[digest] = self._names[config.name] = ApiKey(config)
+
+    def load_sqlite(self, path: str) -> None:
+        """
+        Add the keys stored in a SQLite database with an `api_keys` table:
+
+            CREATE TABLE api_keys (
+                name TEXT PRIMARY KEY,
+                key_sha256 TEXT NOT NULL UNIQUE,
+                requests_per_second REAL,
+                burst INTEGER,
+                tokens_per_minute INTEGER
+            )
+        """
+        with sqlite3.connect(path) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                "SELECT name, key_sha256, requests_per_second, burst, tokens_per_minute "
+                "FROM api_keys"
+            ).fetchall()
+        for row in rows:
+            self.add(ApiKeyConfig(**dict(row)))
+        logger.info(f"Loaded {len(rows)} API keys from {path}")
+
+    def authenticate(self, credentials: str | None) -> ApiKey | None:
+        if not credentials or not self._keys:
+            return None
+        return self._keys.get(hash_key(credentials))
+
+    def get(self, name: str) -> ApiKey | None:
+        """Look up a key by name, e.g. for a queued run submitted with it."""
+        return self._names.get(name)
+
+
+def _total_tokens(usage: dict[str, Any]) -> int:
+    if "total_tokens" in usage:
+        return int(usage["total_tokens"] or 0)
+    # OpenAI-style prompt/completion or Anthropic-style input/output counts
+    prompt = usage.get("prompt_tokens", usage.get("input_tokens", 0)) or 0
+    completion = usage.get("completion_tokens", usage.get("output_tokens", 0)) or 0
+    return int(prompt) + int(completion)
+
+
+def llm_result_tokens(response: LLMResult) -> int:
+    """Total tokens used by a model call, from the usage in its response metadata."""
+    total = 0
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            if message is None:
+                continue
+            metadata = message.response_metadata
+            usage = metadata.get("token_usage") or metadata.get("usage")
+            if usage:
+                total += _total_tokens(usage)
+            elif usage_metadata := getattr(message, "usage_metadata", None):
+                total += usage_metadata["total_tokens"]
+    if not total and response.llm_output:
+        usage = response.llm_output.get("token_usage") or response.llm_output.get("usage")
+        if usage:
+            total = _total_tokens(usage)
+    return total
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """Charges the LLM token usage of every model call in a run to an API key."""
+
+    run_inline = True
+
+    def __init__(self, api_key: ApiKey) -> None:
+        self.api_key = api_key
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        self.api_key.record_usage(llm_result_tokens(response))
+
+
+def usage_callbacks() -> list[BaseCallbackHandler]:
+    """Callbacks that charge a run's LLM usage to the current API key, if it has a budget."""
+    api_key = current_api_key.get()
+    if api_key is None or api_key.llm_tokens is None:
+        return []
+    return [TokenUsageHandler(api_key)]
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Adds the rate limit headers stored in `request.state.rate_limit_headers` by the auth
+    dependency to the response. Implemented as plain ASGI so streaming responses are
+    passed through untouched.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Make sure request.state in the endpoint refers to this dict.
+        state = scope.setdefault("state", {})
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start" and (
+                headers := state.get("rate_limit_headers")
+            ):
+                message["headers"] = [
+                    *message.get("headers", []),
+                    *((k.lower().encode(), v.encode()) for k, v in headers.items()),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
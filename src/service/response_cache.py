@@ -0,0 +1,228 @@
+"""
+Exact-match response cache for stateless /invoke calls.
+
+Responses are keyed on the agent, the model and the normalized message, and only
+cached for requests without a thread_id, whose answer does not depend on earlier
+turns. Entries expire after a TTL and the least recently used entries are evicted
+to stay under a size cap in bytes. An in-memory tier can be backed by a larger
+on-disk SQLite tier, which survives restarts and can be shared between workers.
+
+Clients control the cache with the Cache-Control request header: `no-cache` skips
+the lookup but stores the fresh response, `no-store` bypasses the cache entirely.
+"""
+
+import hashlib
+import json
+import logging
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Any, NamedTuple
+
+import aiosqlite
+
+from schema import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_message(message: str) -> str:
+    """Unicode NFKC, case-folded, with runs of whitespace collapsed to one space."""
+    return " ".join(unicodedata.normalize("NFKC", message).casefold().split())
+
+
+def cache_key(agent_id: str, model: str, message: str) -> str:
+    raw = json.dumps([agent_id, model, normalize_message(message)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class CacheControl(NamedTuple):
+    lookup: bool
+    store: bool
+
+
+def parse_cache_control(header: str | None) -> CacheControl:
+    directives = {d.strip().split("=")[0].lower() for d in (header or "").split(",")}
+    if "no-store" in directives:
+        return CacheControl(lookup=False, store=False)
+    if "no-cache" in directives:
+        return CacheControl(lookup=False, store=True)
+    return CacheControl(lookup=True, store=True)
+
+
+class _Entry(NamedTuple):
+    value: bytes
+    expires_at: float
+
+
+class MemoryTier:
+    """LRU of serialized responses, holding at most `max_bytes` of values."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def put(self, key: str, value: bytes, expires_at: float) -> None:
+        if key in self._entries:
+            self._remove(key)
+        if len(value) > self.max_bytes:
+            return
+        self._entries[key] = _Entry(value, expires_at)
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        self.size -= len(self._entries.pop(key).value)
+
+
+class SqliteTier:
+    """
+    Responses stored in a SQLite database. Expired entries are dropped, and the least
+    recently used ones evicted beyond `max_bytes`, whenever an entry is added.
+    """
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._conn: aiosqlite.Connection | None = None
+
+    async def setup(self) -> None:
+        self._conn = await aiosqlite.connect(self.path)
+        await self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS response_cache_accessed_at
+                ON response_cache (accessed_at);
+            """
+        )
+        await self._conn.commit()
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    @property
+    def conn(self) -> aiosqlite.Connection:
+        if self._conn is None:
+            raise RuntimeError("SqliteTier.setup() has not been called")
+        return self._conn
+
+    async def get(self, key: str) -> tuple[bytes, float] | None:
+        now = time.time()
+        cursor = await self.conn.execute(
+            "SELECT value, expires_at FROM response_cache WHERE key = ? AND expires_at > ?",
+            (key, now),
+        )
+        row = await cursor.fetchone()
+        if row is None:
+            return None
+        await self.conn.execute(
+            "UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key)
+        )
+        await self.conn.commit()
+        return row[0], row[1]
+
+    async def put(self, key: str, value: bytes, expires_at: float) -> None:
+        now = time.time()
+        await self.conn.execute(
+            "INSERT OR REPLACE INTO response_cache (key, value, size, expires_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value), expires_at, now),
+        )
+        await self.conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+        cursor = await self.conn.execute(
+            """
+            DELETE FROM response_cache WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS total
+                    FROM response_cache
+                ) WHERE total > ?
+            )
+            """,
+            (self.max_bytes,),
+        )
+        self.evictions += max(cursor.rowcount, 0)
+        await self.conn.commit()
+
+
+class ResponseCache:
+    """In-memory LRU and TTL cache of responses, optionally backed by a SQLite tier."""
+
+    def __init__(
+        self, ttl: float, max_bytes: int, db_path: str | None = None, db_max_bytes: int = 0
+    ) -> None:
+        self.ttl = ttl
+        self.memory = MemoryTier(max_bytes)
+        self.disk = SqliteTier(db_path, db_max_bytes) if db_path else None
+        self.hits: Counter[str] = Counter()
+        self.misses = 0
+        self.bypassed = 0
+
+    async def setup(self) -> None:
+        if self.disk is not None:
+            await self.disk.setup()
+
+    async def close(self) -> None:
+        if self.disk is not None:
+            await self.disk.close()
+
+    async def get(self, key: str) -> ChatMessage | None:
+        if (value := self.memory.get(key)) is not None:
+            self.hits["memory"] += 1
+            return ChatMessage.model_validate_json(value)
+        if self.disk is not None and (row := await self.disk.get(key)) is not None:
+            value, expires_at = row
+            # Promote to the memory tier, keeping the original expiry.
+            self.memory.put(key, value, expires_at)
+            self.hits["disk"] += 1
+            return ChatMessage.model_validate_json(value)
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, message: ChatMessage) -> None:
+        value = message.model_dump_json().encode()
+        expires_at = time.time() + self.ttl
+        self.memory.put(key, value, expires_at)
+        if self.disk is not None:
+            await self.disk.put(key, value, expires_at)
+
+    def stats(self) -> dict[str, Any]:
+        hits = sum(self.hits.values())
+        lookups = hits + self.misses
+        return {
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(self.memory),
+            "bytes": self.memory.size,
+            "evictions": {
+                "memory": self.memory.evictions,
+                "disk": self.disk.evictions if self.disk is not None else 0,
+            },
+        }
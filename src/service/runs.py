@@ -0,0 +1,245 @@
+"""
+Asynchronous runs: a pluggable queue of submitted runs and a worker pool draining it.
+
+Runs are submitted with RunWorkerPool.submit(), which returns immediately. Workers
+claim queued runs in submission order and record their outcome back in the queue, so
+the status and result can be looked up by run_id. InMemoryRunQueue is the default;
+SqliteRunQueue persists runs so that queued runs, and runs interrupted by a restart,
+are picked up again when the service starts.
+"""
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+from uuid import uuid4
+
+import aiosqlite
+
+from schema import ChatMessage, RunInfo, StreamInput
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedRun(RunInfo):
+    """A run together with the input it was submitted with."""
+
+    input: StreamInput
+    # Name of the API key the run was submitted with, charged for its LLM usage.
+    api_key: str | None = None
+
+
+def _now() -> datetime:
+    return datetime.now(UTC)
+
+
+class RunQueue(ABC):
+    """Storage for submitted runs and the order in which they are executed."""
+
+    async def setup(self) -> None:
+        """Prepare the queue before workers start claiming runs."""
+
+    async def close(self) -> None:
+        """Release any resources held by the queue."""
+
+    @abstractmethod
+    async def put(self, run: QueuedRun) -> None:
+        """Add a queued run."""
+
+    @abstractmethod
+    async def claim(self) -> QueuedRun:
+        """Wait for the oldest queued run, mark it running and return it."""
+
+    @abstractmethod
+    async def save(self, run: QueuedRun) -> None:
+        """Store the updated status of a run."""
+
+    @abstractmethod
+    async def get(self, run_id: str) -> QueuedRun | None:
+        """Look up a run by ID."""
+
+    @abstractmethod
+    async def depth(self) -> int:
+        """Number of runs waiting for a worker."""
+
+
+class InMemoryRunQueue(RunQueue):
+    """
+    Process-local queue. Runs are lost on restart.
+
+    Only the most recent `max_finished` finished runs are kept for lookup.
+    """
+
+    def __init__(self, max_finished: int = 10000) -> None:
+        self._runs: dict[str, QueuedRun] = {}
+        self._pending: asyncio.Queue[str] = asyncio.Queue()
+        self._finished: deque[str] = deque()
+        self.max_finished = max_finished
+
+    async def put(self, run: QueuedRun) -> None:
+        self._runs[run.run_id] = run
+        self._pending.put_nowait(run.run_id)
+
+    async def claim(self) -> QueuedRun:
+        run = self._runs[await self._pending.get()]
+        run.status = "running"
+        run.started_at = _now()
+        return run
+
+    async def save(self, run: QueuedRun) -> None:
+        self._runs[run.run_id] = run
+        if run.status in ("succeeded", "failed"):
+            self._finished.append(run.run_id)
+            while len(self._finished) > self.max_finished:
+                self._runs.pop(self._finished.popleft(), None)
+
+    async def get(self, run_id: str) -> QueuedRun | None:
+        return self._runs.get(run_id)
+
+    async def depth(self) -> int:
+        return self._pending.qsize()
+
+
+class SqliteRunQueue(RunQueue):
+    """
+    Durable queue stored in a SQLite database.
+
+    On setup, runs left in the `running` state by a previous process are queued again,
+    so they are executed from the start once workers are running.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn: aiosqlite.Connection | None = None
+        # Held while looking for a queued run, and notified when one is added.
+        self._available = asyncio.Condition()
+
+    async def setup(self) -> None:
+        self._conn = await aiosqlite.connect(self.path)
+        await self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS runs_status_created_at ON runs (status, created_at);
+            """
+        )
+        cursor = await self._conn.execute(
+            "UPDATE runs SET status = 'queued' WHERE status = 'running'"
+        )
+        if cursor.rowcount:
+            logger.info(f"Requeued {cursor.rowcount} runs interrupted by a restart")
+        await self._conn.commit()
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    @property
+    def conn(self) -> aiosqlite.Connection:
+        if self._conn is None:
+            raise RuntimeError("SqliteRunQueue.setup() has not been called")
+        return self._conn
+
+    async def _write(self, run: QueuedRun) -> None:
+        await self.conn.execute(
+            "INSERT OR REPLACE INTO runs (run_id, status, created_at, data) VALUES (?, ?, ?, ?)",
+            (run.run_id, run.status, run.created_at.isoformat(), run.model_dump_json()),
+        )
+        await self.conn.commit()
+
+    async def put(self, run: QueuedRun) -> None:
+        await self._write(run)
+        async with self._available:
+            self._available.notify()
+
+    async def _claim_next(self) -> QueuedRun | None:
+        cursor = await self.conn.execute(
+            "SELECT data FROM runs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+        )
+        row = await cursor.fetchone()
+        if row is None:
+            return None
+        run = QueuedRun.model_validate_json(row[0])
+        run.status = "running"
+        run.started_at = _now()
+        await self._write(run)
+        return run
+
+    async def claim(self) -> QueuedRun:
+        async with self._available:
+            while (run := await self._claim_next()) is None:
+                await self._available.wait()
+            return run
+
+    async def save(self, run: QueuedRun) -> None:
+        await self._write(run)
+
+    async def get(self, run_id: str) -> QueuedRun | None:
+        cursor = await self.conn.execute("SELECT data FROM runs WHERE run_id = ?", (run_id,))
+        row = await cursor.fetchone()
+        return QueuedRun.model_validate_json(row[0]) if row else None
+
+    async def depth(self) -> int:
+        cursor = await self.conn.execute("SELECT COUNT(*) FROM runs WHERE status = 'queued'")
+        row = await cursor.fetchone()
+        return row[0] if row else 0
+
+
+ExecuteRun = Callable[[QueuedRun], Awaitable[ChatMessage]]
+
+
+class RunWorkerPool:
+    """Fixed-size pool of worker tasks that execute runs claimed from a RunQueue."""
+
+    def __init__(self, queue: RunQueue, execute: ExecuteRun, size: int) -> None:
+        self.queue = queue
+        self.execute = execute
+        self.size = size
+        self._workers: list[asyncio.Task] = []
+
+    async def submit(
+        self, agent_id: str, user_input: StreamInput, api_key: str | None = None
+    ) -> QueuedRun:
+        run = QueuedRun(
+            run_id=str(uuid4()),
+            agent_id=agent_id,
+            status="queued",
+            created_at=_now(),
+            input=user_input,
+            api_key=api_key,
+        )
+        await self.queue.put(run)
+        return run
+
+    def start(self) -> None:
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.size)]
+
+    async def stop(self) -> None:
+        """
+        Cancel the workers. Runs in progress are left as running, so a durable queue
+        executes them again on the next start.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _work(self) -> None:
+        while True:
+            run = await self.queue.claim()
+            try:
+                run.output = await self.execute(run)
+                run.status = "succeeded"
+            except Exception:
+                logger.exception(f"Run {run.run_id} failed")
+                run.status = "failed"
+                run.error = "Unexpected error"
+            run.finished_at = _now()
+            await self.queue.save(run)
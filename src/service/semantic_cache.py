@@ -0,0 +1,168 @@
+"""
+Semantic response cache for stateless /invoke calls, backed by chromadb.
+
+Incoming messages are embedded on the CPU with chromadb's bundled ONNX MiniLM model.
+When an earlier answer from the same agent and model was given to a message whose
+cosine similarity is at least `threshold`, that answer is returned and the agent is
+not run. Entries expire after a TTL, and the oldest are evicted beyond `max_entries`.
+The cache never fails a request: errors from chromadb count as misses and are logged.
+
+chromadb is imported when the cache is set up, so it is only needed when enabled.
+"""
+
+import asyncio
+import logging
+import statistics
+import time
+from collections import deque
+from typing import Any
+from uuid import uuid4
+
+from schema import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "semantic_cache"
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        threshold: float,
+        ttl: float,
+        max_entries: int,
+        path: str | None = None,
+        latency_window: int = 1000,
+    ) -> None:
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+        # Lookup latencies in seconds, including embedding the message.
+        self.latencies: deque[float] = deque(maxlen=latency_window)
+        self._collection: Any = None
+        self._embed: Any = None
+
+    async def setup(self) -> None:
+        await asyncio.to_thread(self._open)
+
+    def _open(self) -> None:
+        import chromadb
+        from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+        client = chromadb.PersistentClient(self.path) if self.path else chromadb.EphemeralClient()
+        self._collection = client.get_or_create_collection(
+            COLLECTION_NAME, metadata={"hnsw:space": "cosine"}
+        )
+        self._embed = ONNXMiniLM_L6_V2(preferred_providers=["CPUExecutionProvider"])
+        logger.info(f"Semantic cache opened with {self._collection.count()} entries")
+
+    @property
+    def collection(self) -> Any:
+        if self._collection is None:
+            raise RuntimeError("SemanticCache.setup() has not been called")
+        return self._collection
+
+    async def get(self, agent_id: str, model: str, message: str) -> ChatMessage | None:
+        start = time.perf_counter()
+        try:
+            value = await asyncio.to_thread(self._lookup, agent_id, model, message)
+        except Exception as e:
+            logger.warning(
+                f"Semantic cache lookup failed, treating it as a miss: {e}", exc_info=True
+            )
+            self.errors += 1
+            value = None
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return ChatMessage.model_validate_json(value)
+
+    def _lookup(self, agent_id: str, model: str, message: str) -> str | None:
+        result = self.collection.query(
+            query_embeddings=self._embed([message]),
+            n_results=1,
+            where={
+                "$and": [
+                    {"agent_id": agent_id},
+                    {"model": model},
+                    {"expires_at": {"$gt": time.time()}},
+                ]
+            },
+            include=["distances", "metadatas"],
+        )
+        if not result["ids"][0]:
+            return None
+        # Cosine distance is 1 - cosine similarity.
+        if 1 - result["distances"][0][0] < self.threshold:
+            return None
+        return result["metadatas"][0][0]["response"]
+
+    async def put(self, agent_id: str, model: str, message: str, response: ChatMessage) -> None:
+        try:
+            await asyncio.to_thread(
+                self._store, agent_id, model, message, response.model_dump_json()
+            )
+        except Exception as e:
+            logger.warning(f"Semantic cache store failed: {e}", exc_info=True)
+            self.errors += 1
+
+    def _store(self, agent_id: str, model: str, message: str, response: str) -> None:
+        now = time.time()
+        self.collection.add(
+            ids=[str(uuid4())],
+            embeddings=self._embed([message]),
+            documents=[message],
+            metadatas=[
+                {
+                    "agent_id": agent_id,
+                    "model": model,
+                    "response": response,
+                    "created_at": now,
+                    "expires_at": now + self.ttl,
+                }
+            ],
+        )
+        if self.collection.count() > self.max_entries:
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then the oldest down to 90% of max_entries."""
+        entries = self.collection.get(include=["metadatas"])
+        by_age = sorted(
+            zip(entries["ids"], entries["metadatas"], strict=True),
+            key=lambda entry: entry[1]["created_at"],
+        )
+        excess = len(by_age) - int(self.max_entries * 0.9)
+        evict = [
+            entry_id
+            for i, (entry_id, metadata) in enumerate(by_age)
+            if i < excess or metadata["expires_at"] <= now
+        ]
+        if evict:
+            self.collection.delete(ids=evict)
+            self.evictions += len(evict)
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        latencies = sorted(self.latencies)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "threshold": self.threshold,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "lookup_latency": {
+                "mean": statistics.fmean(latencies) if latencies else 0.0,
+                "p50": latencies[len(latencies) // 2] if latencies else 0.0,
+                "p95": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+            },
+        }
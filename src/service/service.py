@@ -1,71 +1,236 @@
-import json
+import asyncio
 import logging
+import time
 import warnings
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
+from datetime import UTC, datetime
 from typing import Annotated, Any
 from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends, FastAPI, HTTPException, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Request,
+    Response,
+    WebSocket,
+    status,
+)
 from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from langchain_core._api import LangChainBetaWarning
-from langchain_core.messages import AnyMessage, HumanMessage
+from langchain_core.messages import AIMessageChunk, AnyMessage, HumanMessage
 from langchain_core.runnables import RunnableConfig
-from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.constants import TAG_NOSTREAM
 from langgraph.graph.state import CompiledStateGraph
 from langsmith import Client as LangsmithClient
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-from agents import DEFAULT_AGENT, get_agent, get_all_agent_info
+from agents import DEFAULT_AGENT, get_agent, get_agent_stream_engine, get_all_agent_info
 from core import settings
+from core.metrics import StreamRecorder, instrument_checkpointer, record_run
+from core.tracing import configure_tracing, tracing_callbacks
+from memory import CheckpointRetention, create_checkpointer
 from schema import (
+    BatchInput,
+    BatchResult,
     ChatHistory,
     ChatHistoryInput,
     ChatMessage,
+    ExportInput,
     Feedback,
+    FeedbackBatch,
     FeedbackResponse,
+    RunInfo,
     ServiceMetadata,
     StreamInput,
     UserInput,
+    WebSocketStart,
+)
+from service import sse
+from service.admission import AdmissionController, AdmissionRejected, release_after
+from service.batch import run_batch, stream_batch
+from service.export import export_threads
+from service.feedback import FeedbackQueue
+from service.rate_limit import (
+    ApiKey,
+    ApiKeyRegistry,
+    RateLimitHeadersMiddleware,
+    current_api_key,
+    usage_callbacks,
+)
+from service.response_cache import ResponseCache, cache_key, parse_cache_control
+from service.runs import (
+    InMemoryRunQueue,
+    QueuedRun,
+    RunQueue,
+    RunWorkerPool,
+    SqliteRunQueue,
 )
+from service.semantic_cache import SemanticCache
+from service.stream_buffer import (
+    RunStream,
+    StreamRegistry,
+    SubscriberResponse,
+    parse_event_id,
+)
+from service.timings import RunTimer
+from service.tracing import TracingMiddleware
 from service.utils import (
+    TokenCoalescer,
     convert_message_content_to_string,
+    langchain_to_chat_dict,
     langchain_to_chat_message,
     remove_tool_calls,
 )
+from service.websocket import RunMultiplexer
 
 warnings.filterwarnings("ignore", category=LangChainBetaWarning)
 logger = logging.getLogger(__name__)
 
 
-def verify_bearer(
+api_keys = ApiKeyRegistry(settings.API_KEYS)
+
+
+def _authenticate(credentials: str | None) -> ApiKey | None:
+    """
+    Check the bearer credentials. Returns the matching API key, or None when the shared
+    AUTH_SECRET was used or no auth is configured. Raises 401 otherwise.
+    """
+    if settings.AUTH_SECRET and credentials == settings.AUTH_SECRET.get_secret_value():
+        return None
+    api_key = api_keys.authenticate(credentials)
+    if api_key is None and (settings.AUTH_SECRET or len(api_keys)):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return api_key
+
+
+async def verify_bearer(
+    request: Request,
     http_auth: Annotated[
         HTTPAuthorizationCredentials | None,
-        Depends(HTTPBearer(description="Please provide AUTH_SECRET api key.", auto_error=False)),
+        Depends(
+            HTTPBearer(description="Please provide AUTH_SECRET or an API key.", auto_error=False)
+        ),
     ],
 ) -> None:
-    if not settings.AUTH_SECRET:
-        return
-    auth_secret = settings.AUTH_SECRET.get_secret_value()
-    if not http_auth or http_auth.credentials != auth_secret:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    api_key = _authenticate(http_auth.credentials if http_auth else None)
+    if api_key is not None:
+        request.state.rate_limit_headers = api_key.admit()
+        current_api_key.set(api_key)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
-    # Construct agent with Sqlite checkpointer
+    # Construct agents with the checkpointer configured in settings
     # TODO: It's probably dangerous to share the same checkpointer on multiple agents
-    async with AsyncSqliteSaver.from_conn_string("checkpoints.db") as saver:
+    if settings.API_KEYS_DB:
+        api_keys.load_sqlite(settings.API_KEYS_DB)
+    tracer_provider = configure_tracing()
+    async with create_checkpointer() as saver:
         agents = get_all_agent_info()
         for a in agents:
             agent = get_agent(a.key)
             agent.checkpointer = saver
-        yield
-    # context manager will clean up the AsyncSqliteSaver on exit
+        instrument_checkpointer(saver)
+        app.state.checkpointer = saver
+        if checkpoint_retention is not None:
+            await checkpoint_retention.start(saver)
+        await run_workers.queue.setup()
+        run_workers.start()
+        admission_controller.start()
+        await feedback_queue.start()
+        if response_cache is not None:
+            await response_cache.setup()
+        if semantic_cache is not None:
+            await semantic_cache.setup()
+        try:
+            yield
+        finally:
+            if response_cache is not None:
+                await response_cache.close()
+            if checkpoint_retention is not None:
+                await checkpoint_retention.stop()
+            await feedback_queue.stop()
+            await admission_controller.stop()
+            await run_workers.stop()
+            await run_workers.queue.close()
+            if tracer_provider is not None:
+                tracer_provider.force_flush()
+    # context manager will close the checkpointer's connections on exit
 
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(RateLimitHeadersMiddleware)
+app.add_middleware(TracingMiddleware)
 router = APIRouter(dependencies=[Depends(verify_bearer)])
+stream_registry = StreamRegistry(
+    max_events=settings.STREAM_BUFFER_SIZE,
+    ttl=settings.STREAM_BUFFER_TTL,
+    disconnect_grace=settings.STREAM_DISCONNECT_GRACE,
+)
+admission_controller = AdmissionController(
+    max_concurrency=settings.ADMISSION_MAX_CONCURRENCY,
+    agent_max_concurrency=settings.ADMISSION_AGENT_MAX_CONCURRENCY,
+    agent_limits=settings.ADMISSION_AGENT_LIMITS,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+    max_loop_lag=settings.ADMISSION_MAX_LOOP_LAG,
+    retry_after=settings.ADMISSION_RETRY_AFTER,
+)
+response_cache = (
+    ResponseCache(
+        ttl=settings.RESPONSE_CACHE_TTL,
+        max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+        db_path=settings.RESPONSE_CACHE_DB,
+        db_max_bytes=settings.RESPONSE_CACHE_DB_MAX_BYTES,
+    )
+    if settings.RESPONSE_CACHE
+    else None
+)
+
+semantic_cache = (
+    SemanticCache(
+        threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+        ttl=settings.SEMANTIC_CACHE_TTL,
+        max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+        path=settings.SEMANTIC_CACHE_PATH,
+    )
+    if settings.SEMANTIC_CACHE
+    else None
+)
+
+# LangsmithClient is looked up when the queue starts, so it can be patched in tests.
+feedback_queue = FeedbackQueue(
+    lambda: LangsmithClient(),
+    batch_size=settings.FEEDBACK_BATCH_SIZE,
+    flush_interval=settings.FEEDBACK_FLUSH_INTERVAL,
+    max_pending=settings.FEEDBACK_MAX_PENDING,
+    max_retries=settings.FEEDBACK_MAX_RETRIES,
+    spill_path=settings.FEEDBACK_SPILL_PATH,
+)
+
+checkpoint_retention = (
+    CheckpointRetention(
+        keep_last=settings.CHECKPOINT_KEEP_LAST,
+        ttl=settings.CHECKPOINT_TTL,
+        interval=settings.CHECKPOINT_COMPACTION_INTERVAL,
+        batch_size=settings.CHECKPOINT_COMPACTION_BATCH_SIZE,
+        vacuum_pages=settings.CHECKPOINT_VACUUM_PAGES,
+        rebuild=settings.CHECKPOINT_VACUUM_REBUILD,
+    )
+    if settings.CHECKPOINT_KEEP_LAST is not None or settings.CHECKPOINT_TTL is not None
+    else None
+)
+
+
+def _create_run_queue() -> RunQueue:
+    if settings.RUN_QUEUE == "sqlite":
+        return SqliteRunQueue(settings.RUN_QUEUE_DB)
+    return InMemoryRunQueue()
 
 
 @router.get("/info")
@@ -80,57 +245,184 @@ async def info() -> ServiceMetadata:
     )
 
 
-def _parse_input(user_input: UserInput) -> tuple[dict[str, Any], UUID]:
-    run_id = uuid4()
+def _parse_input(
+    user_input: UserInput, run_id: UUID | None = None, agent_id: str = DEFAULT_AGENT
+) -> tuple[dict[str, Any], UUID]:
+    run_id = run_id or uuid4()
     thread_id = user_input.thread_id or str(uuid4())
     kwargs = {
         "input": {"messages": [HumanMessage(content=user_input.message)]},
         "config": RunnableConfig(
-            configurable={"thread_id": thread_id, "model": user_input.model}, run_id=run_id
+            configurable={"thread_id": thread_id, "model": user_input.model},
+            run_id=run_id,
+            callbacks=[*usage_callbacks(), *tracing_callbacks()],
+            # Stored in the checkpoint metadata, so threads can be exported by agent.
+            metadata={"agent_id": agent_id},
         ),
     }
     return kwargs, run_id
 
 
+def _check_agent(agent_id: str) -> None:
+    """
+    Raise 404 for an unknown agent. Called before admission, so that no concurrency
+    limiter is created for it.
+    """
+    try:
+        get_agent(agent_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Agent {agent_id} not found")
+
+
+def _model_label(user_input: UserInput) -> str:
+    return str(user_input.model or settings.DEFAULT_MODEL)
+
+
 @router.post("/{agent_id}/invoke")
 @router.post("/invoke")
-async def invoke(user_input: UserInput, agent_id: str = DEFAULT_AGENT) -> ChatMessage:
+async def invoke(
+    user_input: UserInput,
+    response: Response,
+    agent_id: str = DEFAULT_AGENT,
+    cache_control: Annotated[str | None, Header()] = None,
+) -> ChatMessage:
     """
     Invoke an agent with user input to retrieve a final response.
 
     If agent_id is not provided, the default agent will be used.
     Use thread_id to persist and continue a multi-turn conversation. run_id kwarg
     is also attached to messages for recording feedback.
+
+    When the response caches are enabled, requests without a thread_id may be answered
+    from the exact-match cache or, for a sufficiently similar earlier message, from the
+    semantic cache, keeping the run_id of the run that produced the answer. The X-Cache
+    response header is HIT, SEMANTIC-HIT, MISS or BYPASS. Send `Cache-Control: no-cache`
+    to force a fresh response, or `no-store` to bypass the caches entirely.
+
+    Returns 429 or 503 with a Retry-After header when the service is at capacity.
     """
     agent: CompiledStateGraph = get_agent(agent_id)
-    kwargs, run_id = _parse_input(user_input)
+    cacheable = user_input.thread_id is None and (
+        response_cache is not None or semantic_cache is not None
+    )
+    control = parse_cache_control(cache_control)
+    # Requests for the default model share entries whether or not they name it.
+    model = _model_label(user_input)
+    key = cache_key(agent_id, model, user_input.message)
+    if cacheable:
+        if control.lookup:
+            if response_cache is not None and (cached := await response_cache.get(key)):
+                response.headers["X-Cache"] = "HIT"
+                return cached
+            if semantic_cache is not None and (
+                cached := await semantic_cache.get(agent_id, model, user_input.message)
+            ):
+                response.headers["X-Cache"] = "SEMANTIC-HIT"
+                return cached
+            response.headers["X-Cache"] = "MISS"
+        else:
+            if response_cache is not None:
+                response_cache.bypassed += 1
+            response.headers["X-Cache"] = "BYPASS"
+
+    async with admission_controller.admit(agent_id):
+        try:
+            output = await _invoke_agent(agent, user_input, agent_id)
+        except Exception as e:
+            logger.error(f"An exception occurred: {e}")
+            raise HTTPException(status_code=500, detail="Unexpected error")
+    if cacheable and control.store:
+        if response_cache is not None:
+            await response_cache.put(key, output)
+        if semantic_cache is not None:
+            await semantic_cache.put(agent_id, model, user_input.message, output)
+    return output
+
+
+async def _invoke_agent(
+    agent: CompiledStateGraph, user_input: UserInput, agent_id: str, endpoint: str = "invoke"
+) -> ChatMessage:
+    kwargs, run_id = _parse_input(user_input, agent_id=agent_id)
+    start = time.perf_counter()
+    status = "error"
     try:
         response = await agent.ainvoke(**kwargs)
-        output = langchain_to_chat_message(response["messages"][-1])
-        output.run_id = str(run_id)
-        return output
-    except Exception as e:
-        logger.error(f"An exception occurred: {e}")
-        raise HTTPException(status_code=500, detail="Unexpected error")
+        status = "ok"
+    finally:
+        record_run(
+            agent_id, _model_label(user_input), endpoint, status, time.perf_counter() - start
+        )
+    output = langchain_to_chat_message(response["messages"][-1])
+    output.run_id = str(run_id)
+    return output
 
 
-async def message_generator(
-    user_input: StreamInput, agent_id: str = DEFAULT_AGENT
-) -> AsyncGenerator[str, None]:
+@router.post("/{agent_id}/invoke/batch", response_model=BatchResult)
+@router.post("/invoke/batch", response_model=BatchResult)
+async def invoke_batch(
+    batch_input: BatchInput, request: Request, agent_id: str = DEFAULT_AGENT
+) -> BatchResult | StreamingResponse:
     """
-    Generate a stream of messages from the agent.
+    Invoke an agent on many user inputs concurrently.
 
-    This is the workhorse method for the /stream endpoint.
+    Each input is handled like an /invoke request, with at most `max_concurrency`
+    (capped by the service's BATCH_MAX_CONCURRENCY) running at once. A failing input
+    is reported in its own result and does not fail the batch.
+
+    By default all results are returned in input order once the batch finishes. Set
+    `stream=true` to instead receive each result as a line of NDJSON as soon as it
+    finishes; use `index` to match results to inputs.
+
+    A batch counts as one request per input against the API key's rate limit, and is
+    rejected with 422 if it has more inputs than the key's burst.
     """
+    if len(batch_input.inputs) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Too many inputs (max {settings.BATCH_MAX_ITEMS})",
+        )
+    if (api_key := current_api_key.get()) and len(batch_input.inputs) > 1:
+        if api_key.burst is not None and len(batch_input.inputs) > api_key.burst:
+            # Waiting would not help: the key's bucket never holds enough requests.
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Batch of {len(batch_input.inputs)} inputs exceeds the API key's "
+                f"burst of {api_key.burst} requests",
+            )
+        # The auth dependency already charged the first input.
+        request.state.rate_limit_headers = api_key.admit(len(batch_input.inputs) - 1)
     agent: CompiledStateGraph = get_agent(agent_id)
-    kwargs, run_id = _parse_input(user_input)
+    max_concurrency = min(
+        batch_input.max_concurrency or settings.BATCH_MAX_CONCURRENCY,
+        settings.BATCH_MAX_CONCURRENCY,
+    )
+
+    async def invoke_one(user_input: UserInput) -> ChatMessage:
+        async with admission_controller.admit(agent_id):
+            return await _invoke_agent(agent, user_input, agent_id, endpoint="batch")
+
+    if batch_input.stream:
+        return StreamingResponse(
+            stream_batch(invoke_one, batch_input.inputs, max_concurrency),
+            media_type="application/x-ndjson",
+        )
+    results = await run_batch(invoke_one, batch_input.inputs, max_concurrency)
+    return BatchResult(results=results)
 
-    # Process streamed events from the graph and yield messages over the SSE stream.
+
+# Items yielded by a stream engine: new messages, an LLM token, or None for an event
+# that produced neither (so time-based token flushes still happen).
+StreamItem = list[Any] | str | None
+
+
+async def _astream_events(
+    agent: CompiledStateGraph, kwargs: dict[str, Any], stream_tokens: bool
+) -> AsyncGenerator[StreamItem, None]:
+    """Stream engine built on astream_events, which reports every runnable in the graph."""
     async for event in agent.astream_events(**kwargs, version="v2"):
         if not event:
             continue
 
-        new_messages = []
         # Yield messages written to the graph state after node execution finishes.
         if (
             event["event"] == "on_chain_end"
@@ -139,40 +431,141 @@ async def message_generator(
             and any(t.startswith("graph:step:") for t in event.get("tags", []))
             and "messages" in event["data"]["output"]
         ):
-            new_messages = event["data"]["output"]["messages"]
-
+            yield event["data"]["output"]["messages"]
         # Also yield intermediate messages from agents.utils.CustomData.adispatch().
-        if event["event"] == "on_custom_event" and "custom_data_dispatch" in event.get("tags", []):
-            new_messages = [event["data"]]
-
-        for message in new_messages:
-            try:
-                chat_message = langchain_to_chat_message(message)
-                chat_message.run_id = str(run_id)
-            except Exception as e:
-                logger.error(f"Error parsing message: {e}")
-                yield f"data: {json.dumps({'type': 'error', 'content': 'Unexpected error'})}\n\n"
-                continue
-            # LangGraph re-sends the input message, which feels weird, so drop it
-            if chat_message.type == "human" and chat_message.content == user_input.message:
-                continue
-            yield f"data: {json.dumps({'type': 'message', 'content': chat_message.model_dump()})}\n\n"
-
+        elif event["event"] == "on_custom_event" and "custom_data_dispatch" in event.get(
+            "tags", []
+        ):
+            yield [event["data"]]
         # Yield tokens streamed from LLMs.
-        if (
+        elif (
             event["event"] == "on_chat_model_stream"
-            and user_input.stream_tokens
+            and stream_tokens
             and "llama_guard" not in event.get("tags", [])
+            and TAG_NOSTREAM not in event.get("tags", [])
         ):
+            # Empty content in the context of OpenAI usually means
+            # that the model is asking for a tool to be invoked.
+            # So we only yield non-empty content.
             content = remove_tool_calls(event["data"]["chunk"].content)
-            if content:
-                # Empty content in the context of OpenAI usually means
-                # that the model is asking for a tool to be invoked.
-                # So we only print non-empty content.
-                yield f"data: {json.dumps({'type': 'token', 'content': convert_message_content_to_string(content)})}\n\n"
-            continue
+            yield convert_message_content_to_string(content) if content else None
+        else:
+            yield None
 
-    yield "data: [DONE]\n\n"
+
+async def _astream_updates(
+    agent: CompiledStateGraph, kwargs: dict[str, Any], stream_tokens: bool
+) -> AsyncGenerator[StreamItem, None]:
+    """
+    Lean stream engine built on the graph's own update, custom and message streams.
+
+    Only node outputs, CustomData dispatches and LLM tokens are emitted by the graph, so
+    there are far fewer events to filter than with astream_events. Models tagged with
+    langgraph.constants.TAG_NOSTREAM (e.g. LlamaGuard) do not stream tokens.
+    """
+    stream_mode = ["updates", "custom"]
+    if stream_tokens:
+        stream_mode.append("messages")
+    async for mode, chunk in agent.astream(**kwargs, stream_mode=stream_mode):
+        if mode == "updates":
+            # One update per node that finished in this step.
+            for update in chunk.values():
+                if isinstance(update, dict) and "messages" in update:
+                    yield update["messages"]
+        elif mode == "custom":
+            yield [chunk]
+        elif mode == "messages":
+            message, _ = chunk
+            if not isinstance(message, AIMessageChunk):
+                continue
+            content = remove_tool_calls(message.content)
+            yield convert_message_content_to_string(content) if content else None
+
+
+STREAM_ENGINES = {"events": _astream_events, "updates": _astream_updates}
+
+
+async def message_generator(
+    user_input: StreamInput,
+    agent_id: str = DEFAULT_AGENT,
+    run_id: UUID | None = None,
+    received_at: float | None = None,
+) -> AsyncGenerator[bytes, None]:
+    """
+    Generate a stream of messages from the agent.
+
+    This is the workhorse method for the /stream endpoint. Frames are encoded
+    directly to bytes by service.sse. The stream engine is chosen by the request,
+    then the agent, then settings.STREAM_ENGINE. With `debug_timings`, timing events
+    are sent after the messages that the timed steps led to; `received_at` is the
+    time.perf_counter() at which the request was received.
+    """
+    agent: CompiledStateGraph = get_agent(agent_id)
+    kwargs, run_id = _parse_input(user_input, run_id, agent_id)
+    run_id_str = str(run_id)
+    coalescer = TokenCoalescer(user_input.token_flush_ms, user_input.token_flush_bytes)
+    engine = user_input.stream_engine or get_agent_stream_engine(agent_id) or settings.STREAM_ENGINE
+    recorder = StreamRecorder(agent_id, _model_label(user_input))
+    status = "error"
+    timer = None
+    if user_input.debug_timings:
+        timer = RunTimer(received_at)
+        kwargs["config"]["callbacks"].append(timer)
+
+    try:
+        # Process items streamed from the graph and yield messages over the SSE stream.
+        async for item in STREAM_ENGINES[engine](agent, kwargs, user_input.stream_tokens):
+            # Flush coalesced tokens whose window expired while waiting for this item.
+            if coalescer.due():
+                yield sse.encode_token(coalescer.flush())
+
+            if isinstance(item, str):
+                recorder.token()
+                if timer is not None:
+                    timer.first_token()
+                if token := coalescer.add(item):
+                    yield sse.encode_token(token)
+                continue
+            if not item:
+                continue
+
+            # Tokens buffered so far belong before any new message.
+            if pending := coalescer.flush():
+                yield sse.encode_token(pending)
+
+            for message in item:
+                try:
+                    chat_message = langchain_to_chat_dict(message)
+                    chat_message["run_id"] = run_id_str
+                except Exception as e:
+                    logger.error(f"Error parsing message: {e}")
+                    yield sse.UNEXPECTED_ERROR_FRAME
+                    continue
+                # LangGraph re-sends the input message, which feels weird, so drop it
+                if (
+                    chat_message["type"] == "human"
+                    and chat_message["content"] == user_input.message
+                ):
+                    continue
+                yield sse.encode_message(chat_message)
+
+            if timer is not None:
+                for timing in timer.drain():
+                    yield sse.encode_timing(timing)
+        status = "ok"
+    except (GeneratorExit, asyncio.CancelledError):
+        status = "cancelled"
+        raise
+    finally:
+        recorder.finish(status)
+
+    if pending := coalescer.flush():
+        yield sse.encode_token(pending)
+    if timer is not None:
+        timer.finish()
+        for timing in timer.drain():
+            yield sse.encode_timing(timing)
+    yield sse.DONE_FRAME
 
 
 def _sse_response_example() -> dict[int, Any]:
@@ -181,7 +574,7 @@ def _sse_response_example() -> dict[int, Any]:
             "description": "Server Sent Event Response",
             "content": {
                 "text/event-stream": {
-                    "example": "data: {'type': 'token', 'content': 'Hello'}\n\ndata: {'type': 'token', 'content': ' World'}\n\ndata: [DONE]\n\n",
+                    "example": "id: 847c6285-8fc9-4560-a83f-4e6285809254:1\ndata: {'type': 'token', 'content': 'Hello'}\n\nid: 847c6285-8fc9-4560-a83f-4e6285809254:2\ndata: {'type': 'token', 'content': ' World'}\n\nid: 847c6285-8fc9-4560-a83f-4e6285809254:3\ndata: [DONE]\n\n",
                     "schema": {"type": "string"},
                 }
             },
@@ -189,11 +582,29 @@ def _sse_response_example() -> dict[int, Any]:
     }
 
 
+def _resume_response(run_id: str, after: int) -> StreamingResponse:
+    run_stream = stream_registry.get(run_id)
+    if run_stream is None:
+        raise HTTPException(status_code=404, detail=f"Run {run_id} not found or expired")
+    return SubscriberResponse(run_stream.subscribe(after), headers={"X-Run-ID": run_id})
+
+
+def _parse_last_event_id(last_event_id: str) -> tuple[str, int]:
+    try:
+        return parse_event_id(last_event_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed Last-Event-ID header")
+
+
 @router.post(
     "/{agent_id}/stream", response_class=StreamingResponse, responses=_sse_response_example()
 )
 @router.post("/stream", response_class=StreamingResponse, responses=_sse_response_example())
-async def stream(user_input: StreamInput, agent_id: str = DEFAULT_AGENT) -> StreamingResponse:
+async def stream(
+    user_input: StreamInput,
+    agent_id: str = DEFAULT_AGENT,
+    last_event_id: Annotated[str | None, Header()] = None,
+) -> StreamingResponse:
     """
     Stream an agent's response to a user input, including intermediate messages and tokens.
 
@@ -202,11 +613,157 @@ async def stream(user_input: StreamInput, agent_id: str = DEFAULT_AGENT) -> Stre
     is also attached to all messages for recording feedback.
 
     Set `stream_tokens=false` to return intermediate messages but not token-by-token.
+    Set `token_flush_ms` and/or `token_flush_bytes` to coalesce tokens into fewer, larger
+    token events.
+
+    Every event carries an `id: <run_id>:<seq>` field and the run ID is returned in the
+    `X-Run-ID` header. If the connection drops, resend the request with a `Last-Event-ID`
+    header (or call `GET /runs/{run_id}/stream`) to replay missed events and follow the
+    run if it is still going, instead of starting a new run.
+
+    Returns 429 or 503 with a Retry-After header when the service is at capacity.
     """
-    return StreamingResponse(
-        message_generator(user_input, agent_id),
-        media_type="text/event-stream",
+    if last_event_id:
+        run_id, after = _parse_last_event_id(last_event_id)
+        return _resume_response(run_id, after)
+
+    received_at = time.perf_counter()
+    _check_agent(agent_id)
+    admission = await admission_controller.acquire(agent_id)
+    run_id = uuid4()
+    run_stream = stream_registry.start(
+        str(run_id),
+        release_after(
+            message_generator(user_input, agent_id, run_id=run_id, received_at=received_at),
+            admission,
+        ),
     )
+    return SubscriberResponse(run_stream.subscribe(), headers={"X-Run-ID": run_stream.run_id})
+
+
+@router.get(
+    "/runs/{run_id}/stream", response_class=StreamingResponse, responses=_sse_response_example()
+)
+async def resume_stream(
+    run_id: str, last_event_id: Annotated[str | None, Header()] = None
+) -> StreamingResponse:
+    """
+    Replay the events of a streaming run and follow it until it finishes.
+
+    Pass `Last-Event-ID` to only receive events after that one. Finished runs remain
+    available for STREAM_BUFFER_TTL seconds.
+    """
+    after = 0
+    if last_event_id:
+        event_run_id, after = _parse_last_event_id(last_event_id)
+        if event_run_id != run_id:
+            raise HTTPException(status_code=400, detail="Last-Event-ID is for a different run")
+    return _resume_response(run_id, after)
+
+
+async def _execute_run(run: QueuedRun) -> ChatMessage:
+    """Execute a queued run, publishing its events for GET /runs/{run_id}/events."""
+    # Charge the run's LLM usage to the key it was submitted with.
+    current_api_key.set(api_keys.get(run.api_key) if run.api_key else None)
+    last_message = b""
+    # Timings of a queued run start from when it was queued.
+    queued_for = (datetime.now(UTC) - run.created_at).total_seconds()
+    received_at = time.perf_counter() - queued_for
+
+    async def frames() -> AsyncGenerator[bytes, None]:
+        nonlocal last_message
+        async for frame in message_generator(
+            run.input, run.agent_id, run_id=UUID(run.run_id), received_at=received_at
+        ):
+            if frame.startswith(sse.MESSAGE_PREFIX):
+                last_message = frame
+            yield frame
+
+    if not await stream_registry.pump(stream_registry.open(run.run_id), frames()):
+        raise RuntimeError("Run failed while streaming")
+    if not last_message:
+        raise RuntimeError("Run finished without a message")
+    return ChatMessage.model_validate_json(
+        last_message[len(sse.MESSAGE_PREFIX) : -len(sse.FRAME_SUFFIX)]
+    )
+
+
+run_workers = RunWorkerPool(_create_run_queue(), _execute_run, size=settings.RUN_WORKERS)
+
+
+@router.post("/{agent_id}/runs", status_code=status.HTTP_202_ACCEPTED)
+@router.post("/runs", status_code=status.HTTP_202_ACCEPTED)
+async def create_run(user_input: StreamInput, agent_id: str = DEFAULT_AGENT) -> RunInfo:
+    """
+    Queue an agent run and return immediately.
+
+    Use this for long runs that would outlive an HTTP request. The run is executed by a
+    worker pool of RUN_WORKERS workers; poll `GET /runs/{run_id}` for its status and
+    final output, or follow its progress with `GET /runs/{run_id}/events`.
+
+    Returns 429 with a Retry-After header when RUN_MAX_QUEUE_DEPTH runs are queued.
+    """
+    _check_agent(agent_id)
+    if await run_workers.queue.depth() >= settings.RUN_MAX_QUEUE_DEPTH:
+        raise AdmissionRejected(
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            "Too many queued runs",
+            settings.ADMISSION_RETRY_AFTER,
+        )
+    api_key = current_api_key.get()
+    return await run_workers.submit(agent_id, user_input, api_key.name if api_key else None)
+
+
+async def _get_run(run_id: str) -> QueuedRun:
+    run = await run_workers.queue.get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return run
+
+
+@router.get("/runs/{run_id}")
+async def get_run(run_id: str) -> RunInfo:
+    """Get the status of a run created with /runs, including its output once it succeeded."""
+    return await _get_run(run_id)
+
+
+def _finished_run_stream(run: QueuedRun) -> RunStream:
+    run_stream = RunStream(run.run_id, max_events=2)
+    if run.output:
+        run_stream.publish(sse.encode_message(run.output.model_dump()))
+    else:
+        run_stream.publish(sse.encode_error(run.error or "Unexpected error"))
+    run_stream.publish(sse.DONE_FRAME)
+    run_stream.close()
+    return run_stream
+
+
+@router.get(
+    "/runs/{run_id}/events", response_class=StreamingResponse, responses=_sse_response_example()
+)
+async def run_events(
+    run_id: str, last_event_id: Annotated[str | None, Header()] = None
+) -> StreamingResponse:
+    """
+    Stream the events of a run created with /runs, in the same format as /stream.
+
+    Waits for the run to start if it is still queued. Once a run's events are no longer
+    buffered, only its final message (or error) is sent.
+    """
+    run = await _get_run(run_id)
+    after = 0
+    if last_event_id:
+        event_run_id, after = _parse_last_event_id(last_event_id)
+        if event_run_id != run_id:
+            raise HTTPException(status_code=400, detail="Last-Event-ID is for a different run")
+    run_stream = stream_registry.get(run_id)
+    if run_stream is None:
+        if run.status in ("succeeded", "failed"):
+            run_stream = _finished_run_stream(run)
+            after = 0
+        else:
+            run_stream = stream_registry.open(run_id)
+    return SubscriberResponse(run_stream.subscribe(after))
 
 
 @router.post("/feedback")
@@ -217,39 +774,170 @@ async def feedback(feedback: Feedback) -> FeedbackResponse:
     This is a simple wrapper for the LangSmith create_feedback API, so the
     credentials can be stored and managed in the service rather than the client.
     See: https://api.smith.langchain.com/redoc#tag/feedback/operation/create_feedback_api_v1_feedback_post
+
+    Feedback is queued and sent in the background, so it may reach LangSmith a moment
+    after the response. Returns 503 if the feedback queue is full.
     """
-    client = LangsmithClient()
-    kwargs = feedback.kwargs or {}
-    client.create_feedback(
-        run_id=feedback.run_id,
-        key=feedback.key,
-        score=feedback.score,
-        **kwargs,
-    )
+    await feedback_queue.submit([feedback])
     return FeedbackResponse()
 
 
+@router.post("/feedback/batch")
+async def feedback_batch(batch: FeedbackBatch) -> FeedbackResponse:
+    """Record feedback for many runs to LangSmith at once. See /feedback."""
+    await feedback_queue.submit(batch.feedback)
+    return FeedbackResponse()
+
+
+def _message_index(messages: list[AnyMessage], message_id: str) -> int:
+    for i, message in enumerate(messages):
+        if message.id == message_id:
+            return i
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found")
+
+
+def _history_page(
+    messages: list[AnyMessage], input: ChatHistoryInput
+) -> tuple[list[AnyMessage], bool]:
+    """Select the requested page of a thread's messages, and whether there are more."""
+    limit = input.limit or len(messages)
+    if input.since is not None:
+        return messages[_message_index(messages, input.since) + 1 :], False
+    if input.after is not None:
+        start = _message_index(messages, input.after) + 1
+        return messages[start : start + limit], start + limit < len(messages)
+    end = _message_index(messages, input.before) if input.before is not None else len(messages)
+    start = max(0, end - limit)
+    return messages[start:end], start > 0
+
+
+@router.post("/{agent_id}/history")
 @router.post("/history")
-def history(input: ChatHistoryInput) -> ChatHistory:
+async def history(input: ChatHistoryInput, agent_id: str = DEFAULT_AGENT) -> ChatHistory:
     """
     Get chat history.
+
+    Returns the whole thread by default. Set `limit` to get the most recent messages,
+    then page backwards with `before` or forwards with `after`, passing a message ID
+    from the previous page. Set `since` to the last message ID already received to get
+    only newer messages. Only the messages on the returned page are converted.
     """
-    # TODO: Hard-coding DEFAULT_AGENT here is wonky
-    agent: CompiledStateGraph = get_agent(DEFAULT_AGENT)
+    agent: CompiledStateGraph = get_agent(agent_id)
     try:
-        state_snapshot = agent.get_state(
+        state_snapshot = await agent.aget_state(
             config=RunnableConfig(
                 configurable={
                     "thread_id": input.thread_id,
                 }
             )
         )
-        messages: list[AnyMessage] = state_snapshot.values["messages"]
-        chat_messages: list[ChatMessage] = [langchain_to_chat_message(m) for m in messages]
-        return ChatHistory(messages=chat_messages)
+        messages: list[AnyMessage] = state_snapshot.values.get("messages", [])
     except Exception as e:
         logger.error(f"An exception occurred: {e}")
         raise HTTPException(status_code=500, detail="Unexpected error")
+    page, has_more = _history_page(messages, input)
+    try:
+        chat_messages: list[ChatMessage] = [langchain_to_chat_message(m) for m in page]
+    except ValueError as e:
+        logger.error(f"An exception occurred: {e}")
+        raise HTTPException(status_code=500, detail="Unexpected error")
+    return ChatHistory(messages=chat_messages, has_more=has_more)
+
+
+@router.post("/export")
+async def export(filters: ExportInput, request: Request) -> StreamingResponse:
+    """
+    Export conversation threads from the checkpoint store as NDJSON, one
+    ExportedThread per line, streamed with constant memory.
+
+    Threads can be filtered by agent, by a list of thread IDs and by the time of
+    their last update. Threads are only attributed to an agent once they have been
+    updated by a run that recorded the agent ID.
+    """
+    return StreamingResponse(
+        export_threads(request.app.state.checkpointer, filters),
+        media_type="application/x-ndjson",
+    )
+
+
+def _websocket_authorized(websocket: WebSocket) -> bool:
+    scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer":
+        # Browsers can't set headers on WebSocket requests, so also accept ?token=
+        credentials = websocket.query_params.get("token")
+    try:
+        current_api_key.set(_authenticate(credentials))
+    except HTTPException:
+        return False
+    return True
+
+
+async def _start_websocket_run(
+    request: WebSocketStart, run_id: UUID
+) -> AsyncGenerator[bytes, None]:
+    agent_id = request.agent_id or DEFAULT_AGENT
+    try:
+        if api_key := current_api_key.get():
+            api_key.admit()
+        _check_agent(agent_id)
+        admission = await admission_controller.acquire(agent_id)
+    except HTTPException as e:
+        yield sse.encode_error(e.detail)
+        yield sse.DONE_FRAME
+        return
+    frames = message_generator(request.input, agent_id, run_id=run_id)
+    async for frame in release_after(frames, admission):
+        yield frame
+
+
+@app.websocket("/ws")
+async def websocket_runs(websocket: WebSocket) -> None:
+    """
+    Multiplex many streaming agent runs over one WebSocket connection.
+
+    Send `{"type": "start", "agent_id": ..., "run_id": ..., "input": {...}}` to start a
+    run, where `input` is a /stream request body, and `{"type": "cancel", "run_id": ...}`
+    to cancel one. Every event from the server is a /stream event tagged with `run_id`,
+    and each run ends with a `done` or `cancelled` event.
+    """
+    if not _websocket_authorized(websocket):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    multiplexer = RunMultiplexer(
+        websocket,
+        _start_websocket_run,
+        max_runs=settings.WS_MAX_RUNS_PER_CONNECTION,
+        on_cancelled=stream_registry.record_cancelled,
+    )
+    await multiplexer.serve()
+
+
+@router.get("/stats")
+async def stats() -> dict[str, Any]:
+    """
+    Load statistics: admission queue depth overall and per agent, the number of
+    buffered streaming runs and of runs cancelled before they finished, by reason, hit
+    rates of the response caches, with semantic cache lookup latency, and what
+    checkpoint compaction has deleted and how many bytes it has reclaimed, and the
+    state of the LangSmith feedback queue.
+    """
+    return {
+        "admission": admission_controller.stats(),
+        "streams": {"runs": len(stream_registry), "cancelled": dict(stream_registry.cancelled)},
+        "response_cache": response_cache.stats() if response_cache is not None else None,
+        "semantic_cache": semantic_cache.stats() if semantic_cache is not None else None,
+        "feedback": feedback_queue.stats(),
+        "checkpoint_retention": (
+            checkpoint_retention.stats() if checkpoint_retention is not None else None
+        ),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Prometheus metrics."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
 @app.get("/health")
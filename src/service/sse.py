@@ -0,0 +1,69 @@
+"""
+Encoding of the Server-Sent Events protocol used by the /stream endpoint.
+
+Frames are written straight to bytes around precomputed prefixes, so a token
+event costs a single JSON string encode and a message event a single JSON dict
+encode. orjson is used when it is installed, with the standard library json
+module as a fallback.
+"""
+
+import json
+from collections.abc import Callable
+from typing import Any
+
+from pydantic import BaseModel
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+
+try:
+    import orjson
+
+    def _orjson_dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default)
+
+    dumps: Callable[[Any], bytes] = _orjson_dumps
+    JSON_BACKEND = "orjson"
+except ImportError:  # pragma: no cover - orjson ships with langsmith
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_default)
+
+    def _json_dumps(obj: Any) -> bytes:
+        return _encoder.encode(obj).encode()
+
+    dumps = _json_dumps
+    JSON_BACKEND = "json"
+
+
+TOKEN_PREFIX = b'data: {"type":"token","content":'
+MESSAGE_PREFIX = b'data: {"type":"message","content":'
+ERROR_PREFIX = b'data: {"type":"error","content":'
+TIMING_PREFIX = b'data: {"type":"timing","content":'
+FRAME_SUFFIX = b"}\n\n"
+
+DONE_FRAME = b"data: [DONE]\n\n"
+UNEXPECTED_ERROR_FRAME = ERROR_PREFIX + dumps("Unexpected error") + FRAME_SUFFIX
+CANCELLED_FRAME = ERROR_PREFIX + dumps("Run cancelled") + FRAME_SUFFIX
+
+
+def encode_token(content: str) -> bytes:
+    """Encode a streamed token as an SSE frame."""
+    return TOKEN_PREFIX + dumps(content) + FRAME_SUFFIX
+
+
+def encode_message(message: dict[str, Any]) -> bytes:
+    """Encode a ChatMessage-shaped dict as an SSE frame."""
+    return MESSAGE_PREFIX + dumps(message) + FRAME_SUFFIX
+
+
+def encode_timing(timing: dict[str, Any]) -> bytes:
+    """Encode a TimingEvent-shaped dict as an SSE frame."""
+    return TIMING_PREFIX + dumps(timing) + FRAME_SUFFIX
+
+
+def encode_error(content: str) -> bytes:
+    """Encode an error as an SSE frame."""
+    return ERROR_PREFIX + dumps(content) + FRAME_SUFFIX
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from collections.abc import AsyncGenerator, Callable
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from service import sse
+
+logger = logging.getLogger(__name__)
+
+
+def parse_event_id(event_id: str) -> tuple[str, int]:
+    """Split an SSE event id of the form `<run_id>:<seq>`. Raises ValueError if malformed."""
+    run_id, sep, seq = event_id.strip().rpartition(":")
+    if not sep or not run_id:
+        raise ValueError(f"Malformed event id: {event_id}")
+    return run_id, int(seq)
+
+
+class RunStream:
+    """
+    Bounded ring buffer of the most recent SSE frames of one run.
+
+    A producer task publishes frames as the agent runs, and any number of subscribers
+    can replay the buffered frames after a given sequence number and then follow the
+    live run until it finishes. Each frame is tagged with an `id: <run_id>:<seq>` line
+    so clients can resume with the standard Last-Event-ID header.
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        max_events: int,
+        on_unsubscribed: Callable[["RunStream"], None] | None = None,
+    ) -> None:
+        self.run_id = run_id
+        self.task: asyncio.Task | None = None
+        self.done = False
+        self.finished_at: float | None = None
+        self.subscribers = 0
+        self._on_unsubscribed = on_unsubscribed
+        self._events: deque[tuple[int, bytes]] = deque(maxlen=max_events)
+        self._last_seq = 0
+        self._id_prefix = b"id: " + run_id.encode() + b":"
+        self._published = asyncio.Event()
+
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    def publish(self, frame: bytes) -> None:
+        """Append a frame and wake up all waiting subscribers."""
+        self._last_seq += 1
+        self._events.append((self._last_seq, frame))
+        self._notify()
+
+    def close(self) -> None:
+        """Mark the run as finished. Subscribers exit once they have caught up."""
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._notify()
+
+    def _notify(self) -> None:
+        published, self._published = self._published, asyncio.Event()
+        published.set()
+
+    def subscribe(self, after: int = 0) -> "Subscription":
+        """Subscribe to id-tagged frames with a sequence number greater than `after`."""
+        return Subscription(self, after)
+
+    async def _follow(self, after: int) -> AsyncGenerator[bytes, None]:
+        seq = after
+        while True:
+            while seq < self._last_seq:
+                first_seq = self._events[0][0]
+                if seq + 1 < first_seq:
+                    logger.warning(
+                        f"Run {self.run_id}: events {seq + 1}-{first_seq - 1} were evicted "
+                        "from the replay buffer"
+                    )
+                    seq = first_seq - 1
+                seq += 1
+                _, frame = self._events[seq - first_seq]
+                yield self._id_prefix + str(seq).encode() + b"\n" + frame
+            if self.done:
+                return
+            await self._published.wait()
+
+    def _unsubscribed(self) -> None:
+        self.subscribers -= 1
+        if self._on_unsubscribed is not None:
+            self._on_unsubscribed(self)
+
+
+class Subscription:
+    """
+    Async iterator over the frames of a RunStream.
+
+    The subscriber is counted as soon as the subscription is created, not when the first
+    frame is read, and uncounted exactly once when the frames run out, iteration fails,
+    or aclose() is called. A client that disconnects before the first frame therefore
+    still lets the RunStream know that it is gone.
+    """
+
+    def __init__(self, run_stream: RunStream, after: int = 0) -> None:
+        self.run_stream = run_stream
+        self._frames = run_stream._follow(after)
+        self._closed = False
+        run_stream.subscribers += 1
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self) -> bytes:
+        try:
+            return await anext(self._frames)
+        except BaseException:
+            # Any exception out of the generator, StopAsyncIteration included, finishes it.
+            self._unsubscribe()
+            raise
+
+    async def aclose(self) -> None:
+        try:
+            await self._frames.aclose()
+        finally:
+            self._unsubscribe()
+
+    def _unsubscribe(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self.run_stream._unsubscribed()
+
+
+class StreamRegistry:
+    """
+    In-process registry of RunStreams, keyed by run_id.
+
+    Finished runs are kept for `ttl` seconds so late reconnects can still replay the
+    tail of the stream, then evicted lazily on the next access.
+
+    A run started with start() is cancelled once it has had no subscribers for
+    `disconnect_grace` seconds, so nobody pays for a run that nobody is reading. The
+    grace period gives disconnected clients time to resume with Last-Event-ID.
+    """
+
+    def __init__(self, max_events: int, ttl: float, disconnect_grace: float = 0.0) -> None:
+        self.max_events = max_events
+        self.ttl = ttl
+        self.disconnect_grace = disconnect_grace
+        self.cancelled: Counter[str] = Counter()
+        self._runs: dict[str, RunStream] = {}
+        # Runs finish in time order, so expiry only ever needs to look at the head.
+        self._finished: deque[RunStream] = deque()
+
+    def __len__(self) -> int:
+        return len(self._runs)
+
+    def get(self, run_id: str) -> RunStream | None:
+        self.evict_expired()
+        return self._runs.get(run_id)
+
+    def evict_expired(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        while self._finished and self._finished[0].finished_at <= cutoff:
+            run_stream = self._finished.popleft()
+            if self._runs.get(run_stream.run_id) is run_stream:
+                del self._runs[run_stream.run_id]
+
+    def open(self, run_id: str) -> RunStream:
+        """Return the unfinished RunStream for `run_id`, creating it if there is none."""
+        self.evict_expired()
+        run_stream = self._runs.get(run_id)
+        if run_stream is None or run_stream.done:
+            run_stream = RunStream(run_id, self.max_events, self._on_unsubscribed)
+            self._runs[run_id] = run_stream
+        return run_stream
+
+    def record_cancelled(self, run_id: str, reason: str) -> None:
+        """Count a run cancelled before it finished, e.g. because its client went away."""
+        self.cancelled[reason] += 1
+        logger.info(f"Run {run_id} cancelled: {reason}")
+
+    def _on_unsubscribed(self, run_stream: RunStream) -> None:
+        if run_stream.subscribers or run_stream.done or run_stream.task is None:
+            return
+        asyncio.get_running_loop().call_later(
+            self.disconnect_grace, self._cancel_if_unsubscribed, run_stream
+        )
+
+    def _cancel_if_unsubscribed(self, run_stream: RunStream) -> None:
+        if run_stream.subscribers or run_stream.done or run_stream.task.done():
+            return
+        run_stream.task.cancel()
+        self.record_cancelled(run_stream.run_id, "client_disconnected")
+
+    def start(self, run_id: str, frames: AsyncGenerator[bytes, None]) -> RunStream:
+        """Create a RunStream and publish `frames` to it from a background task."""
+        run_stream = self.open(run_id)
+        run_stream.task = asyncio.create_task(self.pump(run_stream, frames))
+        return run_stream
+
+    async def pump(self, run_stream: RunStream, frames: AsyncGenerator[bytes, None]) -> bool:
+        """
+        Publish `frames` to `run_stream` and close it. Returns False if the producer failed,
+        in which case an error event is published in its place.
+        """
+        try:
+            async for frame in frames:
+                run_stream.publish(frame)
+            return True
+        except asyncio.CancelledError:
+            run_stream.publish(sse.CANCELLED_FRAME)
+            run_stream.publish(sse.DONE_FRAME)
+            raise
+        except Exception:
+            logger.exception(f"Run {run_stream.run_id} failed while streaming")
+            run_stream.publish(sse.UNEXPECTED_ERROR_FRAME)
+            run_stream.publish(sse.DONE_FRAME)
+            return False
+        finally:
+            run_stream.close()
+            self._finished.append(run_stream)
+
+
+class SubscriberResponse(StreamingResponse):
+    """
+    SSE response for a RunStream subscription.
+
+    Starlette stops iterating the body when the client disconnects but leaves the
+    subscription open. Closing it here lets the RunStream know right away that the
+    subscriber is gone.
+    """
+
+    def __init__(self, subscription: Subscription, **kwargs) -> None:
+        super().__init__(subscription, media_type="text/event-stream", **kwargs)
+        self._subscription = subscription
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self._subscription.aclose()
@@ -0,0 +1,98 @@
+"""
+Per-step timings of a streamed run, sent as `timing` events when the request sets
+`debug_timings`.
+
+RunTimer is a callback handler on the graph run, so it works with every stream engine.
+Times are in milliseconds since the request was received, which makes the admission
+queue wait visible as the start of the graph run.
+"""
+
+import time
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from schema import TimingKind
+
+
+class RunTimer(BaseCallbackHandler):
+    """Collects timings of the nodes, tools and model calls of a graph run."""
+
+    run_inline = True
+
+    def __init__(self, received_at: float | None = None) -> None:
+        self.received_at = time.perf_counter() if received_at is None else received_at
+        self._started: dict[UUID, tuple[TimingKind, str | None, float]] = {}
+        self._events: list[dict[str, Any]] = []
+        self._first_token = False
+
+    def _ms(self, t: float) -> float:
+        return round((t - self.received_at) * 1000, 1)
+
+    def _add(self, kind: TimingKind, name: str | None, start: float, end: float) -> None:
+        self._events.append(
+            {
+                "kind": kind,
+                "name": name,
+                "start_ms": self._ms(start),
+                "duration_ms": round((end - start) * 1000, 1),
+            }
+        )
+
+    def _start(self, run_id: UUID, kind: TimingKind, name: str | None) -> None:
+        self._started[run_id] = (kind, name, time.perf_counter())
+
+    def _end(self, _: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        if started := self._started.pop(run_id, None):
+            kind, name, start = started
+            self._add(kind, name, start, time.perf_counter())
+
+    def drain(self) -> list[dict[str, Any]]:
+        """The timings recorded since the last call."""
+        events, self._events = self._events, []
+        return events
+
+    def first_token(self) -> None:
+        if not self._first_token:
+            self._first_token = True
+            self._add("ttft", None, self.received_at, time.perf_counter())
+
+    def finish(self) -> None:
+        self._add("run", None, self.received_at, time.perf_counter())
+
+    def on_chain_start(
+        self,
+        serialized: dict[str, Any],
+        inputs: dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name")
+        if parent_run_id is None:
+            # Time spent waiting for admission and for the run to be scheduled.
+            self._add("queue", None, self.received_at, time.perf_counter())
+        elif name == (metadata or {}).get("langgraph_node") and not name.startswith("__"):
+            self._start(run_id, "node", name)
+
+    def on_tool_start(
+        self, serialized: dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._start(run_id, "tool", kwargs.get("name") or (serialized or {}).get("name"))
+
+    def on_chat_model_start(
+        self, serialized: dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._start(run_id, "model", (kwargs.get("metadata") or {}).get("ls_model_name"))
+
+    def on_llm_start(
+        self, serialized: dict[str, Any], prompts: list[str], *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._start(run_id, "model", (kwargs.get("metadata") or {}).get("ls_model_name"))
+
+    on_chain_end = on_chain_error = _end
+    on_tool_end = on_tool_error = _end
+    on_llm_end = on_llm_error = _end
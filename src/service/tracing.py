@@ -0,0 +1,42 @@
+from opentelemetry import propagate
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.tracing import tracer, tracing_enabled
+
+
+class TracingMiddleware:
+    """
+    Records a span for each HTTP request, continuing the trace of its `traceparent`
+    header. Implemented as plain ASGI, so the span of a streaming response covers the
+    whole stream.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not tracing_enabled():
+            await self.app(scope, receive, send)
+            return
+        carrier = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        parent = propagate.extract(carrier)
+        method = scope["method"]
+        with tracer.start_as_current_span(
+            f"{method} {scope['path']}",
+            context=parent,
+            kind=SpanKind.SERVER,
+            attributes={"http.request.method": method, "url.path": scope["path"]},
+        ) as span:
+
+            async def send_with_status(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+                await send(message)
+
+            await self.app(scope, receive, send_with_status)
+            if route := scope.get("route"):
+                span.update_name(f"{method} {route.path}")
+                span.set_attribute("http.route", route.path)
@@ -1,3 +1,6 @@
+import time
+from typing import Any
+
 from langchain_core.messages import (
     AIMessage,
     BaseMessage,
@@ -31,12 +34,14 @@ def langchain_to_chat_message(message: BaseMessage) -> ChatMessage:
             human_message = ChatMessage(
                 type="human",
                 content=convert_message_content_to_string(message.content),
+                id=message.id,
             )
             return human_message
         case AIMessage():
             ai_message = ChatMessage(
                 type="ai",
                 content=convert_message_content_to_string(message.content),
+                id=message.id,
             )
             if message.tool_calls:
                 ai_message.tool_calls = message.tool_calls
@@ -48,6 +53,7 @@ def langchain_to_chat_message(message: BaseMessage) -> ChatMessage:
                 type="tool",
                 content=convert_message_content_to_string(message.content),
                 tool_call_id=message.tool_call_id,
+                id=message.id,
             )
             return tool_message
         case LangchainChatMessage():
@@ -56,6 +62,7 @@ def langchain_to_chat_message(message: BaseMessage) -> ChatMessage:
                     type="custom",
                     content="",
                     custom_data=message.content[0],
+                    id=message.id,
                 )
                 return custom_message
             else:
@@ -64,6 +71,63 @@ def langchain_to_chat_message(message: BaseMessage) -> ChatMessage:
             raise ValueError(f"Unsupported message type: {message.__class__.__name__}")
 
 
+def langchain_to_chat_dict(message: BaseMessage) -> dict[str, Any]:
+    """
+    Create a dict shaped like ChatMessage.model_dump() from a LangChain message.
+
+    This is the fast path used when streaming, which skips building and dumping a
+    pydantic model for every event. It must stay in sync with langchain_to_chat_message.
+    """
+    match message:
+        case HumanMessage():
+            return _chat_dict(
+                "human", convert_message_content_to_string(message.content), id=message.id
+            )
+        case AIMessage():
+            return _chat_dict(
+                "ai",
+                convert_message_content_to_string(message.content),
+                tool_calls=message.tool_calls or [],
+                response_metadata=message.response_metadata or {},
+                id=message.id,
+            )
+        case ToolMessage():
+            return _chat_dict(
+                "tool",
+                convert_message_content_to_string(message.content),
+                tool_call_id=message.tool_call_id,
+                id=message.id,
+            )
+        case LangchainChatMessage():
+            if message.role == "custom":
+                return _chat_dict("custom", "", custom_data=message.content[0], id=message.id)
+            else:
+                raise ValueError(f"Unsupported chat message role: {message.role}")
+        case _:
+            raise ValueError(f"Unsupported message type: {message.__class__.__name__}")
+
+
+def _chat_dict(
+    type: str,
+    content: str,
+    tool_calls: list | None = None,
+    tool_call_id: str | None = None,
+    response_metadata: dict[str, Any] | None = None,
+    custom_data: dict[str, Any] | None = None,
+    id: str | None = None,
+) -> dict[str, Any]:
+    return {
+        "type": type,
+        "content": content,
+        "tool_calls": tool_calls if tool_calls is not None else [],
+        "tool_call_id": tool_call_id,
+        "run_id": None,
+        "response_metadata": response_metadata if response_metadata is not None else {},
+        "custom_data": custom_data if custom_data is not None else {},
+        "id": id,
+    }
+
+
 def remove_tool_calls(content: str | list[str | dict]) -> str | list[str | dict]:
     """Remove tool calls from content."""
     if isinstance(content, str):
@@ -74,3 +138,57 @@ def remove_tool_calls(content: str | list[str | dict]) -> str | list[str | dict]
         for content_item in content
         if isinstance(content_item, str) or content_item["type"] != "tool_use"
     ]
+
+
+class TokenCoalescer:
+    """
+    Buffer streamed tokens so they can be sent as fewer, larger token events.
+
+    A window is flushed once `flush_ms` milliseconds have passed since its first token
+    or once it holds `flush_bytes` bytes of UTF-8 text, whichever comes first. The caller
+    is responsible for calling flush() before sending any other event so ordering is
+    preserved, and at the end of the stream so no tokens are left behind.
+    """
+
+    def __init__(self, flush_ms: int | None = None, flush_bytes: int | None = None) -> None:
+        self.flush_interval = flush_ms / 1000 if flush_ms is not None else None
+        self.flush_bytes = flush_bytes
+        self._parts: list[str] = []
+        self._size = 0
+        self._window_start = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.flush_interval is not None or self.flush_bytes is not None
+
+    def add(self, token: str) -> str | None:
+        """Buffer a token. Returns the coalesced content if the window is now full."""
+        if not self.enabled:
+            return token
+        if not self._parts:
+            self._window_start = time.monotonic()
+        self._parts.append(token)
+        if self.flush_bytes is not None:
+            self._size += len(token.encode())
+            if self._size >= self.flush_bytes:
+                return self.flush()
+        if self.due():
+            return self.flush()
+        return None
+
+    def due(self) -> bool:
+        """Whether the buffered tokens have been held for longer than the flush interval."""
+        return (
+            bool(self._parts)
+            and self.flush_interval is not None
+            and time.monotonic() - self._window_start >= self.flush_interval
+        )
+
+    def flush(self) -> str | None:
+        """Return all buffered tokens as a single string and start a new window."""
+        if not self._parts:
+            return None
+        content = "".join(self._parts)
+        self._parts.clear()
+        self._size = 0
+        return content
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from collections.abc import AsyncGenerator, Callable
+from contextlib import suppress
+from uuid import UUID, uuid4
+
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import TypeAdapter, ValidationError
+
+from schema import WebSocketCancel, WebSocketRequest, WebSocketStart
+from service import sse
+
+logger = logging.getLogger(__name__)
+
+StartRun = Callable[[WebSocketStart, UUID], AsyncGenerator[bytes, None]]
+OnCancelled = Callable[[str, str], None]
+
+_request_adapter: TypeAdapter[WebSocketRequest] = TypeAdapter(WebSocketRequest)
+_DATA_PREFIX_LEN = len(b"data: ")
+_DATA_SUFFIX_LEN = len(b"\n\n")
+
+
+def _run_prefix(run_id: str) -> bytes:
+    return b'{"run_id":' + sse.dumps(run_id) + b","
+
+
+def sse_to_ws(frame: bytes, run_prefix: bytes) -> str:
+    """
+    Re-frame an SSE frame from message_generator as a WebSocket JSON payload.
+
+    The JSON body of the SSE frame is spliced after a precomputed `{"run_id":...,`
+    prefix, so the event does not need to be decoded and encoded again.
+    """
+    body = frame[_DATA_PREFIX_LEN:-_DATA_SUFFIX_LEN]
+    if body == b"[DONE]":
+        return (run_prefix + b'"type":"done"}').decode()
+    return (run_prefix + body[1:]).decode()
+
+
+class RunMultiplexer:
+    """
+    Serve many concurrent agent runs over a single WebSocket connection.
+
+    The client sends `start` and `cancel` requests (see schema.WebSocketRequest). Every
+    event the server sends is the same JSON payload as on the /stream endpoint, tagged
+    with the `run_id` it belongs to. A run ends with a `done` event, or with `cancelled`
+    if the client cancelled it. All runs are cancelled when the connection closes.
+    `on_cancelled(run_id, reason)` is called for every cancelled run.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        start_run: StartRun,
+        max_runs: int,
+        on_cancelled: OnCancelled | None = None,
+    ) -> None:
+        self.websocket = websocket
+        self.start_run = start_run
+        self.max_runs = max_runs
+        self.on_cancelled = on_cancelled
+        self._runs: dict[str, asyncio.Task] = {}
+        # Bounded so a slow reader applies backpressure to the runs instead of buffering.
+        self._outbox: asyncio.Queue[str] = asyncio.Queue(maxsize=1000)
+
+    async def serve(self) -> None:
+        sender = asyncio.create_task(self._send_loop())
+        try:
+            while True:
+                try:
+                    raw = await self.websocket.receive_text()
+                except WebSocketDisconnect:
+                    break
+                await self._handle(raw)
+        finally:
+            for run_id, task in self._runs.items():
+                task.cancel()
+                self._record_cancelled(run_id, "client_disconnected")
+            await asyncio.gather(*self._runs.values(), return_exceptions=True)
+            sender.cancel()
+            with suppress(asyncio.CancelledError):
+                await sender
+
+    def _record_cancelled(self, run_id: str, reason: str) -> None:
+        if self.on_cancelled is not None:
+            self.on_cancelled(run_id, reason)
+
+    async def _send_loop(self) -> None:
+        while True:
+            payload = await self._outbox.get()
+            try:
+                await self.websocket.send_text(payload)
+            except (WebSocketDisconnect, RuntimeError):
+                return
+
+    async def _send_error(self, content: str, run_id: str | None = None) -> None:
+        event = {"type": "error", "content": content}
+        if run_id:
+            event = {"run_id": run_id, **event}
+        await self._outbox.put(sse.dumps(event).decode())
+
+    async def _handle(self, raw: str) -> None:
+        try:
+            request = _request_adapter.validate_json(raw)
+        except ValidationError as e:
+            await self._send_error(f"Invalid request: {e.errors(include_url=False)}")
+            return
+
+        match request:
+            case WebSocketStart():
+                await self._start(request)
+            case WebSocketCancel():
+                await self._cancel(request.run_id)
+
+    async def _start(self, request: WebSocketStart) -> None:
+        try:
+            run_uuid = UUID(request.run_id) if request.run_id else uuid4()
+        except ValueError:
+            await self._send_error("run_id must be a UUID", request.run_id)
+            return
+        run_id = str(run_uuid)
+        if run_id in self._runs:
+            await self._send_error("Run already exists", run_id)
+            return
+        if len(self._runs) >= self.max_runs:
+            await self._send_error(f"Too many concurrent runs (max {self.max_runs})", run_id)
+            return
+        frames = self.start_run(request, run_uuid)
+        self._runs[run_id] = asyncio.create_task(self._run(run_id, frames))
+
+    async def _cancel(self, run_id: str) -> None:
+        task = self._runs.get(run_id)
+        if task is None:
+            await self._send_error("Unknown run", run_id)
+            return
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+        self._record_cancelled(run_id, "client_cancelled")
+        await self._outbox.put((_run_prefix(run_id) + b'"type":"cancelled"}').decode())
+
+    async def _run(self, run_id: str, frames: AsyncGenerator[bytes, None]) -> None:
+        run_prefix = _run_prefix(run_id)
+        try:
+            await self._outbox.put((run_prefix + b'"type":"started"}').decode())
+            async for frame in frames:
+                await self._outbox.put(sse_to_ws(frame, run_prefix))
+        except Exception:
+            logger.exception(f"Run {run_id} failed on websocket")
+            await self._outbox.put(sse_to_ws(sse.UNEXPECTED_ERROR_FRAME, run_prefix))
+            await self._outbox.put(sse_to_ws(sse.DONE_FRAME, run_prefix))
+        finally:
+            self._runs.pop(run_id, None)
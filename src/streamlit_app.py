@@ -8,7 +8,7 @@ from pydantic import ValidationError
 from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 from client import AgentClient, AgentClientError
-from schema import ChatHistory, ChatMessage
+from schema import ChatHistory, ChatMessage, TimingEvent
 from schema.task_data import TaskData, TaskDataStatus
 
 # A Streamlit app for interacting with the langgraph agent via a simple chat interface.
@@ -93,6 +93,11 @@ async def main() -> None:
                 index=agent_idx,
             )
             use_streaming = st.toggle("Stream results", value=True)
+            show_timings = st.toggle(
+                "Show latency breakdown",
+                value=False,
+                help="Time spent in each step of streamed responses",
+            )
 
         @st.dialog("Architecture")
         def architecture_dialog() -> None:
@@ -147,6 +152,7 @@ async def main() -> None:
                     message=user_input,
                     model=model,
                     thread_id=st.session_state.thread_id,
+                    debug_timings=show_timings,
                 )
                 await draw_messages(stream, is_new=True)
             else:
@@ -168,8 +174,41 @@ async def main() -> None:
             await handle_feedback()
 
 
+async def collect_timings(
+    messages_agen: AsyncGenerator[ChatMessage | TimingEvent | str, None],
+    timings: list[TimingEvent],
+) -> AsyncGenerator[ChatMessage | str, None]:
+    """Pass on messages and tokens, appending timing events to `timings`."""
+    async for msg in messages_agen:
+        if isinstance(msg, TimingEvent):
+            timings.append(msg)
+        else:
+            yield msg
+
+
+def draw_timings(timings: list[TimingEvent]) -> None:
+    """Draws the latency breakdown of a streamed response."""
+    total = next((t.duration_ms for t in timings if t.kind == "run"), None)
+    label = "Latency breakdown" if total is None else f"Latency breakdown ({total / 1000:.2f}s)"
+    with st.expander(label):
+        st.dataframe(
+            [
+                {
+                    "step": t.kind,
+                    "name": t.name or "",
+                    "start (ms)": t.start_ms,
+                    "duration (ms)": t.duration_ms,
+                }
+                for t in timings
+                if t.kind != "run"
+            ],
+            hide_index=True,
+            use_container_width=True,
+        )
+
+
 async def draw_messages(
-    messages_agen: AsyncGenerator[ChatMessage | str, None],
+    messages_agen: AsyncGenerator[ChatMessage | TimingEvent | str, None],
     is_new: bool = False,
 ) -> None:
     """
@@ -194,6 +233,13 @@ async def draw_messages(
     last_message_type = None
     st.session_state.last_message = None
 
+    # Timings of a streamed response are kept by run_id, to draw them again on reruns.
+    if "timings" not in st.session_state:
+        st.session_state.timings = {}
+    timings: list[TimingEvent] = []
+    messages_agen = collect_timings(messages_agen, timings)
+    last_run_id = None
+
     # Placeholder for intermediate streaming tokens
     streaming_content = ""
     streaming_placeholder = None
@@ -247,6 +293,10 @@ async def draw_messages(
                         else:
                             st.write(msg.content)
 
+                    last_run_id = msg.run_id
+                    if not is_new and not msg.tool_calls and msg.run_id in st.session_state.timings:
+                        draw_timings(st.session_state.timings[msg.run_id])
+
                     if msg.tool_calls:
                         # Create a status container for each tool call and store the
                         # status container by ID to ensure results are mapped to the
@@ -309,6 +359,11 @@ async def draw_messages(
                 st.write(msg)
                 st.stop()
 
+    if timings and last_run_id is not None:
+        st.session_state.timings[last_run_id] = timings
+        with st.session_state.last_message:
+            draw_timings(timings)
+
 
 async def handle_feedback() -> None:
     """Draws a feedback widget and records feedback from the user."""
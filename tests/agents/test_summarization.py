@@ -0,0 +1,141 @@
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+from langchain_anthropic import ChatAnthropic
+from langchain_aws.chat_models.bedrock import ChatPromptAdapter
+from langchain_community.chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_groq.chat_models import _convert_message_to_dict as groq_message
+from langchain_openai import ChatOpenAI
+
+from agents.counselor_agent import counselor_agent, wrap_model
+from agents.summarization import RollingSummary
+from schema.models import FakeModelName
+
+
+def _turns(count: int) -> list:
+    return [
+        HumanMessage(content=f"message {i}", id=str(i))
+        if i % 2 == 0
+        else AIMessage(content=f"reply {i}", id=str(i))
+        for i in range(count)
+    ]
+
+
+def _policy(max_tokens: int = 4, keep_last: int = 2) -> RollingSummary:
+    # One "token" per message keeps the thresholds easy to follow.
+    return RollingSummary(max_tokens=max_tokens, keep_last=keep_last, token_counter=len)
+
+
+@pytest.mark.asyncio
+async def test_summary_below_threshold() -> None:
+    model = FakeListChatModel(responses=["summary"])
+    messages = _turns(4)
+    assert await _policy().aupdate(messages, None, model) is None
+    system = SystemMessage(content="prompt", id="system")
+    assert _policy().context(system, messages, None) == [system, *messages]
+
+
+@pytest.mark.asyncio
+async def test_summary_is_rolled_forward() -> None:
+    model = FakeListChatModel(responses=["first summary", "second summary"])
+    policy = _policy()
+    messages = _turns(6)
+
+    summary = await policy.aupdate(messages, None, model)
+    assert summary == {"content": "first summary", "last_message_id": "3"}
+    system = SystemMessage(content="prompt", id="system")
+    context = policy.context(system, messages, summary)
+    # The summary is part of the only system message.
+    assert isinstance(context[0], SystemMessage)
+    assert context[0].content.startswith("prompt\n\n")
+    assert "first summary" in context[0].content
+    assert context[0].id == "system-summary-3"
+    assert context[1:] == messages[4:]
+
+    # Below the threshold again: the summary is kept as is.
+    messages = _turns(8)
+    assert await policy.aupdate(messages, summary, model) is None
+
+    # Only the messages after the previous summary are folded in.
+    messages = _turns(9)
+    summary = await policy.aupdate(messages, summary, model)
+    assert summary == {"content": "second summary", "last_message_id": "6"}
+    assert policy.context(system, messages, summary)[1:] == messages[7:]
+
+
+@pytest.mark.asyncio
+async def test_summary_keeps_tool_results_with_their_call() -> None:
+    model = FakeListChatModel(responses=["summary"])
+    messages = [
+        *_turns(4),
+        AIMessage(content="", id="call", tool_calls=[{"name": "t", "args": {}, "id": "1"}]),
+        ToolMessage(content="result", tool_call_id="1", id="result"),
+        AIMessage(content="done", id="done"),
+    ]
+    summary = await _policy().aupdate(messages, None, model)
+    assert summary["last_message_id"] == "3"
+
+
+@pytest.mark.asyncio
+async def test_summary_disabled() -> None:
+    model = FakeListChatModel(responses=["summary"])
+    assert await _policy(max_tokens=None).aupdate(_turns(20), None, model) is None
+
+
+@pytest.mark.asyncio
+async def test_counselor_summarizes_long_threads() -> None:
+    config = {"configurable": {"thread_id": str(uuid4()), "model": FakeModelName.FAKE}}
+    with (
+        patch("agents.counselor_agent.memory_policy.max_tokens", 1),
+        patch("agents.counselor_agent.memory_policy.keep_last", 2),
+    ):
+        for turn in range(3):
+            await counselor_agent.ainvoke(
+                {"messages": [HumanMessage(content=f"turn {turn}")]}, config
+            )
+    state = await counselor_agent.aget_state(config)
+    messages = state.values["messages"]
+    # Every message is kept in the thread; the summary covers all but the latest turns.
+    assert len(messages) == 6
+    assert state.values["summary"]["last_message_id"] == messages[2].id
+
+
+@pytest.mark.parametrize("provider", ["openai", "anthropic", "google", "groq", "bedrock"])
+@pytest.mark.parametrize("prompt_caching", [False, True])
+def test_summary_context_is_accepted_by_providers(provider, prompt_caching) -> None:
+    """The model input of an agent with a summary can be formatted for every provider."""
+    messages = _turns(4)
+    state = {
+        "messages": messages,
+        "summary": {"content": "the user is planning a trip", "last_message_id": "1"},
+    }
+    models = {
+        "openai": lambda: ChatOpenAI(model="gpt-4o-mini", api_key="x"),
+        "anthropic": lambda: ChatAnthropic(model="claude-3-5-haiku-latest", api_key="x"),
+        "google": lambda: ChatGoogleGenerativeAI(model="gemini-1.5-flash", google_api_key="x"),
+        # Groq and Bedrock models are formatted without a client.
+        "groq": lambda: FakeListChatModel(responses=[""]),
+        "bedrock": lambda: FakeListChatModel(responses=[""]),
+    }
+    model = models[provider]()
+    with patch("core.llm.settings.PROMPT_CACHING", prompt_caching):
+        context = wrap_model(model).first.invoke(state)
+    assert [m.type for m in context] == ["system", "human", "ai"]
+    assert context[1:] == messages[2:]
+
+    match provider:
+        case "openai" | "anthropic":
+            payload = model._get_request_payload(context)
+            assert "the user is planning a trip" in str(payload)
+        case "google":
+            request = model._prepare_request(context)
+            assert "the user is planning a trip" in str(request.system_instruction)
+        case "groq":
+            assert [groq_message(m)["role"] for m in context] == ["system", "user", "assistant"]
+        case "bedrock":
+            system, formatted = ChatPromptAdapter.format_messages("anthropic", context)
+            assert "the user is planning a trip" in system
+            assert [m["role"] for m in formatted] == ["user", "assistant"]
@@ -1,12 +1,24 @@
+import asyncio
 import json
 import os
 from unittest.mock import AsyncMock, Mock, patch
 
+import httpx
 import pytest
 from httpx import Request, Response
-
-from client import AgentClient, AgentClientError
-from schema import AgentInfo, ChatHistory, ChatMessage, ServiceMetadata
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from client import AgentClient, AgentClientError, AgentSession
+from core.tracing import create_tracer_provider
+from schema import (
+    AgentInfo,
+    ChatHistory,
+    ChatMessage,
+    Feedback,
+    ServiceMetadata,
+    TimingEvent,
+    UserInput,
+)
 from schema.models import OpenAIModelName
 
 
@@ -41,6 +53,19 @@ def test_headers(mock_env):
         assert client._headers == {"Authorization": "Bearer test-secret"}
 
 
+def test_headers_propagate_trace(mock_env):
+    """Test that the caller's trace context is sent to the service."""
+    tracer = create_tracer_provider(InMemorySpanExporter()).get_tracer("test")
+    client = AgentClient(get_info=False)
+    with tracer.start_as_current_span("caller") as span:
+        context = span.get_span_context()
+        headers = client._headers
+        # The client-only install has no opentelemetry; headers are sent without a trace.
+        with patch("client.client.propagate", None):
+            assert client._headers == {}
+    assert headers["traceparent"].startswith(f"00-{context.trace_id:032x}-{context.span_id:016x}-")
+
+
 def test_invoke(agent_client):
     """Test synchronous invocation."""
     QUESTION = "What is the weather?"
@@ -81,6 +106,55 @@ def test_invoke(agent_client):
         assert "500 Internal Server Error" in str(exc.value)
 
 
+def test_batch_invoke(agent_client):
+    """Test synchronous batch invocation."""
+    mock_request = Request("POST", "http://test/invoke/batch")
+    mock_response = Response(
+        200,
+        json={
+            "results": [
+                {"index": 0, "output": {"type": "ai", "content": "sunny"}},
+                {"index": 1, "error": "Unexpected error"},
+            ]
+        },
+        request=mock_request,
+    )
+    with patch("httpx.post", return_value=mock_response) as mock_post:
+        results = agent_client.batch_invoke(
+            ["weather?", UserInput(message="again?", thread_id="t1")],
+            model="gpt-4o",
+            max_concurrency=2,
+        )
+        assert results[0].output.content == "sunny"
+        assert results[1].error == "Unexpected error"
+        args, kwargs = mock_post.call_args
+        assert args[0].endswith("/invoke/batch")
+        assert kwargs["json"]["max_concurrency"] == 2
+        assert kwargs["json"]["inputs"][0]["model"] == "gpt-4o"
+        assert kwargs["json"]["inputs"][1]["thread_id"] == "t1"
+
+    # Test error on invalid response
+    with (
+        patch("httpx.post", return_value=Response(500, request=mock_request)),
+        pytest.raises(AgentClientError),
+    ):
+        agent_client.batch_invoke(["weather?"])
+
+
+@pytest.mark.asyncio
+async def test_abatch_invoke(agent_client):
+    """Test asynchronous batch invocation."""
+    mock_request = Request("POST", "http://test/invoke/batch")
+    mock_response = Response(
+        200,
+        json={"results": [{"index": 0, "output": {"type": "ai", "content": "sunny"}}]},
+        request=mock_request,
+    )
+    with patch("httpx.AsyncClient.post", return_value=mock_response):
+        results = await agent_client.abatch_invoke(["weather?"])
+        assert results[0].output.content == "sunny"
+
+
 @pytest.mark.asyncio
 async def test_ainvoke(agent_client):
     """Test asynchronous invocation."""
@@ -171,6 +245,26 @@ def test_stream(agent_client):
         assert "500 Internal Server Error" in str(exc.value)
 
 
+def test_stream_debug_timings(agent_client):
+    """Test that timing events are requested and yielded as TimingEvent objects."""
+    timing = {"kind": "node", "name": "model", "start_ms": 2.0, "duration_ms": 150.5}
+    events = [
+        f"data: {json.dumps({'type': 'message', 'content': {'type': 'ai', 'content': 'Hi'}})}",
+        f"data: {json.dumps({'type': 'timing', 'content': timing})}",
+        "data: [DONE]",
+    ]
+    mock_response = Mock()
+    mock_response.iter_lines.return_value = events
+    mock_response.__enter__ = Mock(return_value=mock_response)
+    mock_response.__exit__ = Mock(return_value=None)
+
+    with patch("httpx.stream", return_value=mock_response) as mock_stream:
+        responses = list(agent_client.stream("Hello", debug_timings=True))
+
+    assert mock_stream.call_args.kwargs["json"]["debug_timings"] is True
+    assert responses[1] == TimingEvent(**timing)
+
+
 @pytest.mark.asyncio
 async def test_astream(agent_client):
     """Test asynchronous streaming."""
@@ -236,6 +330,143 @@ async def test_astream(agent_client):
         assert "500 Internal Server Error" in str(exc.value)
 
 
+@pytest.mark.asyncio
+async def test_astream_resume(agent_client):
+    """Test that astream reconnects with Last-Event-ID when the connection drops."""
+    RUN_ID = "847c6285-8fc9-4560-a83f-4e6285809254"
+    TOKENS = ["The", " weather", " is", " sunny", "."]
+
+    def token_event(i: int) -> list[str]:
+        return [
+            f"id: {RUN_ID}:{i + 1}",
+            f"data: {json.dumps({'type': 'token', 'content': TOKENS[i]})}",
+            "",
+        ]
+
+    async def dropped_events():
+        for i in range(2):
+            for line in token_event(i):
+                yield line
+        raise httpx.ReadError("Connection reset by peer")
+
+    async def resumed_events():
+        for i in range(2, len(TOKENS)):
+            for line in token_event(i):
+                yield line
+        yield f"id: {RUN_ID}:{len(TOKENS) + 1}"
+        yield "data: [DONE]"
+
+    def mock_stream_response(lines):
+        mock_response = AsyncMock()
+        mock_response.raise_for_status = Mock()
+        mock_response.aiter_lines = Mock(return_value=lines)
+        mock_response.__aenter__ = AsyncMock(return_value=mock_response)
+        return mock_response
+
+    mock_client = AsyncMock()
+    mock_client.__aenter__.return_value = mock_client
+    mock_client.stream = Mock(
+        side_effect=[
+            mock_stream_response(dropped_events()),
+            mock_stream_response(resumed_events()),
+        ]
+    )
+
+    with (
+        patch("httpx.AsyncClient", return_value=mock_client),
+        patch("client.client.asyncio.sleep", AsyncMock()),
+    ):
+        responses = [response async for response in agent_client.astream("Weather?")]
+
+    assert responses == TOKENS
+    assert mock_client.stream.call_count == 2
+    args, kwargs = mock_client.stream.call_args
+    assert args == ("GET", f"http://test/runs/{RUN_ID}/stream")
+    assert kwargs["headers"]["Last-Event-ID"] == f"{RUN_ID}:2"
+
+    # Give up once the reconnect budget is spent
+    agent_client.max_stream_reconnects = 0
+    mock_client.stream = Mock(return_value=mock_stream_response(dropped_events()))
+    with patch("httpx.AsyncClient", return_value=mock_client):
+        with pytest.raises(AgentClientError) as exc:
+            async for _ in agent_client.astream("Weather?"):
+                pass
+        assert "Connection reset by peer" in str(exc.value)
+
+
+class FakeWebSocket:
+    """Minimal stand-in for a websockets client connection."""
+
+    def __init__(self):
+        self.sent: list[dict] = []
+        self.incoming: asyncio.Queue[str | None] = asyncio.Queue()
+
+    async def send(self, data: str) -> None:
+        self.sent.append(json.loads(data))
+
+    def push(self, event: dict) -> None:
+        self.incoming.put_nowait(json.dumps(event))
+
+    async def close(self) -> None:
+        self.incoming.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        raw = await self.incoming.get()
+        if raw is None:
+            raise StopAsyncIteration
+        return raw
+
+
+@pytest.mark.asyncio
+async def test_agent_session():
+    """Test that a session routes interleaved events to the right run."""
+    websocket = FakeWebSocket()
+    session = AgentSession(websocket, default_agent="test-agent")
+
+    run_a = await session.start("Hello", model="gpt-4o")
+    run_b = await session.start("Bye", agent="other-agent", stream_tokens=False)
+    assert websocket.sent[0]["type"] == "start"
+    assert websocket.sent[0]["run_id"] == run_a
+    assert websocket.sent[0]["agent_id"] == "test-agent"
+    assert websocket.sent[0]["input"]["model"] == "gpt-4o"
+    assert websocket.sent[1]["agent_id"] == "other-agent"
+    assert websocket.sent[1]["input"]["stream_tokens"] is False
+
+    for event in [
+        {"run_id": run_a, "type": "started"},
+        {"run_id": run_b, "type": "started"},
+        {"run_id": run_a, "type": "token", "content": "Hi"},
+        {"run_id": run_b, "type": "message", "content": {"type": "ai", "content": "Goodbye"}},
+        {"run_id": run_b, "type": "done"},
+        {"run_id": run_a, "type": "message", "content": {"type": "ai", "content": "Hi"}},
+        {"run_id": run_a, "type": "done"},
+    ]:
+        websocket.push(event)
+
+    events_b = [event async for event in session.events(run_b)]
+    events_a = [event async for event in session.events(run_a)]
+    assert events_a == ["Hi", ChatMessage(type="ai", content="Hi")]
+    assert events_b == [ChatMessage(type="ai", content="Goodbye")]
+
+    run_c = await session.start("Long task")
+    await session.cancel(run_c)
+    assert websocket.sent[-1] == {"type": "cancel", "run_id": run_c}
+    websocket.push({"run_id": run_c, "type": "error", "content": "Unexpected error"})
+    with pytest.raises(AgentClientError, match="Unexpected error"):
+        async for _ in session.events(run_c):
+            pass
+
+    # Runs still open when the connection closes end with an error
+    run_d = await session.start("Hello?")
+    await session.aclose()
+    with pytest.raises(AgentClientError, match="Connection closed"):
+        async for _ in session.events(run_d):
+            pass
+
+
 @pytest.mark.asyncio
 async def test_acreate_feedback(agent_client):
     """Test asynchronous feedback creation."""
@@ -265,6 +496,18 @@ async def test_acreate_feedback(agent_client):
         assert "500 Internal Server Error" in str(exc.value)
 
 
+@pytest.mark.asyncio
+async def test_acreate_feedback_batch(agent_client):
+    """Test creating feedback for many runs in one request."""
+    feedback = [Feedback(run_id=f"run-{i}", key="stars", score=i / 2) for i in range(3)]
+    mock_response = Response(200, json={}, request=Request("POST", "http://test/feedback/batch"))
+    with patch("httpx.AsyncClient.post", return_value=mock_response) as mock_post:
+        await agent_client.acreate_feedback_batch(feedback)
+        args, kwargs = mock_post.call_args
+        assert args[0].endswith("/feedback/batch")
+        assert [f["run_id"] for f in kwargs["json"]["feedback"]] == ["run-0", "run-1", "run-2"]
+
+
 def test_get_history(agent_client):
     """Test chat history retrieval."""
     THREAD_ID = "test-thread"
@@ -294,6 +537,38 @@ def test_get_history(agent_client):
         assert "500 Internal Server Error" in str(exc.value)
 
 
+def test_iter_history(agent_client):
+    """Test that chat history is fetched one page at a time as it is consumed."""
+    pages = {
+        None: {
+            "messages": [{"type": "ai", "content": "3", "id": "m3"}],
+            "has_more": True,
+        },
+        "m3": {
+            "messages": [
+                {"type": "human", "content": "1", "id": "m1"},
+                {"type": "ai", "content": "2", "id": "m2"},
+            ],
+            "has_more": False,
+        },
+    }
+    requests = []
+
+    def mock_post(url, json, **kwargs):
+        requests.append(json)
+        return Response(200, json=pages[json.get("before")], request=Request("POST", url))
+
+    with patch("httpx.post", side_effect=mock_post):
+        messages = agent_client.iter_history("test-thread", page_size=2)
+        assert next(messages).content == "3"
+        assert len(requests) == 1
+        assert [m.content for m in messages] == ["2", "1"]
+    assert requests == [
+        {"thread_id": "test-thread", "limit": 2},
+        {"thread_id": "test-thread", "limit": 2, "before": "m3"},
+    ]
+
+
 def test_info(agent_client):
     assert agent_client.info is None
     assert agent_client.agent == "test-agent"
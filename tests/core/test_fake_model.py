@@ -0,0 +1,88 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+
+from core.fake_model import StreamingFakeChatModel
+from core.llm import get_model
+from core.settings import FakeToolCall
+from schema.models import FakeModelName
+
+
+@tool
+def calculator(expression: str) -> str:
+    """Evaluate an arithmetic expression."""
+    return "6"
+
+
+def test_response_length_is_deterministic() -> None:
+    model = StreamingFakeChatModel(ttft=0, token_delay=0, output_tokens=50, output_tokens_stddev=10)
+    messages = [HumanMessage(content="hello")]
+    response = model.invoke(messages)
+    assert response.content == model.invoke(messages).content
+    assert response.usage_metadata["output_tokens"] == len(response.content.split())
+    lengths = {
+        len(model.invoke([HumanMessage(content=f"message {i}")]).content.split()) for i in range(20)
+    }
+    assert len(lengths) > 1
+    assert min(lengths) >= 1
+
+
+def test_stream_timing() -> None:
+    model = StreamingFakeChatModel(ttft=0.05, token_delay=0.01, output_tokens=5)
+    start = time.perf_counter()
+    chunks = []
+    for chunk in model.stream("hello"):
+        chunks.append((time.perf_counter() - start, chunk))
+    assert len(chunks) == 5
+    assert chunks[0][0] >= 0.05
+    assert chunks[-1][0] >= 0.09
+    assert all(isinstance(chunk, AIMessageChunk) for _, chunk in chunks)
+
+
+@pytest.mark.asyncio
+async def test_scripted_tool_calls() -> None:
+    model = StreamingFakeChatModel(
+        ttft=0,
+        token_delay=0,
+        output_tokens=3,
+        tool_calls=[
+            FakeToolCall(name="calculator", args={"expression": "2 * 3"}),
+            FakeToolCall(name="web_search", args={"query": "unbound"}),
+            FakeToolCall(name="calculator", args={"expression": "6 + 1"}),
+        ],
+    )
+    # Without bound tools, the model only answers.
+    assert not (await model.ainvoke("2 * 3 + 1?")).tool_calls
+
+    bound = model.bind_tools([calculator])
+    messages = [HumanMessage(content="2 * 3 + 1?")]
+    first = await bound.ainvoke(messages)
+    assert [(c["name"], c["args"]) for c in first.tool_calls] == [
+        ("calculator", {"expression": "2 * 3"})
+    ]
+    messages += [first, ToolMessage(content="6", tool_call_id=first.tool_calls[0]["id"])]
+    second = await bound.ainvoke(messages)
+    assert second.tool_calls[0]["args"] == {"expression": "6 + 1"}
+    messages += [second, ToolMessage(content="7", tool_call_id=second.tool_calls[0]["id"])]
+    answer = await bound.ainvoke(messages)
+    assert isinstance(answer, AIMessage)
+    assert not answer.tool_calls
+    assert len(answer.content.split()) == 3
+
+    # The script starts over with the next user message.
+    messages += [answer, HumanMessage(content="again")]
+    assert (await bound.ainvoke(messages)).tool_calls
+
+
+def test_get_model_fake_streaming() -> None:
+    get_model.cache_clear()
+    try:
+        with patch("core.llm.settings.FAKE_MODEL_OUTPUT_TOKENS", 7):
+            model = get_model(FakeModelName.FAKE_STREAMING)
+        assert isinstance(model, StreamingFakeChatModel)
+        assert model.output_tokens == 7
+    finally:
+        get_model.cache_clear()
@@ -4,10 +4,11 @@ from unittest.mock import patch
 import pytest
 from langchain_anthropic import ChatAnthropic
 from langchain_community.chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage
 from langchain_groq import ChatGroq
 from langchain_openai import ChatOpenAI
 
-from core.llm import get_model
+from core.llm import SystemPrompt, get_model, report_prompt_cache_usage
 from schema.models import (
     AnthropicModelName,
     FakeModelName,
@@ -60,3 +61,56 @@ def test_get_model_invalid():
     with pytest.raises(ValueError, match="Unsupported model:"):
         # Using type: ignore since we're intentionally testing invalid input
         get_model("invalid_model")  # type: ignore
+
+
+def test_system_prompt_for_model():
+    prompt = SystemPrompt("You are a helpful assistant.")
+    fake = get_model(FakeModelName.FAKE)
+    with patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test_key"}):
+        anthropic = get_model(AnthropicModelName.HAIKU_3)
+
+    with patch("core.llm.settings.PROMPT_CACHING", False):
+        assert prompt.for_model(anthropic).content == "You are a helpful assistant."
+    with patch("core.llm.settings.PROMPT_CACHING", True):
+        # The same message objects are reused on every call.
+        assert prompt.for_model(fake) is prompt.message
+        assert prompt.for_model(anthropic) is prompt.cacheable_message
+        assert prompt.cacheable_message.content[0]["cache_control"] == {"type": "ephemeral"}
+
+
+def test_report_prompt_cache_usage():
+    message = AIMessage(
+        content="Hi",
+        usage_metadata={
+            "input_tokens": 1500,
+            "output_tokens": 10,
+            "total_tokens": 1510,
+            "input_token_details": {"cache_read": 1400, "cache_creation": 0},
+        },
+    )
+    assert report_prompt_cache_usage(message).response_metadata["prompt_cache"] == {
+        "cached_input_tokens": 1400,
+        "cache_creation_input_tokens": 0,
+        "uncached_input_tokens": 100,
+    }
+
+    # Raw Anthropic usage counts input_tokens excluding cache reads and writes.
+    message = AIMessage(
+        content="Hi",
+        response_metadata={
+            "usage": {
+                "input_tokens": 171,
+                "output_tokens": 96,
+                "cache_creation_input_tokens": 1470,
+                "cache_read_input_tokens": 0,
+            }
+        },
+    )
+    assert report_prompt_cache_usage(message).response_metadata["prompt_cache"] == {
+        "cached_input_tokens": 0,
+        "cache_creation_input_tokens": 1470,
+        "uncached_input_tokens": 1641,
+    }
+
+    message = AIMessage(content="Hi")
+    assert "prompt_cache" not in report_prompt_cache_usage(message).response_metadata
@@ -0,0 +1,51 @@
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from prometheus_client import REGISTRY
+
+from agents.counselor_agent import counselor_agent
+from core.metrics import StreamRecorder, instrument_checkpointer
+from schema.models import FakeModelName
+
+
+def _sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_stream_recorder() -> None:
+    labels = {"agent_id": "test-agent", "model": "test-model"}
+    active = _sample("agent_active_streams")
+
+    with patch("core.metrics.time.perf_counter", side_effect=[10.0, 10.5, 12.5]):
+        recorder = StreamRecorder("test-agent", "test-model")
+        assert _sample("agent_active_streams") == active + 1
+        for _ in range(5):
+            recorder.token()
+        recorder.finish("ok")
+
+    assert _sample("agent_active_streams") == active
+    assert _sample("agent_requests_total", **labels, endpoint="stream", status="ok") == 1
+    assert _sample("agent_request_duration_seconds_sum", **labels, endpoint="stream") == 2.5
+    assert _sample("agent_stream_time_to_first_token_seconds_sum", **labels) == 0.5
+    # Five tokens over the two seconds after the first one.
+    assert _sample("agent_stream_tokens_per_second_sum", **labels) == 2.5
+
+
+@pytest.mark.asyncio
+async def test_instrument_checkpointer() -> None:
+    saver = instrument_checkpointer(MemorySaver())
+    writes = _sample("checkpointer_operation_duration_seconds_count", operation="aput")
+    reads = _sample("checkpointer_operation_duration_seconds_count", operation="aget_tuple")
+
+    config = {"configurable": {"thread_id": str(uuid4()), "model": FakeModelName.FAKE}}
+    with patch.object(counselor_agent, "checkpointer", saver):
+        await counselor_agent.ainvoke({"messages": [HumanMessage(content="hi")]}, config)
+        history = [c async for c in saver.alist(config)]
+
+    assert len(history) == 3
+    assert _sample("checkpointer_operation_duration_seconds_count", operation="aput") == writes + 3
+    assert _sample("checkpointer_operation_duration_seconds_count", operation="aget_tuple") > reads
+    assert _sample("checkpointer_operation_duration_seconds_count", operation="alist") > 0
@@ -0,0 +1,91 @@
+import os
+from unittest.mock import patch
+
+from langchain_community.chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from core.llm import _CONTEXT_WINDOWS, _MODEL_TABLE, context_budget, get_model
+from core.tokens import TokenCounter, trim_to_budget
+from schema.models import AnthropicModelName, OpenAIModelName
+
+
+class CharCounter(TokenCounter):
+    """One token per character of content, so budgets are easy to follow."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.tokenized: list[str] = []
+
+    def _tokenize(self, message) -> int:
+        self.tokenized.append(message.content)
+        return len(message.content)
+
+
+def test_counts_are_memoized_by_message_id() -> None:
+    counter = CharCounter()
+    history = [HumanMessage(content="hello", id="1"), AIMessage(content="hi!", id="2")]
+    assert counter(history) == 8
+    assert counter([*history, HumanMessage(content="bye", id="3")]) == 11
+    # Only the new message was tokenized on the second turn.
+    assert counter.tokenized == ["hello", "hi!", "bye"]
+
+
+def test_counts_without_id_are_memoized_by_content() -> None:
+    counter = CharCounter()
+    # wrap_model-style prompts are new objects without an ID on every call.
+    for _ in range(3):
+        counter([SystemMessage(content="a long system prompt"), HumanMessage(content="hi")])
+    assert counter.tokenized == ["a long system prompt", "hi"]
+    # The same text in a message of another type is counted separately.
+    counter([HumanMessage(content="a long system prompt")])
+    assert counter.tokenized == ["a long system prompt", "hi", "a long system prompt"]
+
+
+def test_counter_is_bounded() -> None:
+    counter = CharCounter()
+    counter.max_entries = 2
+    counter([HumanMessage(content=str(i), id=str(i)) for i in range(3)])
+    assert list(counter._counts) == ["1", "2"]
+
+
+def test_counter_falls_back_without_encoding() -> None:
+    counter = TokenCounter()
+    with patch("tiktoken.get_encoding", side_effect=OSError("offline")):
+        assert counter([HumanMessage(content="x" * 40)]) == 10 + 4
+
+
+def test_trim_to_budget() -> None:
+    system = SystemMessage(content="sys")
+    messages = [
+        system,
+        HumanMessage(content="aaaa"),
+        AIMessage(content="bbbb"),
+        HumanMessage(content="cc"),
+        AIMessage(content="", tool_calls=[{"name": "t", "args": {}, "id": "1"}]),
+        ToolMessage(content="dd", tool_call_id="1"),
+        AIMessage(content="ee"),
+    ]
+    counter = CharCounter()
+    assert trim_to_budget(messages, None, counter) == messages
+    assert trim_to_budget(messages, 100, counter) == messages
+    # The system message is kept, and the conversation starts on a user message.
+    assert trim_to_budget(messages, 12, counter) == [system, *messages[3:]]
+    # The latest user turn is kept even when it does not fit.
+    assert trim_to_budget(messages, 5, counter) == [system, *messages[3:]]
+
+
+def test_context_windows_cover_model_table() -> None:
+    assert set(_CONTEXT_WINDOWS) == set(_MODEL_TABLE)
+
+
+def test_context_budget() -> None:
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key", "ANTHROPIC_API_KEY": "test_key"}):
+        gpt = get_model(OpenAIModelName.GPT_4O)
+        claude = get_model(AnthropicModelName.SONNET_35)
+    with patch("core.llm.settings.CONTEXT_RESERVED_TOKENS", 1000):
+        assert context_budget(gpt) == 127_000
+        assert context_budget(claude) == 199_000
+        assert context_budget(FakeListChatModel(responses=["x"])) is None
+        with patch("core.llm.settings.CONTEXT_MAX_TOKENS", 50_000):
+            assert context_budget(gpt) == 50_000
+            assert context_budget(FakeListChatModel(responses=["x"])) == 50_000
@@ -0,0 +1,104 @@
+import pytest
+from langchain_community.chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+from langgraph.graph import END, MessagesState, StateGraph
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import StatusCode
+
+from core.tracing import GraphTracingHandler, create_tracer_provider
+
+
+@tool
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+
+async def call_model(state: MessagesState) -> MessagesState:
+    model = FakeListChatModel(responses=["The answer is 3."])
+    return {"messages": [await model.ainvoke(state["messages"])]}
+
+
+async def call_tools(state: MessagesState) -> MessagesState:
+    result = await add.ainvoke({"a": 1, "b": 2})
+    return {"messages": [AIMessage(content=str(result))]}
+
+
+graph = StateGraph(MessagesState)
+graph.add_node("tools", call_tools)
+graph.add_node("model", call_model)
+graph.set_entry_point("tools")
+graph.add_edge("tools", "model")
+graph.add_edge("model", END)
+agent = graph.compile()
+
+
+@pytest.mark.asyncio
+async def test_graph_spans() -> None:
+    exporter = InMemorySpanExporter()
+    provider = create_tracer_provider(exporter)
+    tracer = provider.get_tracer("test")
+
+    with tracer.start_as_current_span("request") as request:
+        handler = GraphTracingHandler(tracer)
+        await agent.ainvoke(
+            {"messages": [HumanMessage(content="1 + 2?")]},
+            {"callbacks": [handler], "metadata": {"agent_id": "test-agent"}},
+        )
+    provider.force_flush()
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert set(spans) == {
+        "request",
+        "graph LangGraph",
+        "node tools",
+        "tool add",
+        "node model",
+        "chat",
+    }
+    parents = {name: span.parent.span_id for name, span in spans.items() if span.parent}
+    assert parents == {
+        "graph LangGraph": request.get_span_context().span_id,
+        "node tools": spans["graph LangGraph"].context.span_id,
+        "tool add": spans["node tools"].context.span_id,
+        "node model": spans["graph LangGraph"].context.span_id,
+        "chat": spans["node model"].context.span_id,
+    }
+    assert spans["graph LangGraph"].attributes["agent.id"] == "test-agent"
+    assert not handler._spans
+    assert not handler._contexts
+
+
+def test_tail_sampling() -> None:
+    exporter = InMemorySpanExporter()
+    provider = create_tracer_provider(exporter, sample_ratio=0, keep_slower_than=60)
+    tracer = provider.get_tracer("test")
+
+    with tracer.start_as_current_span("fast"), tracer.start_as_current_span("child"):
+        pass
+    # A failed trace is kept whole, even when the error is in a child span.
+    with tracer.start_as_current_span("failed"), tracer.start_as_current_span("child") as child:
+        child.set_status(StatusCode.ERROR)
+    provider.force_flush()
+
+    spans = exporter.get_finished_spans()
+    assert [span.name for span in spans] == ["child", "failed"]
+    assert len({span.context.trace_id for span in spans}) == 1
+
+
+def test_tail_sampling_bounds_pending_spans() -> None:
+    exporter = InMemorySpanExporter()
+    provider = create_tracer_provider(exporter, sample_ratio=1, keep_slower_than=60, max_spans=2)
+    tracer = provider.get_tracer("test")
+    sampler = provider._active_span_processor._span_processors[0]
+
+    with tracer.start_as_current_span("root"):
+        for _ in range(3):
+            with tracer.start_as_current_span("child"):
+                pass
+        assert sampler._spans == 0
+    provider.force_flush()
+    # The unfinished trace was evicted, so only its root is exported.
+    assert [span.name for span in exporter.get_finished_spans()] == ["root"]
+    assert sampler.dropped == 1
@@ -0,0 +1,135 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base.id import uuid6
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, MessagesState, StateGraph
+from prometheus_client import REGISTRY
+
+from memory import CheckpointRetention, sqlite_checkpointer
+from memory.retention import checkpoint_id_at
+
+
+def _echo(state: MessagesState) -> MessagesState:
+    return {"messages": [AIMessage(content=state["messages"][-1].content)]}
+
+
+def _echo_agent(saver):
+    graph = StateGraph(MessagesState)
+    graph.add_node("echo", _echo)
+    graph.set_entry_point("echo")
+    graph.add_edge("echo", END)
+    return graph.compile(checkpointer=saver)
+
+
+async def _converse(agent, thread_id: str, turns: int) -> None:
+    config = {"configurable": {"thread_id": thread_id}}
+    for turn in range(turns):
+        # Large messages, so deleted checkpoints free whole pages.
+        await agent.ainvoke({"messages": [HumanMessage(content=f"{turn} " * 2000)]}, config)
+
+
+async def _count(saver, thread_id: str) -> int:
+    return len([c async for c in saver.alist({"configurable": {"thread_id": thread_id}})])
+
+
+async def _run_once(retention: CheckpointRetention, saver) -> None:
+    """Start retention and stop it once its background task has compacted once."""
+    await retention.start(saver)
+    try:
+        for _ in range(500):
+            if retention.runs:
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("Retention did not run")
+    finally:
+        await retention.stop()
+
+
+def test_checkpoint_id_at() -> None:
+    now = time.time()
+    assert checkpoint_id_at(now - 1) < str(uuid6()) < checkpoint_id_at(now + 1)
+
+
+@pytest.mark.asyncio
+async def test_keep_last(tmp_path) -> None:
+    async with sqlite_checkpointer(str(tmp_path / "checkpoints.db")) as saver:
+        agent = _echo_agent(saver)
+        for thread_id in ["a", "b", "c"]:
+            await _converse(agent, thread_id, turns=5)
+        retention = CheckpointRetention(keep_last=2, batch_size=2, rebuild=True)
+        deleted = REGISTRY.get_sample_value("checkpoints_deleted_total") or 0
+        reclaimed = REGISTRY.get_sample_value("checkpoint_reclaimed_bytes_total") or 0
+        await _run_once(retention, saver)
+
+        for thread_id in ["a", "b", "c"]:
+            assert await _count(saver, thread_id) == 2
+        state = await agent.aget_state({"configurable": {"thread_id": "b"}})
+        assert len(state.values["messages"]) == 10
+        async with saver.conn.execute("SELECT COUNT(*) FROM writes") as cursor:
+            (writes,) = await cursor.fetchone()
+        assert writes <= 3 * 2 * 2
+        stats = retention.stats()
+        assert stats["deleted_checkpoints"] == 3 * (5 * 3 - 2)
+        assert stats["reclaimed_bytes"] > 0
+        assert REGISTRY.get_sample_value("checkpoints_deleted_total") == deleted + 3 * 13
+        assert (
+            REGISTRY.get_sample_value("checkpoint_reclaimed_bytes_total")
+            == reclaimed + stats["reclaimed_bytes"]
+        )
+
+
+@pytest.mark.asyncio
+async def test_no_rebuild_by_default(tmp_path) -> None:
+    async with sqlite_checkpointer(str(tmp_path / "checkpoints.db")) as saver:
+        agent = _echo_agent(saver)
+        await _converse(agent, "a", turns=5)
+        retention = CheckpointRetention(keep_last=2)
+        await _run_once(retention, saver)
+
+        # Checkpoints are deleted, but the database is not rewritten by a full VACUUM.
+        assert await _count(saver, "a") == 2
+        async with saver.conn.execute("PRAGMA auto_vacuum") as cursor:
+            assert (await cursor.fetchone())[0] == 0
+        async with saver.conn.execute("PRAGMA freelist_count") as cursor:
+            assert (await cursor.fetchone())[0] > 0
+        stats = retention.stats()
+        assert stats["incremental_vacuum"] is False
+        assert stats["reclaimed_bytes"] == 0
+
+
+@pytest.mark.asyncio
+async def test_empty_database_uses_incremental_vacuum(tmp_path) -> None:
+    async with sqlite_checkpointer(str(tmp_path / "checkpoints.db")) as saver:
+        retention = CheckpointRetention(keep_last=2)
+        await _run_once(retention, saver)
+        async with saver.conn.execute("PRAGMA auto_vacuum") as cursor:
+            assert (await cursor.fetchone())[0] == 2
+        assert retention.stats()["incremental_vacuum"] is True
+
+
+@pytest.mark.asyncio
+async def test_ttl(tmp_path) -> None:
+    async with sqlite_checkpointer(str(tmp_path / "checkpoints.db")) as saver:
+        agent = _echo_agent(saver)
+        await _converse(agent, "idle", turns=2)
+        between = time.time()
+        await _converse(agent, "active", turns=2)
+        retention = CheckpointRetention(ttl=60)
+        with patch("memory.retention.time.time", return_value=between + 60):
+            await _run_once(retention, saver)
+
+        assert await _count(saver, "idle") == 0
+        assert await _count(saver, "active") == 6
+        assert retention.stats()["expired_threads"] == 1
+
+
+@pytest.mark.asyncio
+async def test_unsupported_checkpointer() -> None:
+    retention = CheckpointRetention(keep_last=1)
+    await retention.start(MemorySaver())
+    with pytest.raises(RuntimeError):
+        await retention.compact()
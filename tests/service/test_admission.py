@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+
+from service.admission import AdmissionController, AdmissionRejected, release_after
+
+
+@pytest.mark.asyncio
+async def test_agent_and_global_limits() -> None:
+    controller = AdmissionController(
+        max_concurrency=3, agent_max_concurrency=2, agent_limits={"research": 1}
+    )
+    chat = [await controller.acquire("chat") for _ in range(2)]
+    research = await controller.acquire("research")
+    assert controller.stats()["active"] == 3
+
+    # Both the agent and the global limit are full, so these wait.
+    waiting_chat = asyncio.create_task(controller.acquire("chat"))
+    waiting_research = asyncio.create_task(controller.acquire("research"))
+    await asyncio.sleep(0)
+    stats = controller.stats()
+    assert stats["queue_depth"] == 2
+    assert stats["agents"]["chat"] == {"active": 2, "queue_depth": 1}
+
+    research.release()
+    research.release()  # Releasing twice is a no-op
+    admitted = await waiting_research
+    assert not waiting_chat.done()
+
+    chat[0].release()
+    await waiting_chat
+    assert controller.stats()["queue_depth"] == 0
+    assert controller.stats()["active"] == 3
+    admitted.release()
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_queue_full() -> None:
+    controller = AdmissionController(max_concurrency=1, max_queue=1, retry_after=7)
+    await controller.acquire("chat")
+    waiting = asyncio.create_task(controller.acquire("chat"))
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as exc_info:
+        await controller.acquire("chat")
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.headers == {"Retry-After": "7"}
+    assert controller.stats()["rejected"] == {429: 1}
+    waiting.cancel()
+
+
+@pytest.mark.asyncio
+async def test_rejects_after_queue_timeout() -> None:
+    controller = AdmissionController(agent_max_concurrency=1, queue_timeout=0.01)
+    await controller.acquire("chat")
+    with pytest.raises(AdmissionRejected) as exc_info:
+        await controller.acquire("chat")
+    assert exc_info.value.status_code == 503
+    # The timed out request does not keep a slot or a place in the queue.
+    assert controller.stats()["queue_depth"] == 0
+    assert controller.stats()["agents"]["chat"]["active"] == 1
+
+
+@pytest.mark.asyncio
+async def test_sheds_load_on_event_loop_lag() -> None:
+    controller = AdmissionController(max_loop_lag=0.02, lag_interval=0.01)
+    controller.start()
+    try:
+        await asyncio.sleep(0.015)
+        await controller.acquire("chat")
+
+        # Block the event loop, then let the monitor measure it.
+        time.sleep(0.05)  # noqa: ASYNC251 - blocking the loop is what this test measures
+        await asyncio.sleep(0.005)
+        assert controller.loop_lag > 0.02
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await controller.acquire("chat")
+        assert exc_info.value.status_code == 503
+    finally:
+        await controller.stop()
+
+
+@pytest.mark.asyncio
+async def test_release_after_stream_ends() -> None:
+    controller = AdmissionController(max_concurrency=1)
+
+    async def frames():
+        yield b"a"
+        raise RuntimeError("boom")
+
+    admission = await controller.acquire("chat")
+    with pytest.raises(RuntimeError):
+        async for _ in release_after(frames(), admission):
+            pass
+    assert controller.stats()["active"] == 0
@@ -1,5 +1,14 @@
+import asyncio
+from unittest.mock import patch
+
 from pydantic import SecretStr
 
+from core.settings import ApiKeyConfig
+from service import sse
+from service.rate_limit import ApiKeyRegistry, TokenUsageHandler, current_api_key
+from service.runs import InMemoryRunQueue, RunWorkerPool
+from service.service import _execute_run
+
 
 def test_no_auth_secret(mock_settings, mock_agent, test_client):
     """Test that when AUTH_SECRET is not set, all requests are allowed"""
@@ -40,3 +49,111 @@ def test_auth_secret_incorrect(mock_settings, mock_agent, test_client):
     # Should also reject requests with no auth header
     response = test_client.post("/invoke", json={"message": "test"})
     assert response.status_code == 401
+
+
+def test_api_keys_rate_limited(mock_settings, mock_agent, test_client):
+    """Test that API keys are accepted and rate limited per key"""
+    mock_settings.AUTH_SECRET = SecretStr("test-secret")
+    registry = ApiKeyRegistry(
+        [
+            ApiKeyConfig(name="a", key=SecretStr("key-a"), requests_per_second=0.01, burst=2),
+            ApiKeyConfig(name="b", key=SecretStr("key-b"), tokens_per_minute=1000),
+        ]
+    )
+    with patch("service.service.api_keys", registry):
+        for remaining in ["1", "0"]:
+            response = test_client.post(
+                "/invoke", json={"message": "test"}, headers={"Authorization": "Bearer key-a"}
+            )
+            assert response.status_code == 200
+            assert response.headers["RateLimit-Limit"] == "2"
+            assert response.headers["RateLimit-Remaining"] == remaining
+
+        response = test_client.post(
+            "/invoke", json={"message": "test"}, headers={"Authorization": "Bearer key-a"}
+        )
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) > 0
+        assert response.headers["RateLimit-Remaining"] == "0"
+
+        # Other keys and the shared secret are not affected
+        response = test_client.post(
+            "/invoke", json={"message": "test"}, headers={"Authorization": "Bearer key-b"}
+        )
+        assert response.status_code == 200
+        assert response.headers["X-RateLimit-Limit-Tokens"] == "1000"
+        callbacks = mock_agent.ainvoke.await_args.kwargs["config"]["callbacks"]
+        assert [type(c) for c in callbacks] == [TokenUsageHandler]
+
+        response = test_client.post(
+            "/invoke", json={"message": "test"}, headers={"Authorization": "Bearer test-secret"}
+        )
+        assert response.status_code == 200
+        assert "RateLimit-Limit" not in response.headers
+
+        response = test_client.post(
+            "/invoke", json={"message": "test"}, headers={"Authorization": "Bearer key-c"}
+        )
+        assert response.status_code == 401
+
+
+def test_api_key_batch_charged_per_input(mock_settings, mock_agent, test_client):
+    """Test that a batch counts as one request per input against the key's rate limit"""
+    mock_settings.AUTH_SECRET = SecretStr("test-secret")
+    mock_settings.BATCH_MAX_ITEMS = 6
+    mock_settings.BATCH_MAX_CONCURRENCY = 2
+    registry = ApiKeyRegistry(
+        [ApiKeyConfig(name="a", key=SecretStr("key-a"), requests_per_second=0.01, burst=5)]
+    )
+    headers = {"Authorization": "Bearer key-a"}
+    with patch("service.service.api_keys", registry):
+        # A batch larger than the burst could never be admitted. It costs one request.
+        response = test_client.post(
+            "/invoke/batch", json={"inputs": [{"message": "a"}] * 6}, headers=headers
+        )
+        assert response.status_code == 422
+        assert response.json()["detail"] == (
+            "Batch of 6 inputs exceeds the API key's burst of 5 requests"
+        )
+        assert mock_agent.ainvoke.await_count == 0
+
+        batch = {"inputs": [{"message": "a"}] * 3}
+        response = test_client.post("/invoke/batch", json=batch, headers=headers)
+        assert response.status_code == 200
+        assert response.headers["RateLimit-Remaining"] == "1"
+        assert mock_agent.ainvoke.await_count == 3
+
+        response = test_client.post("/invoke/batch", json=batch, headers=headers)
+        assert response.status_code == 429
+        assert mock_agent.ainvoke.await_count == 3
+
+
+def test_api_key_runs_charged_to_key(mock_settings, test_client):
+    """Test that queued runs charge their LLM usage to the key they were submitted with"""
+    mock_settings.AUTH_SECRET = SecretStr("test-secret")
+    mock_settings.RUN_MAX_QUEUE_DEPTH = 10
+    registry = ApiKeyRegistry(
+        [ApiKeyConfig(name="b", key=SecretStr("key-b"), tokens_per_minute=1000)]
+    )
+    run_workers = RunWorkerPool(InMemoryRunQueue(), _execute_run, size=0)
+    charged_to = []
+
+    async def message_generator(*args, **kwargs):
+        charged_to.append(current_api_key.get())
+        yield sse.encode_message({"type": "ai", "content": "done"})
+
+    with (
+        patch("service.service.api_keys", registry),
+        patch("service.service.run_workers", run_workers),
+        patch("service.service.message_generator", message_generator),
+    ):
+        response = test_client.post(
+            "/runs", json={"message": "test"}, headers={"Authorization": "Bearer key-b"}
+        )
+        assert response.status_code == 202
+        assert "api_key" not in response.json()
+        run = asyncio.run(run_workers.queue.get(response.json()["run_id"]))
+        assert run.api_key == "b"
+
+        asyncio.run(_execute_run(run))
+        assert charged_to == [registry.get("b")]
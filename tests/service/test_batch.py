@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import pytest
+
+from schema import ChatMessage, UserInput
+from service.batch import run_batch, stream_batch
+
+
+def _inputs(n: int) -> list[UserInput]:
+    return [UserInput(message=str(i)) for i in range(n)]
+
+
+@pytest.mark.asyncio
+async def test_run_batch_order_and_concurrency() -> None:
+    running = 0
+    peak = 0
+
+    async def invoke(user_input: UserInput) -> ChatMessage:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        # Later inputs finish first, so ordering has to be restored.
+        await asyncio.sleep(0.01 * (10 - int(user_input.message)))
+        running -= 1
+        if user_input.message == "3":
+            raise ValueError("boom")
+        return ChatMessage(type="ai", content=f"answer {user_input.message}")
+
+    results = await run_batch(invoke, _inputs(10), max_concurrency=3)
+
+    assert peak == 3
+    assert [r.index for r in results] == list(range(10))
+    assert results[3].output is None
+    assert results[3].error == "Unexpected error"
+    assert results[5].output.content == "answer 5"
+    assert results[5].error is None
+
+
+@pytest.mark.asyncio
+async def test_stream_batch_completion_order() -> None:
+    async def invoke(user_input: UserInput) -> ChatMessage:
+        await asyncio.sleep(0.01 * (3 - int(user_input.message)))
+        return ChatMessage(type="ai", content=user_input.message)
+
+    lines = [json.loads(line) async for line in stream_batch(invoke, _inputs(3), 3)]
+
+    assert [line["index"] for line in lines] == [2, 1, 0]
+    assert lines[0]["output"]["content"] == "2"
+
+
+@pytest.mark.asyncio
+async def test_stream_batch_cancels_remaining_on_close() -> None:
+    cancelled = 0
+
+    async def invoke(user_input: UserInput) -> ChatMessage:
+        nonlocal cancelled
+        if user_input.message == "0":
+            return ChatMessage(type="ai", content="fast")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled += 1
+            raise
+        return ChatMessage(type="ai", content="slow")
+
+    stream = stream_batch(invoke, _inputs(3), 3)
+    first = json.loads(await anext(stream))
+    await stream.aclose()
+
+    assert first["index"] == 0
+    assert cancelled == 2
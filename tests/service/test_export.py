@@ -0,0 +1,112 @@
+import json
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.graph import END, MessagesState, StateGraph
+
+from schema import ExportInput
+from service.export import _postgres_thread_ids, export_threads
+
+
+def _echo(state: MessagesState) -> MessagesState:
+    return {"messages": [AIMessage(content=f"echo: {state['messages'][-1].content}")]}
+
+
+async def _populate(saver) -> None:
+    graph = StateGraph(MessagesState)
+    graph.add_node("echo", _echo)
+    graph.set_entry_point("echo")
+    graph.add_edge("echo", END)
+    agent = graph.compile(checkpointer=saver)
+    for thread_id, agent_id in [("t1", "chatbot"), ("t2", "research-assistant"), ("t3", "chatbot")]:
+        await agent.ainvoke(
+            {"messages": [HumanMessage(content=f"hi from {thread_id}")]},
+            {"configurable": {"thread_id": thread_id}, "metadata": {"agent_id": agent_id}},
+        )
+
+
+async def _export(saver, **filters) -> list[dict]:
+    lines = [line async for line in export_threads(saver, ExportInput(**filters), chunk_size=1)]
+    return [json.loads(line) for line in lines]
+
+
+async def _check_export(saver) -> None:
+    await _populate(saver)
+
+    threads = await _export(saver)
+    assert sorted(t["thread_id"] for t in threads) == ["t1", "t2", "t3"]
+    t1 = next(t for t in threads if t["thread_id"] == "t1")
+    assert t1["agent_id"] == "chatbot"
+    assert [m["content"] for m in t1["messages"]] == ["hi from t1", "echo: hi from t1"]
+    assert [m["type"] for m in t1["messages"]] == ["human", "ai"]
+
+    threads = await _export(saver, agent_id="chatbot")
+    assert sorted(t["thread_id"] for t in threads) == ["t1", "t3"]
+    threads = await _export(saver, agent_id="chatbot", thread_ids=["t2", "t3", "missing"])
+    assert [t["thread_id"] for t in threads] == ["t3"]
+
+    now = datetime.now(UTC)
+    assert len(await _export(saver, updated_after=now - timedelta(minutes=1))) == 3
+    assert await _export(saver, updated_after=now + timedelta(minutes=1)) == []
+    # Naive times are taken as UTC.
+    assert (
+        await _export(saver, updated_before=now.replace(tzinfo=None) - timedelta(minutes=1)) == []
+    )
+
+
+@pytest.mark.asyncio
+async def test_export_threads_sqlite(tmp_path) -> None:
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        await _check_export(saver)
+
+
+@pytest.mark.asyncio
+async def test_export_threads_other_checkpointer() -> None:
+    await _check_export(MemorySaver())
+
+
+class StubPostgresCursor:
+    """Answers the keyset query from a list of (thread_id, agent_id) rows."""
+
+    def __init__(self, rows: list[tuple[str, str]], queries: list[tuple]) -> None:
+        self.rows = rows
+        self.queries = queries
+        self._result: list[dict] = []
+
+    async def execute(self, query: str, params: tuple) -> None:
+        self.queries.append(params)
+        last, *agent_id, limit = params
+        thread_ids = sorted(
+            {t for t, a in self.rows if t > last and (not agent_id or a == agent_id[0])}
+        )
+        self._result = [{"thread_id": t} for t in thread_ids[:limit]]
+
+    async def fetchall(self) -> list[dict]:
+        return self._result
+
+
+class StubPostgresSaver:
+    def __init__(self, rows: list[tuple[str, str]]) -> None:
+        self.rows = rows
+        self.queries: list[tuple] = []
+
+    @asynccontextmanager
+    async def _cursor(self):
+        yield StubPostgresCursor(self.rows, self.queries)
+
+
+@pytest.mark.asyncio
+async def test_postgres_thread_ids_keyset() -> None:
+    rows = [("t3", "chatbot"), ("t1", "chatbot"), ("t1", "chatbot"), ("t2", "research-assistant")]
+    saver = StubPostgresSaver(rows)
+    assert [t async for t in _postgres_thread_ids(saver, None, chunk_size=2)] == ["t1", "t2", "t3"]
+    # Each chunk starts after the last thread ID of the previous one.
+    assert saver.queries == [("", 2), ("t2", 2)]
+
+    saver = StubPostgresSaver(rows)
+    assert [t async for t in _postgres_thread_ids(saver, "chatbot", chunk_size=1)] == ["t1", "t3"]
+    assert saver.queries == [("", "chatbot", 1), ("t1", "chatbot", 1), ("t3", "chatbot", 1)]
@@ -0,0 +1,79 @@
+from unittest.mock import Mock
+
+import pytest
+
+from schema import Feedback
+from service.feedback import FeedbackQueue, FeedbackQueueFull
+
+
+def _feedback(count: int) -> list[Feedback]:
+    return [Feedback(run_id=f"run-{i}", key="stars", score=1.0) for i in range(count)]
+
+
+def _sent_run_ids(client: Mock) -> list[str]:
+    return [c.kwargs["run_id"] for c in client.create_feedback.call_args_list]
+
+
+@pytest.mark.asyncio
+async def test_batches_are_sent_in_background() -> None:
+    client = Mock()
+    queue = FeedbackQueue(lambda: client, batch_size=2, flush_interval=60)
+    await queue.start()
+    await queue.submit(_feedback(3))
+    await queue.flush()
+    assert _sent_run_ids(client) == ["run-0", "run-1", "run-2"]
+    # Each record keeps its own ID, so LangSmith can deduplicate retries.
+    ids = {c.kwargs["feedback_id"] for c in client.create_feedback.call_args_list}
+    assert len(ids) == 3
+    await queue.stop()
+    assert queue.stats() | {"sent": 3, "pending": 0, "dropped": 0} == queue.stats()
+
+
+@pytest.mark.asyncio
+async def test_failed_feedback_is_retried() -> None:
+    client = Mock()
+    client.create_feedback.side_effect = [ConnectionError("down"), None, None]
+    queue = FeedbackQueue(lambda: client, max_retries=2, retry_backoff=0)
+    await queue.start()
+    await queue.submit(_feedback(2))
+    await queue.flush()
+    await queue.stop()
+    # run-0 failed once, and only it was retried.
+    assert _sent_run_ids(client) == ["run-0", "run-1", "run-0"]
+    assert queue.retries == 1
+    assert queue.sent == 2
+
+
+@pytest.mark.asyncio
+async def test_full_queue_without_spill_file() -> None:
+    queue = FeedbackQueue(Mock, max_pending=2)
+    await queue.submit(_feedback(2))
+    with pytest.raises(FeedbackQueueFull):
+        await queue.submit(_feedback(1))
+
+
+@pytest.mark.asyncio
+async def test_unsent_feedback_is_spilled_and_resent(tmp_path) -> None:
+    spill_path = str(tmp_path / "feedback.ndjson")
+    client = Mock()
+    client.create_feedback.side_effect = ConnectionError("down")
+    queue = FeedbackQueue(
+        lambda: client, max_pending=2, max_retries=1, retry_backoff=0, spill_path=spill_path
+    )
+    await queue.start()
+    # One record beyond the memory bound goes straight to the file.
+    await queue.submit(_feedback(3))
+    await queue.flush()
+    await queue.stop()
+    assert queue.spilled == 3
+    assert queue.dropped == 0
+
+    # Once LangSmith is reachable, spilled feedback is sent on startup.
+    client = Mock()
+    queue = FeedbackQueue(lambda: client, spill_path=spill_path)
+    await queue.start()
+    assert len(queue) == 3
+    await queue.flush()
+    await queue.stop()
+    assert sorted(_sent_run_ids(client)) == ["run-0", "run-1", "run-2"]
+    assert not (tmp_path / "feedback.ndjson").exists()
@@ -0,0 +1,96 @@
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from pydantic import SecretStr
+
+from core.settings import ApiKeyConfig
+from service.rate_limit import (
+    ApiKey,
+    ApiKeyRegistry,
+    RateLimitExceeded,
+    TokenBucket,
+    TokenUsageHandler,
+    hash_key,
+    llm_result_tokens,
+)
+
+
+def test_token_bucket_refills() -> None:
+    with patch("service.rate_limit.time.monotonic", return_value=100.0) as monotonic:
+        bucket = TokenBucket(rate=2, capacity=4)
+        assert all(bucket.try_consume() for _ in range(4))
+        assert not bucket.try_consume()
+        assert bucket.seconds_until(1) == 0.5
+
+        monotonic.return_value = 101.0
+        assert bucket.tokens == 2
+        monotonic.return_value = 110.0
+        assert bucket.tokens == 4
+
+        bucket.consume(10)
+        assert bucket.tokens == -6
+        assert bucket.seconds_until(1) == 3.5
+
+
+def test_llm_token_budget() -> None:
+    with patch("service.rate_limit.time.monotonic", return_value=0.0) as monotonic:
+        api_key = ApiKey(ApiKeyConfig(name="a", key=SecretStr("k"), tokens_per_minute=600))
+        assert api_key.admit()["X-RateLimit-Remaining-Tokens"] == "600"
+
+        api_key.record_usage(700)
+        with pytest.raises(RateLimitExceeded) as exc_info:
+            api_key.admit()
+        assert exc_info.value.headers["Retry-After"] == "11"
+        assert exc_info.value.headers["X-RateLimit-Remaining-Tokens"] == "0"
+
+        monotonic.return_value = 11.0
+        assert api_key.admit()["X-RateLimit-Remaining-Tokens"] == "10"
+
+
+def test_registry_from_sqlite(tmp_path) -> None:
+    path = str(tmp_path / "keys.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE api_keys (name TEXT PRIMARY KEY, key_sha256 TEXT NOT NULL UNIQUE, "
+            "requests_per_second REAL, burst INTEGER, tokens_per_minute INTEGER)"
+        )
+        conn.execute(
+            "INSERT INTO api_keys VALUES (?, ?, ?, ?, ?)", ("a", hash_key("key-a"), 5, None, None)
+        )
+
+    registry = ApiKeyRegistry()
+    assert registry.authenticate("key-a") is None
+    registry.load_sqlite(path)
+    api_key = registry.authenticate("key-a")
+    assert api_key.name == "a"
+    assert api_key.requests.capacity == 5
+    assert api_key.llm_tokens is None
+    assert registry.authenticate("key-b") is None
+
+
+def _result(message: AIMessage, llm_output: dict | None = None) -> LLMResult:
+    return LLMResult(generations=[[ChatGeneration(message=message)]], llm_output=llm_output)
+
+
+def test_llm_result_tokens() -> None:
+    openai = AIMessage(content="", response_metadata={"token_usage": {"total_tokens": 12}})
+    anthropic = AIMessage(
+        content="", response_metadata={"usage": {"input_tokens": 3, "output_tokens": 4}}
+    )
+    streamed = AIMessage(
+        content="", usage_metadata={"input_tokens": 1, "output_tokens": 1, "total_tokens": 2}
+    )
+    assert llm_result_tokens(_result(openai)) == 12
+    assert llm_result_tokens(_result(anthropic)) == 7
+    assert llm_result_tokens(_result(streamed)) == 2
+    assert (
+        llm_result_tokens(_result(AIMessage(content=""), {"token_usage": {"total_tokens": 5}})) == 5
+    )
+    assert llm_result_tokens(_result(AIMessage(content=""))) == 0
+
+    api_key = ApiKey(ApiKeyConfig(name="a", key=SecretStr("k"), tokens_per_minute=100))
+    TokenUsageHandler(api_key).on_llm_end(_result(openai))
+    assert api_key.llm_tokens.tokens == pytest.approx(88, abs=0.1)
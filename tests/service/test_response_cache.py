@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from schema import ChatMessage
+from service.response_cache import (
+    MemoryTier,
+    ResponseCache,
+    cache_key,
+    parse_cache_control,
+)
+
+
+def test_cache_key_normalizes_message() -> None:
+    key = cache_key("chatbot", "gpt-4o-mini", "What is  LangGraph?")
+    assert cache_key("chatbot", "gpt-4o-mini", " what is\nlanggraph? ") == key
+    assert cache_key("research-assistant", "gpt-4o-mini", "What is LangGraph?") != key
+    assert cache_key("chatbot", "claude-3-haiku", "What is LangGraph?") != key
+
+
+def test_parse_cache_control() -> None:
+    assert parse_cache_control(None) == (True, True)
+    assert parse_cache_control("max-age=0, no-cache") == (False, True)
+    assert parse_cache_control("No-Store") == (False, False)
+
+
+def test_memory_tier_lru_and_size_cap() -> None:
+    tier = MemoryTier(max_bytes=10)
+    expires_at = time.time() + 60
+    tier.put("a", b"aaaa", expires_at)
+    tier.put("b", b"bbbb", expires_at)
+    assert tier.get("a") == b"aaaa"  # "b" is now least recently used
+    tier.put("c", b"cccc", expires_at)
+    assert tier.get("b") is None
+    assert tier.get("a") == b"aaaa"
+    assert tier.size == 8
+    assert tier.evictions == 1
+
+    # Values larger than the cap are not cached.
+    tier.put("d", b"d" * 11, expires_at)
+    assert tier.get("d") is None
+
+
+def test_memory_tier_ttl() -> None:
+    tier = MemoryTier(max_bytes=100)
+    tier.put("a", b"aaaa", time.time() - 1)
+    assert tier.get("a") is None
+    assert tier.size == 0
+
+
+@pytest.mark.asyncio
+async def test_response_cache_disk_tier(tmp_path) -> None:
+    path = str(tmp_path / "cache.db")
+    message = ChatMessage(type="ai", content="LangGraph is a library.", run_id="run-1")
+    key = cache_key("chatbot", "gpt-4o-mini", "What is LangGraph?")
+
+    cache = ResponseCache(ttl=60, max_bytes=1000, db_path=path, db_max_bytes=1000)
+    await cache.setup()
+    assert await cache.get(key) is None
+    await cache.put(key, message)
+    assert await cache.get(key) == message
+    await cache.close()
+
+    # A new process finds the entry on disk and promotes it to memory.
+    cache = ResponseCache(ttl=60, max_bytes=1000, db_path=path, db_max_bytes=1000)
+    await cache.setup()
+    assert await cache.get(key) == message
+    assert await cache.get(key) == message
+    assert cache.stats()["hits"] == {"disk": 1, "memory": 1}
+    assert cache.stats()["misses"] == 0
+
+    # Least recently used entries are evicted beyond the disk size cap.
+    cache.disk.max_bytes = len(message.model_dump_json()) * 2
+    for i in range(3):
+        await cache.put(f"key-{i}", message)
+    cache.memory = MemoryTier(max_bytes=1000)
+    assert await cache.get(key) is None
+    assert await cache.get("key-0") is None
+    assert await cache.get("key-2") == message
+    assert cache.stats()["evictions"]["disk"] == 2
+    await cache.close()
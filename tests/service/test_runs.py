@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from schema import ChatMessage, StreamInput
+from service.runs import InMemoryRunQueue, QueuedRun, RunWorkerPool, SqliteRunQueue
+
+
+async def _wait_finished(queue, run_id: str) -> QueuedRun:
+    for _ in range(100):
+        run = await queue.get(run_id)
+        if run.status in ("succeeded", "failed"):
+            return run
+        await asyncio.sleep(0.01)
+    raise AssertionError("Run did not finish")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+async def test_worker_pool_executes_runs(kind, tmp_path) -> None:
+    queue = InMemoryRunQueue() if kind == "memory" else SqliteRunQueue(str(tmp_path / "runs.db"))
+    await queue.setup()
+    running = 0
+    peak = 0
+
+    async def execute(run: QueuedRun) -> ChatMessage:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        if run.input.message == "fail":
+            raise ValueError("boom")
+        return ChatMessage(type="ai", content=f"answer to {run.input.message}")
+
+    pool = RunWorkerPool(queue, execute, size=2)
+    runs = [await pool.submit("chatbot", StreamInput(message=m)) for m in ["a", "b", "fail", "d"]]
+    assert (await queue.get(runs[0].run_id)).status == "queued"
+    assert await queue.depth() == 4
+
+    pool.start()
+    try:
+        finished = [await _wait_finished(queue, run.run_id) for run in runs]
+        assert await queue.depth() == 0
+    finally:
+        await pool.stop()
+        await queue.close()
+
+    assert peak == 2
+    assert [run.status for run in finished] == ["succeeded", "succeeded", "failed", "succeeded"]
+    assert finished[0].output.content == "answer to a"
+    assert finished[0].started_at is not None
+    assert finished[0].finished_at >= finished[0].started_at
+    assert finished[2].error == "Unexpected error"
+
+
+@pytest.mark.asyncio
+async def test_sqlite_queue_requeues_interrupted_runs(tmp_path) -> None:
+    path = str(tmp_path / "runs.db")
+    started = asyncio.Event()
+
+    async def hang(run: QueuedRun) -> ChatMessage:
+        started.set()
+        await asyncio.sleep(10)
+        raise AssertionError("unreachable")
+
+    queue = SqliteRunQueue(path)
+    await queue.setup()
+    pool = RunWorkerPool(queue, hang, size=1)
+    interrupted = await pool.submit("chatbot", StreamInput(message="a"))
+    queued = await pool.submit("chatbot", StreamInput(message="b"))
+    pool.start()
+    await started.wait()
+    await pool.stop()
+    assert (await queue.get(interrupted.run_id)).status == "running"
+    await queue.close()
+
+    # After a restart both runs are executed, oldest first.
+    executed = []
+
+    async def execute(run: QueuedRun) -> ChatMessage:
+        executed.append(run.run_id)
+        return ChatMessage(type="ai", content="done")
+
+    queue = SqliteRunQueue(path)
+    await queue.setup()
+    pool = RunWorkerPool(queue, execute, size=1)
+    pool.start()
+    try:
+        await _wait_finished(queue, queued.run_id)
+    finally:
+        await pool.stop()
+        await queue.close()
+    assert executed == [interrupted.run_id, queued.run_id]
+
+
+@pytest.mark.asyncio
+async def test_in_memory_queue_evicts_old_finished_runs() -> None:
+    queue = InMemoryRunQueue(max_finished=1)
+
+    async def execute(run: QueuedRun) -> ChatMessage:
+        return ChatMessage(type="ai", content="done")
+
+    pool = RunWorkerPool(queue, execute, size=1)
+    first = await pool.submit("chatbot", StreamInput(message="a"))
+    second = await pool.submit("chatbot", StreamInput(message="b"))
+    pool.start()
+    try:
+        await _wait_finished(queue, second.run_id)
+    finally:
+        await pool.stop()
+    assert await queue.get(first.run_id) is None
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from schema import ChatMessage
+from service.semantic_cache import SemanticCache
+
+pytest.importorskip("chromadb")
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache(tmp_path) -> None:
+    cache = SemanticCache(threshold=0.8, ttl=60, max_entries=2, path=str(tmp_path))
+    await cache.setup()
+    answer = ChatMessage(type="ai", content="It is sunny in Tokyo.", run_id="run-1")
+
+    assert await cache.get("chatbot", "gpt-4o-mini", "What's the weather in Tokyo?") is None
+    await cache.put("chatbot", "gpt-4o-mini", "What's the weather in Tokyo?", answer)
+
+    assert await cache.get("chatbot", "gpt-4o-mini", "what is the weather in tokyo") == answer
+    # Different agents, models and unrelated questions never match.
+    assert (
+        await cache.get("research-assistant", "gpt-4o-mini", "What's the weather in Tokyo?") is None
+    )
+    assert await cache.get("chatbot", "claude-3-haiku", "What's the weather in Tokyo?") is None
+    assert await cache.get("chatbot", "gpt-4o-mini", "How do I bake sourdough bread?") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 4
+    assert stats["lookup_latency"]["p95"] > 0
+
+    # The oldest entries are evicted beyond max_entries.
+    for question in ["Who wrote Hamlet?", "What is LangGraph?"]:
+        await cache.put("chatbot", "gpt-4o-mini", question, answer)
+    assert cache.collection.count() <= 2
+    assert await cache.get("chatbot", "gpt-4o-mini", "What's the weather in Tokyo?") is None
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_ttl(tmp_path) -> None:
+    cache = SemanticCache(threshold=0.8, ttl=0.01, max_entries=10, path=str(tmp_path))
+    await cache.setup()
+    answer = ChatMessage(type="ai", content="It is sunny in Tokyo.")
+    await cache.put("chatbot", "gpt-4o-mini", "What's the weather in Tokyo?", answer)
+    await asyncio.sleep(0.05)
+    assert await cache.get("chatbot", "gpt-4o-mini", "What's the weather in Tokyo?") is None
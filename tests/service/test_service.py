@@ -1,15 +1,28 @@
+import asyncio
 import json
 from types import SimpleNamespace
-from unittest.mock import AsyncMock, patch
+from unittest.mock import ANY, AsyncMock, Mock, patch
 
 import langsmith
 import pytest
-from langchain_core.messages import AIMessage, HumanMessage
+from fastapi.testclient import TestClient
+from langchain_community.chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langgraph.graph import END, MessagesState, StateGraph
 from langgraph.pregel.types import StateSnapshot
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from prometheus_client import REGISTRY
 
 from agents.agents import Agent
-from schema import ChatHistory, ChatMessage, ServiceMetadata
+from core.tracing import GraphTracingHandler, create_tracer_provider
+from schema import ChatHistory, ChatMessage, ServiceMetadata, TimingEvent
 from schema.models import OpenAIModelName
+from service import app
+from service.admission import AdmissionRejected
+from service.response_cache import ResponseCache
+from service.runs import InMemoryRunQueue, RunWorkerPool
+from service.semantic_cache import SemanticCache
+from service.service import _execute_run
 
 
 def test_invoke(test_client, mock_agent) -> None:
@@ -29,6 +42,106 @@ def test_invoke(test_client, mock_agent) -> None:
     assert output.content == ANSWER
 
 
+def test_invoke_cached(test_client, mock_agent) -> None:
+    """Test that stateless /invoke responses are served from the response cache."""
+    QUESTION = "What is the weather in Tokyo?"
+    ANSWER = "The weather in Tokyo is 70 degrees."
+    mock_agent.ainvoke.return_value = {"messages": [AIMessage(content=ANSWER)]}
+    cache = ResponseCache(ttl=60, max_bytes=1_000_000)
+
+    with patch("service.service.response_cache", cache):
+        response = test_client.post("/invoke", json={"message": QUESTION})
+        assert response.headers["X-Cache"] == "MISS"
+        run_id = response.json()["run_id"]
+
+        # Same question modulo whitespace and case is a hit and skips the agent.
+        response = test_client.post("/invoke", json={"message": f"  {QUESTION.lower()} "})
+        assert response.headers["X-Cache"] == "HIT"
+        assert response.json()["content"] == ANSWER
+        assert response.json()["run_id"] == run_id
+        assert mock_agent.ainvoke.await_count == 1
+
+        response = test_client.post(
+            "/invoke", json={"message": QUESTION}, headers={"Cache-Control": "no-cache"}
+        )
+        assert response.headers["X-Cache"] == "BYPASS"
+        assert mock_agent.ainvoke.await_count == 2
+
+        # Requests continuing a thread are never cached.
+        response = test_client.post("/invoke", json={"message": QUESTION, "thread_id": "t1"})
+        assert "X-Cache" not in response.headers
+        assert mock_agent.ainvoke.await_count == 3
+
+    stats = cache.stats()
+    assert stats["hits"] == {"memory": 1}
+    assert stats["misses"] == 1
+    assert stats["bypassed"] == 1
+
+
+class StubCollection:
+    """In-memory stand-in for a chromadb collection that matches messages exactly."""
+
+    def __init__(self) -> None:
+        self.entries: list[tuple[str, dict]] = []
+
+    def query(self, query_embeddings, n_results, where, include):
+        filters = {k: v for f in where["$and"] for k, v in f.items() if k != "expires_at"}
+        # Like chromadb, reject None in metadata filters.
+        if any(v is None for v in filters.values()):
+            raise ValueError("Expected where value to be a str, int, float, or operator")
+        matches = [
+            metadata
+            for message, metadata in self.entries
+            if [message] == query_embeddings and all(metadata[k] == v for k, v in filters.items())
+        ]
+        return {
+            "ids": [[str(i) for i in range(len(matches[:1]))]],
+            "distances": [[0.0 for _ in matches[:1]]],
+            "metadatas": [matches[:1]],
+        }
+
+    def add(self, ids, embeddings, documents, metadatas) -> None:
+        if any(v is None for v in metadatas[0].values()):
+            raise ValueError("Expected metadata value to be a str, int, float or bool")
+        self.entries.append((embeddings[0], metadatas[0]))
+
+    def count(self) -> int:
+        return len(self.entries)
+
+
+def test_invoke_semantic_cache_default_model(test_client, mock_agent) -> None:
+    """Test that requests without a model use the default model's semantic cache entries."""
+    ANSWER = "The weather in Tokyo is 70 degrees."
+    mock_agent.ainvoke.return_value = {"messages": [AIMessage(content=ANSWER)]}
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=100)
+    cache._collection = StubCollection()
+    cache._embed = lambda messages: messages
+
+    with (
+        patch("service.service.semantic_cache", cache),
+        patch("service.service.settings.DEFAULT_MODEL", OpenAIModelName.GPT_4O_MINI),
+    ):
+        response = test_client.post("/invoke", json={"message": "Weather?", "model": None})
+        assert response.headers["X-Cache"] == "MISS"
+        assert cache._collection.entries[0][1]["model"] == OpenAIModelName.GPT_4O_MINI
+
+        # The default model named explicitly shares the entry.
+        response = test_client.post(
+            "/invoke", json={"message": "Weather?", "model": OpenAIModelName.GPT_4O_MINI}
+        )
+        assert response.headers["X-Cache"] == "SEMANTIC-HIT"
+        assert response.json()["content"] == ANSWER
+        assert mock_agent.ainvoke.await_count == 1
+
+        # Cache errors are misses, not failed requests.
+        with patch.object(StubCollection, "query", side_effect=RuntimeError("chromadb down")):
+            response = test_client.post("/invoke", json={"message": "Weather?", "model": None})
+        assert response.status_code == 200
+        assert response.headers["X-Cache"] == "MISS"
+        assert mock_agent.ainvoke.await_count == 2
+        assert cache.stats()["errors"] == 1
+
+
 def test_invoke_custom_agent(test_client, mock_agent) -> None:
     """Test that /invoke works with a custom agent_id path parameter."""
     CUSTOM_AGENT = "custom_agent"
@@ -91,8 +204,42 @@ def test_invoke_model_param(test_client, mock_agent) -> None:
     assert response.status_code == 422
 
 
+def test_invoke_batch(test_client, mock_agent, mock_settings) -> None:
+    mock_settings.AUTH_SECRET = None
+    mock_settings.BATCH_MAX_CONCURRENCY = 2
+    mock_settings.BATCH_MAX_ITEMS = 3
+
+    async def ainvoke(input, config):
+        question = input["messages"][0].content
+        if question == "fail":
+            raise ValueError("boom")
+        return {"messages": [AIMessage(content=f"answer to {question}")]}
+
+    mock_agent.ainvoke.side_effect = ainvoke
+    batch = {"inputs": [{"message": "a"}, {"message": "fail"}, {"message": "c"}]}
+
+    response = test_client.post("/invoke/batch", json=batch)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["index"] for r in results] == [0, 1, 2]
+    assert results[0]["output"]["content"] == "answer to a"
+    assert results[1] == {"index": 1, "output": None, "error": "Unexpected error"}
+    assert results[2]["output"]["content"] == "answer to c"
+
+    # Streaming returns one NDJSON line per input
+    response = test_client.post("/invoke/batch", json={**batch, "stream": True})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2]
+
+    # Too many inputs
+    response = test_client.post("/invoke/batch", json={"inputs": [{"message": "a"}] * 4})
+    assert response.status_code == 422
+
+
 @patch("service.service.LangsmithClient")
-def test_feedback(mock_client: langsmith.Client, test_client) -> None:
+def test_feedback(mock_client: langsmith.Client) -> None:
     ls_instance = mock_client.return_value
     ls_instance.create_feedback.return_value = None
     body = {
@@ -100,22 +247,44 @@ def test_feedback(mock_client: langsmith.Client, test_client) -> None:
         "key": "human-feedback-stars",
         "score": 0.8,
     }
-    response = test_client.post("/feedback", json=body)
-    assert response.status_code == 200
-    assert response.json() == {"status": "success"}
+    # Queued feedback is sent at the latest when the service shuts down.
+    with TestClient(app) as client:
+        response = client.post("/feedback", json=body)
+        assert response.status_code == 200
+        assert response.json() == {"status": "success"}
     ls_instance.create_feedback.assert_called_once_with(
         run_id="847c6285-8fc9-4560-a83f-4e6285809254",
         key="human-feedback-stars",
         score=0.8,
+        feedback_id=ANY,
+        stop_after_attempt=1,
     )
 
 
+@patch("service.service.LangsmithClient")
+def test_feedback_batch(mock_client: langsmith.Client) -> None:
+    ls_instance = mock_client.return_value
+    body = {
+        "feedback": [
+            {"run_id": f"run-{i}", "key": "stars", "score": 1.0, "kwargs": {"comment": "ok"}}
+            for i in range(3)
+        ]
+    }
+    with TestClient(app) as client:
+        response = client.post("/feedback/batch", json=body)
+        assert response.status_code == 200
+        assert client.post("/feedback/batch", json={"feedback": []}).status_code == 422
+    calls = ls_instance.create_feedback.call_args_list
+    assert [c.kwargs["run_id"] for c in calls] == ["run-0", "run-1", "run-2"]
+    assert all(c.kwargs["comment"] == "ok" for c in calls)
+
+
 def test_history(test_client, mock_agent) -> None:
     QUESTION = "What is the weather in Tokyo?"
     ANSWER = "The weather in Tokyo is 70 degrees."
     user_question = HumanMessage(content=QUESTION)
     agent_response = AIMessage(content=ANSWER)
-    mock_agent.get_state.return_value = StateSnapshot(
+    mock_agent.aget_state.return_value = StateSnapshot(
         values={"messages": [user_question, agent_response]},
         next=(),
         config={},
@@ -137,6 +306,45 @@ def test_history(test_client, mock_agent) -> None:
     assert output.messages[1].content == ANSWER
 
 
+def test_history_pagination(test_client, mock_agent) -> None:
+    """Test cursor pagination and delta mode of /history."""
+    messages = [
+        HumanMessage(content=f"message {i}", id=f"m{i}")
+        if i % 2 == 0
+        else AIMessage(content=f"message {i}", id=f"m{i}")
+        for i in range(10)
+    ]
+    mock_agent.aget_state.return_value = StateSnapshot(
+        values={"messages": messages},
+        next=(),
+        config={},
+        metadata=None,
+        created_at=None,
+        parent_config=None,
+        tasks=(),
+    )
+
+    def history(**params) -> tuple[list[str], bool]:
+        response = test_client.post("/chatbot/history", json={"thread_id": "t1", **params})
+        assert response.status_code == 200
+        output = ChatHistory.model_validate(response.json())
+        return [m.id for m in output.messages], output.has_more
+
+    assert history() == ([f"m{i}" for i in range(10)], False)
+    assert history(limit=3) == (["m7", "m8", "m9"], True)
+    assert history(limit=3, before="m7") == (["m4", "m5", "m6"], True)
+    assert history(limit=3, before="m2") == (["m0", "m1"], False)
+    assert history(limit=3, after="m2") == (["m3", "m4", "m5"], True)
+    assert history(limit=3, after="m6") == (["m7", "m8", "m9"], False)
+    assert history(limit=3, since="m5") == (["m6", "m7", "m8", "m9"], False)
+    assert history(since="m9") == ([], False)
+
+    response = test_client.post("/history", json={"thread_id": "t1", "before": "unknown"})
+    assert response.status_code == 404
+    response = test_client.post("/history", json={"thread_id": "t1", "before": "m1", "after": "m2"})
+    assert response.status_code == 422
+
+
 @pytest.mark.asyncio
 async def test_stream(test_client, mock_agent) -> None:
     """Test streaming tokens and messages."""
@@ -175,8 +383,9 @@ async def test_stream(test_client, mock_agent) -> None:
         # Collect all SSE messages
         messages = []
         for line in response.iter_lines():
-            if line and line.strip() != "data: [DONE]":  # Skip [DONE] message
-                messages.append(json.loads(line.lstrip("data: ")))
+            # Skip [DONE] message and event id fields
+            if line.startswith("data: ") and line.strip() != "data: [DONE]":
+                messages.append(json.loads(line.removeprefix("data: ")))
 
         # Verify streamed tokens
         token_messages = [msg for msg in messages if msg["type"] == "token"]
@@ -228,8 +437,9 @@ async def test_stream_no_tokens(test_client, mock_agent) -> None:
         # Collect all SSE messages
         messages = []
         for line in response.iter_lines():
-            if line and line.strip() != "data: [DONE]":  # Skip [DONE] message
-                messages.append(json.loads(line.lstrip("data: ")))
+            # Skip [DONE] message and event id fields
+            if line.startswith("data: ") and line.strip() != "data: [DONE]":
+                messages.append(json.loads(line.removeprefix("data: ")))
 
         # Verify no token messages
         token_messages = [msg for msg in messages if msg["type"] == "token"]
@@ -242,6 +452,315 @@ async def test_stream_no_tokens(test_client, mock_agent) -> None:
         assert final_messages[0]["content"]["type"] == "ai"
 
 
+@pytest.mark.asyncio
+async def test_stream_coalesced_tokens(test_client, mock_agent) -> None:
+    """Test that tokens are coalesced into fewer token events when requested."""
+    QUESTION = "What is the weather in Tokyo?"
+    TOKENS = ["The", " weather", " in", " Tokyo", " is", " sunny", "."]
+    FINAL_ANSWER = "The weather in Tokyo is sunny."
+
+    events = [
+        {
+            "event": "on_chat_model_stream",
+            "data": {"chunk": SimpleNamespace(content=token)},
+            "tags": [],
+        }
+        for token in TOKENS
+    ] + [
+        {
+            "event": "on_chain_end",
+            "data": {"output": {"messages": [AIMessage(content=FINAL_ANSWER)]}},
+            "tags": ["graph:step:1"],
+        }
+    ]
+
+    async def mock_astream_events(**kwargs):
+        for event in events:
+            yield event
+
+    mock_agent.astream_events = mock_astream_events
+
+    with test_client.stream(
+        "POST", "/stream", json={"message": QUESTION, "token_flush_bytes": 10}
+    ) as response:
+        assert response.status_code == 200
+
+        messages = []
+        for line in response.iter_lines():
+            if line.startswith("data: ") and line.strip() != "data: [DONE]":
+                messages.append(json.loads(line.removeprefix("data: ")))
+
+    # Tokens are grouped into windows of at least 10 bytes, and the remainder is
+    # flushed before the final message.
+    token_messages = [msg["content"] for msg in messages if msg["type"] == "token"]
+    assert token_messages == ["The weather", " in Tokyo is", " sunny."]
+    assert "".join(token_messages) == FINAL_ANSWER
+    assert messages[-1]["type"] == "message"
+    assert messages[-1]["content"]["content"] == FINAL_ANSWER
+
+
+@pytest.mark.parametrize("engine", ["events", "updates"])
+def test_stream_debug_timings(test_client, engine) -> None:
+    """Test that timing events are streamed for each step when debug_timings is set."""
+
+    async def call_model(state: MessagesState) -> MessagesState:
+        model = FakeListChatModel(responses=["Sunny."])
+        return {"messages": [await model.ainvoke(state["messages"])]}
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("model", call_model)
+    graph.set_entry_point("model")
+    graph.add_edge("model", END)
+
+    def stream(debug_timings: bool) -> list[dict]:
+        body = {"message": "Weather?", "stream_engine": engine, "debug_timings": debug_timings}
+        with test_client.stream("POST", "/stream", json=body) as response:
+            return [
+                json.loads(line[6:])
+                for line in response.iter_lines()
+                if line.startswith("data: ") and line.strip() != "data: [DONE]"
+            ]
+
+    with patch("service.service.get_agent", Mock(return_value=graph.compile())):
+        assert not [e for e in stream(False) if e["type"] == "timing"]
+        events = stream(True)
+
+    timings = [TimingEvent.model_validate(e["content"]) for e in events if e["type"] == "timing"]
+    assert [(t.kind, t.name) for t in timings if t.kind in ("queue", "node", "run")] == [
+        ("queue", None),
+        ("node", "model"),
+        ("run", None),
+    ]
+    assert [t.kind for t in timings].count("model") == 1
+    # The node is timed once it has finished, so after the message it wrote.
+    kinds = [e["type"] if e["type"] != "timing" else e["content"]["kind"] for e in events]
+    assert kinds.index("message") < kinds.index("node")
+    assert kinds[-1] == "run"
+    run = timings[-1]
+    assert all(t.start_ms + t.duration_ms <= run.duration_ms for t in timings)
+
+
+def test_stream_updates_engine(test_client, mock_agent) -> None:
+    """Test that the updates engine streams the same frames from graph stream modes."""
+    QUESTION = "What is the weather in Tokyo?"
+    TOKENS = ["The", " weather", " in", " Tokyo", " is", " sunny", "."]
+    FINAL_ANSWER = "The weather in Tokyo is sunny."
+    stream_modes = []
+
+    async def mock_astream(**kwargs):
+        stream_modes.append(kwargs["stream_mode"])
+        yield "custom", AIMessage(content="Looking it up")
+        for token in TOKENS:
+            yield "messages", (AIMessageChunk(content=token), {})
+        # Non-AI messages, e.g. tool results, never carry tokens.
+        yield "messages", (ToolMessage(content="sunny", tool_call_id="1"), {})
+        yield "updates", {"model": {"messages": [AIMessage(content=FINAL_ANSWER)]}}
+
+    mock_agent.astream = mock_astream
+    mock_agent.astream_events = Mock(side_effect=AssertionError("events engine used"))
+
+    with test_client.stream(
+        "POST",
+        "/stream",
+        json={"message": QUESTION, "stream_tokens": True, "stream_engine": "updates"},
+    ) as response:
+        assert response.status_code == 200
+        messages = []
+        for line in response.iter_lines():
+            if line.startswith("data: ") and line.strip() != "data: [DONE]":
+                messages.append(json.loads(line.removeprefix("data: ")))
+
+    assert stream_modes == [["updates", "custom", "messages"]]
+    assert messages[0]["type"] == "message"
+    assert messages[0]["content"]["content"] == "Looking it up"
+    assert [msg["content"] for msg in messages if msg["type"] == "token"] == TOKENS
+    assert messages[-1]["type"] == "message"
+    assert messages[-1]["content"]["content"] == FINAL_ANSWER
+
+
+def test_stream_resume(test_client, mock_agent) -> None:
+    """Test that a dropped stream can be resumed from its last event id."""
+    TOKENS = ["The", " weather", " is", " sunny"]
+
+    async def mock_astream_events(**kwargs):
+        for token in TOKENS:
+            yield {
+                "event": "on_chat_model_stream",
+                "data": {"chunk": SimpleNamespace(content=token)},
+                "tags": [],
+            }
+
+    mock_agent.astream_events = mock_astream_events
+
+    with test_client.stream("POST", "/stream", json={"message": "Weather?"}) as response:
+        assert response.status_code == 200
+        run_id = response.headers["X-Run-ID"]
+        lines = [line for line in response.iter_lines() if line]
+
+    event_ids = [line[len("id: ") :] for line in lines if line.startswith("id: ")]
+    assert event_ids == [f"{run_id}:{i}" for i in range(1, len(TOKENS) + 2)]
+
+    def data_lines(response):
+        return [line for line in response.iter_lines() if line.startswith("data: ")]
+
+    # Pretend the client only received the first two events.
+    with test_client.stream(
+        "GET", f"/runs/{run_id}/stream", headers={"Last-Event-ID": event_ids[1]}
+    ) as response:
+        assert response.status_code == 200
+        replayed = data_lines(response)
+    assert [json.loads(line[6:])["content"] for line in replayed[:-1]] == TOKENS[2:]
+    assert replayed[-1] == "data: [DONE]"
+
+    # Resending the original request with Last-Event-ID resumes instead of re-running.
+    with test_client.stream(
+        "POST",
+        "/stream",
+        json={"message": "Weather?"},
+        headers={"Last-Event-ID": event_ids[2]},
+    ) as response:
+        assert response.status_code == 200
+        assert len(data_lines(response)) == 2
+
+    response = test_client.get(f"/runs/{run_id}/stream", headers={"Last-Event-ID": "another-run:1"})
+    assert response.status_code == 400
+    response = test_client.get("/runs/unknown-run/stream")
+    assert response.status_code == 404
+
+
+def test_runs(mock_agent, monkeypatch, tmp_path) -> None:
+    """Test queueing a run, polling its status and following its events."""
+    QUESTION = "What is the weather in Tokyo?"
+    ANSWER = "The weather in Tokyo is sunny."
+    release = asyncio.Event()
+
+    async def mock_astream_events(**kwargs):
+        await release.wait()
+        yield {
+            "event": "on_chain_end",
+            "data": {"output": {"messages": [AIMessage(content=ANSWER)]}},
+            "tags": ["graph:step:1"],
+        }
+
+    mock_agent.astream_events = mock_astream_events
+    monkeypatch.chdir(tmp_path)  # The lifespan creates checkpoints.db in the working dir
+    run_workers = RunWorkerPool(InMemoryRunQueue(), _execute_run, size=1)
+    with patch("service.service.run_workers", run_workers), TestClient(app) as client:
+        response = client.post("/chatbot/runs", json={"message": QUESTION})
+        assert response.status_code == 202
+        run = response.json()
+        assert run["agent_id"] == "chatbot"
+        assert "input" not in run
+        run_id = run["run_id"]
+
+        assert client.get(f"/runs/{run_id}").json()["status"] in ("queued", "running")
+        client.portal.call(release.set)
+
+        with client.stream("GET", f"/runs/{run_id}/events") as response:
+            lines = [line for line in response.iter_lines() if line.startswith("data: ")]
+        assert json.loads(lines[0][6:])["content"]["content"] == ANSWER
+        assert lines[-1] == "data: [DONE]"
+
+        run = client.get(f"/runs/{run_id}").json()
+        assert run["status"] == "succeeded"
+        assert run["output"]["content"] == ANSWER
+        assert run["output"]["run_id"] == run_id
+
+        assert client.get("/runs/unknown").status_code == 404
+
+
+def test_runs_rejected_when_queue_full(test_client) -> None:
+    """Test that /runs sheds new runs with Retry-After once the queue is full."""
+    run_workers = RunWorkerPool(InMemoryRunQueue(), _execute_run, size=0)
+    with (
+        patch("service.service.run_workers", run_workers),
+        patch("service.service.settings.RUN_MAX_QUEUE_DEPTH", 2),
+        patch("service.service.settings.ADMISSION_RETRY_AFTER", 5),
+    ):
+        for _ in range(2):
+            assert test_client.post("/runs", json={"message": "hi"}).status_code == 202
+        response = test_client.post("/runs", json={"message": "hi"})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "5"
+        assert response.json()["detail"] == "Too many queued runs"
+
+        response = test_client.post("/no-such-agent/runs", json={"message": "hi"})
+        assert response.status_code == 404
+
+
+def test_stream_unknown_agent(test_client) -> None:
+    """Test that streams for unknown agents are rejected before admission."""
+    response = test_client.post("/no-such-agent/stream", json={"message": "hi"})
+    assert response.status_code == 404
+    response = test_client.get("/stats")
+    assert "no-such-agent" not in response.json()["admission"]["agents"]
+
+
+def test_admission_rejected(test_client, mock_agent) -> None:
+    """Test that requests are shed with Retry-After when the service is at capacity."""
+    rejected = AsyncMock(side_effect=AdmissionRejected(429, "Too many queued requests", 3))
+    with patch("service.service.admission_controller.acquire", rejected):
+        for path in ["/invoke", "/stream"]:
+            response = test_client.post(path, json={"message": "hi"})
+            assert response.status_code == 429
+            assert response.headers["Retry-After"] == "3"
+            assert response.json()["detail"] == "Too many queued requests"
+        mock_agent.ainvoke.assert_not_awaited()
+
+    response = test_client.get("/stats")
+    assert response.status_code == 200
+    assert response.json()["admission"]["queue_depth"] == 0
+
+
+def test_metrics(test_client, mock_agent) -> None:
+    """Test that agent runs are counted at /metrics."""
+    labels = {
+        "agent_id": "research-assistant",
+        "model": str(OpenAIModelName.GPT_4O_MINI),
+        "endpoint": "invoke",
+        "status": "ok",
+    }
+    before = REGISTRY.get_sample_value("agent_requests_total", labels) or 0
+
+    with patch("service.service.settings.DEFAULT_MODEL", OpenAIModelName.GPT_4O_MINI):
+        assert test_client.post("/invoke", json={"message": "hi"}).status_code == 200
+    assert REGISTRY.get_sample_value("agent_requests_total", labels) == before + 1
+
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "agent_request_duration_seconds_bucket" in response.text
+    assert "agent_active_streams 0.0" in response.text
+
+
+def test_tracing(test_client, mock_agent) -> None:
+    """Test that requests are traced, continuing the trace of a traceparent header."""
+    exporter = InMemorySpanExporter()
+    provider = create_tracer_provider(exporter)
+    tracer = provider.get_tracer("test")
+    traceparent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+    with (
+        patch("core.tracing._tracer_provider", provider),
+        patch("core.tracing.tracer", tracer),
+        patch("service.tracing.tracer", tracer),
+    ):
+        response = test_client.post(
+            "/invoke", json={"message": "hi"}, headers={"traceparent": traceparent}
+        )
+        assert response.status_code == 200
+    provider.force_flush()
+
+    (span,) = exporter.get_finished_spans()
+    assert span.name == "POST /invoke"
+    assert span.attributes["http.response.status_code"] == 200
+    assert span.context.trace_id == 0x0AF7651916CD43DD8448EB211C80319C
+    assert span.parent.span_id == 0xB7AD6B7169203331
+    callbacks = mock_agent.ainvoke.await_args.kwargs["config"]["callbacks"]
+    (handler,) = [c for c in callbacks if isinstance(c, GraphTracingHandler)]
+    assert handler.tracer is tracer
+
+
 def test_info(test_client, mock_settings) -> None:
     """Test that /info returns the correct service metadata."""
 
@@ -98,6 +98,7 @@ def test_agent_stream(mock_httpx):
             if isinstance(response, ChatMessage):
                 messages.append(response)
 
+    assert len(messages) == len(EXPECTED_OUTPUT_MESSAGES)
     for expected, actual in zip(EXPECTED_OUTPUT_MESSAGES, messages):
         actual.run_id = None
         assert expected == actual
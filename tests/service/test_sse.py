@@ -0,0 +1,57 @@
+import json
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolCall, ToolMessage
+
+from agents.utils import CustomData
+from schema import ChatMessage
+from service import sse
+from service.utils import langchain_to_chat_dict, langchain_to_chat_message
+
+
+def _parse_frame(frame: bytes) -> dict:
+    text = frame.decode()
+    assert text.startswith("data: ")
+    assert text.endswith("\n\n")
+    return json.loads(text[len("data: ") : -2])
+
+
+def test_encode_token() -> None:
+    frame = sse.encode_token('Hello, "world" 🌏')
+    assert _parse_frame(frame) == {"type": "token", "content": 'Hello, "world" 🌏'}
+
+
+def test_encode_error() -> None:
+    assert _parse_frame(sse.encode_error("Oops")) == {"type": "error", "content": "Oops"}
+    assert _parse_frame(sse.UNEXPECTED_ERROR_FRAME) == {
+        "type": "error",
+        "content": "Unexpected error",
+    }
+
+
+def test_done_frame() -> None:
+    assert sse.DONE_FRAME == b"data: [DONE]\n\n"
+
+
+def test_encode_message_matches_chat_message() -> None:
+    """The fast path must produce the same payload as ChatMessage.model_dump()."""
+    messages = [
+        HumanMessage(content="What is 6 * 7?"),
+        AIMessage(
+            content="",
+            tool_calls=[ToolCall(name="calculator", args={"expression": "6 * 7"}, id="call_1")],
+            response_metadata={"finish_reason": "tool_calls"},
+        ),
+        ToolMessage(content="42", tool_call_id="call_1"),
+        AIMessage(content=[{"type": "text", "text": "The answer is "}, "42."]),
+        CustomData(data={"status": "running"}).to_langchain(),
+    ]
+    for message in messages:
+        expected = langchain_to_chat_message(message)
+        expected.run_id = "847c6285-8fc9-4560-a83f-4e6285809254"
+        chat_dict = langchain_to_chat_dict(message)
+        chat_dict["run_id"] = "847c6285-8fc9-4560-a83f-4e6285809254"
+        assert chat_dict == expected.model_dump()
+
+        parsed = _parse_frame(sse.encode_message(chat_dict))
+        assert parsed["type"] == "message"
+        assert ChatMessage.model_validate(parsed["content"]) == expected
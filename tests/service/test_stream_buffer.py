@@ -0,0 +1,196 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from service import sse
+from service.stream_buffer import (
+    RunStream,
+    StreamRegistry,
+    SubscriberResponse,
+    parse_event_id,
+)
+
+RUN_ID = "847c6285-8fc9-4560-a83f-4e6285809254"
+
+
+def test_parse_event_id() -> None:
+    assert parse_event_id(f"{RUN_ID}:12") == (RUN_ID, 12)
+    with pytest.raises(ValueError):
+        parse_event_id("12")
+    with pytest.raises(ValueError):
+        parse_event_id(f"{RUN_ID}:abc")
+
+
+async def _collect(run_stream: RunStream, after: int = 0) -> list[bytes]:
+    return [frame async for frame in run_stream.subscribe(after)]
+
+
+@pytest.mark.asyncio
+async def test_run_stream_replay_and_follow() -> None:
+    run_stream = RunStream(RUN_ID, max_events=10)
+    run_stream.publish(b"data: one\n\n")
+    run_stream.publish(b"data: two\n\n")
+
+    # A subscriber that joins late replays the buffer, then follows the live run.
+    subscriber = asyncio.create_task(_collect(run_stream))
+    await asyncio.sleep(0)
+    run_stream.publish(b"data: three\n\n")
+    run_stream.close()
+    frames = await subscriber
+
+    assert frames == [
+        f"id: {RUN_ID}:1\ndata: one\n\n".encode(),
+        f"id: {RUN_ID}:2\ndata: two\n\n".encode(),
+        f"id: {RUN_ID}:3\ndata: three\n\n".encode(),
+    ]
+
+    # Resuming after an event id only returns the missed events.
+    assert await _collect(run_stream, after=2) == [f"id: {RUN_ID}:3\ndata: three\n\n".encode()]
+    assert await _collect(run_stream, after=3) == []
+
+
+@pytest.mark.asyncio
+async def test_run_stream_ring_buffer_evicts_oldest() -> None:
+    run_stream = RunStream(RUN_ID, max_events=2)
+    for i in range(1, 5):
+        run_stream.publish(f"data: {i}\n\n".encode())
+    run_stream.close()
+
+    frames = await _collect(run_stream, after=1)
+    assert frames == [
+        f"id: {RUN_ID}:3\ndata: 3\n\n".encode(),
+        f"id: {RUN_ID}:4\ndata: 4\n\n".encode(),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_registry_pumps_and_expires_runs() -> None:
+    async def frames():
+        yield sse.encode_token("Hello")
+        yield sse.DONE_FRAME
+
+    with patch("service.stream_buffer.time.monotonic", return_value=100.0):
+        registry = StreamRegistry(max_events=10, ttl=60)
+        run_stream = registry.start(RUN_ID, frames())
+        await run_stream.task
+
+    assert run_stream.done
+    assert run_stream.last_seq == 2
+
+    with patch("service.stream_buffer.time.monotonic", return_value=150.0):
+        assert registry.get(RUN_ID) is run_stream
+    with patch("service.stream_buffer.time.monotonic", return_value=161.0):
+        assert registry.get(RUN_ID) is None
+    assert len(registry) == 0
+
+
+@pytest.mark.asyncio
+async def test_registry_reports_producer_errors() -> None:
+    async def frames():
+        yield sse.encode_token("Hello")
+        raise RuntimeError("boom")
+
+    registry = StreamRegistry(max_events=10, ttl=60)
+    run_stream = registry.start(RUN_ID, frames())
+    await run_stream.task
+
+    frames_out = await _collect(run_stream)
+    assert frames_out[-2].endswith(sse.UNEXPECTED_ERROR_FRAME)
+    assert frames_out[-1].endswith(sse.DONE_FRAME)
+
+
+@pytest.mark.asyncio
+async def test_registry_open_before_producer_starts() -> None:
+    registry = StreamRegistry(max_events=10, ttl=60)
+    run_stream = registry.open(RUN_ID)
+    subscriber = asyncio.create_task(_collect(run_stream))
+    await asyncio.sleep(0)
+
+    async def frames():
+        yield sse.encode_token("Hello")
+        yield sse.DONE_FRAME
+
+    assert await registry.pump(registry.open(RUN_ID), frames())
+    frames_out = await subscriber
+    assert len(frames_out) == 2
+    # A finished run is replaced by a fresh stream when opened again.
+    assert registry.open(RUN_ID) is not run_stream
+
+
+async def _endless_frames():
+    yield sse.encode_token("Hello")
+    await asyncio.Event().wait()
+
+
+@pytest.mark.asyncio
+async def test_registry_cancels_run_without_subscribers() -> None:
+    registry = StreamRegistry(max_events=10, ttl=60, disconnect_grace=0)
+    run_stream = registry.start(RUN_ID, _endless_frames())
+    subscription = run_stream.subscribe()
+    await anext(subscription)
+    assert run_stream.subscribers == 1
+    await subscription.aclose()
+
+    with pytest.raises(asyncio.CancelledError):
+        await run_stream.task
+    assert run_stream.done
+    assert registry.cancelled == {"client_disconnected": 1}
+    # A client resuming later learns that the run was cancelled.
+    frames_out = await _collect(run_stream, after=1)
+    assert frames_out[0].endswith(sse.CANCELLED_FRAME)
+    assert frames_out[1].endswith(sse.DONE_FRAME)
+
+
+@pytest.mark.asyncio
+async def test_registry_cancels_run_closed_before_first_frame() -> None:
+    registry = StreamRegistry(max_events=10, ttl=60, disconnect_grace=0)
+    run_stream = registry.start(RUN_ID, _endless_frames())
+    subscription = run_stream.subscribe()
+    assert run_stream.subscribers == 1
+    await subscription.aclose()
+    await subscription.aclose()
+    assert run_stream.subscribers == 0
+
+    with pytest.raises(asyncio.CancelledError):
+        await run_stream.task
+    assert registry.cancelled == {"client_disconnected": 1}
+
+
+@pytest.mark.asyncio
+async def test_registry_keeps_run_resumed_within_grace() -> None:
+    registry = StreamRegistry(max_events=10, ttl=60, disconnect_grace=0.01)
+    run_stream = registry.start(RUN_ID, _endless_frames())
+    subscription = run_stream.subscribe()
+    await anext(subscription)
+    await subscription.aclose()
+
+    resumed = run_stream.subscribe(after=1)
+    waiting = asyncio.create_task(anext(resumed))
+    await asyncio.sleep(0.02)
+    assert not run_stream.task.done()
+    assert not registry.cancelled
+
+    waiting.cancel()
+    run_stream.task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_subscriber_response_closes_subscription_on_disconnect() -> None:
+    run_stream = RunStream(RUN_ID, max_events=10)
+    run_stream.publish(sse.encode_token("Hello"))
+    sent = []
+
+    async def receive():
+        await asyncio.sleep(0.01)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    response = SubscriberResponse(run_stream.subscribe())
+    assert run_stream.subscribers == 1
+    await response({"type": "http"}, receive, send)
+
+    assert sent[1]["body"].endswith(sse.encode_token("Hello"))
+    assert run_stream.subscribers == 0
@@ -1,6 +1,8 @@
+from unittest.mock import patch
+
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolCall, ToolMessage
 
-from service.utils import langchain_to_chat_message
+from service.utils import TokenCoalescer, langchain_to_chat_message
 
 
 def test_messages_from_langchain() -> None:
@@ -42,3 +44,29 @@ def test_messages_tool_calls() -> None:
     assert ai_message.tool_calls[0]["id"] == "call_Jja7"
     assert ai_message.tool_calls[0]["name"] == "test_tool"
     assert ai_message.tool_calls[0]["args"] == {"x": 1, "y": 2}
+
+
+def test_token_coalescer_disabled() -> None:
+    coalescer = TokenCoalescer()
+    assert not coalescer.enabled
+    assert coalescer.add("Hello") == "Hello"
+    assert coalescer.flush() is None
+
+
+def test_token_coalescer_flush_bytes() -> None:
+    coalescer = TokenCoalescer(flush_bytes=8)
+    assert coalescer.add("The") is None
+    assert coalescer.add(" wea") is None
+    assert coalescer.add("ther") == "The weather"
+    assert coalescer.add(" is") is None
+    assert coalescer.flush() == " is"
+    assert coalescer.flush() is None
+
+
+def test_token_coalescer_flush_ms() -> None:
+    with patch("service.utils.time.monotonic", side_effect=[0.0, 0.01, 0.06, 0.07, 0.07, 0.08]):
+        coalescer = TokenCoalescer(flush_ms=50)
+        assert coalescer.add("The") is None  # window starts at 0.0, checked at 0.01
+        assert coalescer.add(" weather") == "The weather"  # checked at 0.06
+        assert coalescer.add(" is") is None  # new window starts at 0.07, checked at 0.07
+        assert not coalescer.due()
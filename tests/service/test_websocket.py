@@ -0,0 +1,127 @@
+import asyncio
+from collections import Counter
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from pydantic import SecretStr
+from starlette.websockets import WebSocketDisconnect
+
+from service import sse
+from service.websocket import sse_to_ws
+
+RUN_A = "847c6285-8fc9-4560-a83f-4e6285809254"
+RUN_B = "7bcc7cc1-99d7-4b1d-bdb5-e6f90ed44de6"
+
+
+def _token_events(tokens):
+    return [
+        {
+            "event": "on_chat_model_stream",
+            "data": {"chunk": SimpleNamespace(content=token)},
+            "tags": [],
+        }
+        for token in tokens
+    ]
+
+
+def _collect_until_finished(websocket, run_ids: set[str]) -> list[dict]:
+    events = []
+    remaining = set(run_ids)
+    while remaining:
+        event = websocket.receive_json()
+        events.append(event)
+        if event["type"] in ("done", "cancelled"):
+            remaining.discard(event["run_id"])
+    return events
+
+
+def test_sse_to_ws() -> None:
+    prefix = b'{"run_id":"abc",'
+    assert (
+        sse_to_ws(sse.encode_token("Hi"), prefix)
+        == '{"run_id":"abc","type":"token","content":"Hi"}'
+    )
+    assert sse_to_ws(sse.DONE_FRAME, prefix) == '{"run_id":"abc","type":"done"}'
+
+
+def test_websocket_multiplexes_runs(test_client, mock_agent) -> None:
+    async def mock_astream_events(**kwargs):
+        for event in _token_events(["Hello", " there"]):
+            await asyncio.sleep(0)
+            yield event
+
+    mock_agent.astream_events = mock_astream_events
+
+    with test_client.websocket_connect("/ws") as websocket:
+        for run_id in (RUN_A, RUN_B):
+            websocket.send_json(
+                {
+                    "type": "start",
+                    "run_id": run_id,
+                    "agent_id": "chatbot",
+                    "input": {"message": "Hi"},
+                }
+            )
+        events = _collect_until_finished(websocket, {RUN_A, RUN_B})
+
+    for run_id in (RUN_A, RUN_B):
+        run_events = [e for e in events if e["run_id"] == run_id]
+        assert [e["type"] for e in run_events] == ["started", "token", "token", "done"]
+        assert "".join(e["content"] for e in run_events if e["type"] == "token") == "Hello there"
+
+
+def test_websocket_cancel(test_client, mock_agent) -> None:
+    async def mock_astream_events(**kwargs):
+        for event in _token_events(["Hello"]):
+            yield event
+        await asyncio.Event().wait()  # Never finishes on its own
+
+    mock_agent.astream_events = mock_astream_events
+    cancelled = Counter()
+
+    with (
+        patch("service.service.stream_registry.cancelled", cancelled),
+        test_client.websocket_connect("/ws") as websocket,
+    ):
+        websocket.send_json({"type": "start", "run_id": RUN_A, "input": {"message": "Hi"}})
+        assert websocket.receive_json() == {"run_id": RUN_A, "type": "started"}
+        assert websocket.receive_json()["type"] == "token"
+        websocket.send_json({"type": "cancel", "run_id": RUN_A})
+        assert websocket.receive_json() == {"run_id": RUN_A, "type": "cancelled"}
+        assert cancelled == {"client_cancelled": 1}
+
+        websocket.send_json({"type": "cancel", "run_id": RUN_A})
+        assert websocket.receive_json() == {
+            "run_id": RUN_A,
+            "type": "error",
+            "content": "Unknown run",
+        }
+
+
+def test_websocket_invalid_requests(test_client, mock_agent) -> None:
+    with test_client.websocket_connect("/ws") as websocket:
+        websocket.send_text('{"type": "explode"}')
+        event = websocket.receive_json()
+        assert event["type"] == "error"
+        assert event["content"].startswith("Invalid request")
+
+        websocket.send_json({"type": "start", "run_id": "not-a-uuid", "input": {"message": "Hi"}})
+        assert websocket.receive_json()["content"] == "run_id must be a UUID"
+
+
+def test_websocket_auth(mock_settings, mock_agent, test_client) -> None:
+    mock_settings.AUTH_SECRET = SecretStr("test-secret")
+    with pytest.raises(WebSocketDisconnect) as exc, test_client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+    assert exc.value.code == 1008
+
+    with test_client.websocket_connect(
+        "/ws", headers={"Authorization": "Bearer test-secret"}
+    ) as websocket:
+        websocket.send_text("{}")
+        assert websocket.receive_json()["type"] == "error"
+
+    with test_client.websocket_connect("/ws?token=test-secret") as websocket:
+        websocket.send_text("{}")
+        assert websocket.receive_json()["type"] == "error"